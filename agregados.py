@@ -0,0 +1,196 @@
+"""Agregados diários de vendas.
+
+``vendas_diarias``: uma linha por loja, dia e forma de pagamento, com
+quantidade de vendas, valor total e itens vendidos.
+
+``produtos_vendas_diarias``: uma linha por loja, dia e produto, com
+quantidade, valor e número de itens de venda; é a base do ranking de mais
+vendidos (``mais_vendidos``), que assim lê no máximo um registro por
+produto e dia do período em vez de todos os itens já vendidos.
+
+Vendas canceladas não entram. Os agregados são mantidos incrementalmente
+dentro da transação de cada venda (criar, editar, cancelar), e podem ser
+reconstruídos do histórico:
+
+    python agregados.py              # todas as lojas
+    python agregados.py --loja 1     # só uma loja
+"""
+import argparse
+from datetime import date
+
+SQL_SOMAR = """
+    INSERT INTO vendas_diarias
+        (loja_id, dia, forma_pagamento, quantidade_vendas, valor_total, itens_vendidos)
+    VALUES (%s, DATE(%s), %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        quantidade_vendas = quantidade_vendas + VALUES(quantidade_vendas),
+        valor_total = valor_total + VALUES(valor_total),
+        itens_vendidos = itens_vendidos + VALUES(itens_vendidos)
+"""
+
+SQL_RECONSTRUIR = """
+    INSERT INTO vendas_diarias
+        (loja_id, dia, forma_pagamento, quantidade_vendas, valor_total, itens_vendidos)
+    SELECT
+        v.loja_id,
+        DATE(v.data_venda),
+        COALESCE(v.forma_pagamento, ''),
+        COUNT(*),
+        COALESCE(SUM(v.total_venda), 0),
+        COALESCE(SUM(i.itens), 0)
+    FROM vendas v
+    LEFT JOIN (
+        SELECT venda_id, SUM(quantidade) AS itens FROM itens_venda GROUP BY venda_id
+    ) i ON i.venda_id = v.id
+    WHERE COALESCE(v.status, 'concluida') <> 'cancelada' {filtro}
+    GROUP BY v.loja_id, DATE(v.data_venda), COALESCE(v.forma_pagamento, '')
+"""
+
+SQL_SOMAR_PRODUTO = """
+    INSERT INTO produtos_vendas_diarias
+        (loja_id, dia, produto_id, quantidade, valor_total, itens)
+    VALUES (%s, DATE(%s), %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        quantidade = quantidade + VALUES(quantidade),
+        valor_total = valor_total + VALUES(valor_total),
+        itens = itens + VALUES(itens)
+"""
+
+SQL_RECONSTRUIR_PRODUTOS = """
+    INSERT INTO produtos_vendas_diarias
+        (loja_id, dia, produto_id, quantidade, valor_total, itens)
+    SELECT
+        v.loja_id,
+        DATE(v.data_venda),
+        iv.produto_id,
+        COALESCE(SUM(iv.quantidade), 0),
+        COALESCE(SUM(iv.total_item), 0),
+        COUNT(*)
+    FROM itens_venda iv
+    INNER JOIN vendas v ON iv.venda_id = v.id
+    WHERE COALESCE(v.status, 'concluida') <> 'cancelada' AND iv.produto_id IS NOT NULL {filtro}
+    GROUP BY v.loja_id, DATE(v.data_venda), iv.produto_id
+"""
+
+# Critérios do ranking: coluna de ordenação (desempate pelo id do produto)
+ORDENS_MAIS_VENDIDOS = {
+    "quantidade": "quantidade_vendida",
+    "valor": "valor_total",
+}
+
+# Agrupa só o período pedido e junta o nome apenas dos ``limite`` primeiros
+SQL_MAIS_VENDIDOS = """
+    SELECT
+        t.produto_id,
+        p.nome as produto,
+        t.quantidade_vendida,
+        t.valor_total,
+        t.total_vendas
+    FROM (
+        SELECT
+            produto_id,
+            SUM(quantidade) as quantidade_vendida,
+            SUM(valor_total) as valor_total,
+            SUM(itens) as total_vendas
+        FROM produtos_vendas_diarias
+        WHERE loja_id = %s AND dia >= %s AND dia <= %s
+        GROUP BY produto_id
+        HAVING SUM(quantidade) > 0
+        ORDER BY {ordem} DESC, produto_id
+        LIMIT %s
+    ) t
+    INNER JOIN produtos p ON p.id = t.produto_id
+    ORDER BY t.{ordem} DESC, t.produto_id
+"""
+
+# Sem período informado: todo o histórico
+PRIMEIRO_DIA = date(1000, 1, 1)
+ULTIMO_DIA = date(9999, 12, 31)
+
+
+async def somar_venda(cursor, loja_id: int, data_venda, forma_pagamento, valor: float,
+                      itens: float, sinal: int = 1):
+    """Soma (``sinal=1``) ou subtrai (``sinal=-1``) uma venda do agregado do dia."""
+    await cursor.execute(SQL_SOMAR, (
+        loja_id, data_venda, forma_pagamento or '',
+        sinal, sinal * float(valor or 0), sinal * float(itens or 0)
+    ))
+
+
+async def somar_itens(cursor, loja_id: int, data_venda, itens: list, sinal: int = 1):
+    """Soma (ou subtrai) os itens de uma venda no agregado por produto.
+
+    ``itens`` são tuplas ``(produto_id, quantidade, total_item)``; o mesmo
+    produto repetido no carrinho vira uma linha só.
+    """
+    por_produto = {}
+    for produto_id, quantidade, total in itens:
+        if produto_id is None:
+            continue
+        atual = por_produto.setdefault(produto_id, [0, 0.0, 0])
+        atual[0] += int(quantidade or 0)
+        atual[1] += float(total or 0)
+        atual[2] += 1
+    if not por_produto:
+        return
+    await cursor.executemany(SQL_SOMAR_PRODUTO, [
+        (loja_id, data_venda, produto_id, sinal * quantidade, sinal * total, sinal * linhas)
+        for produto_id, (quantidade, total, linhas) in por_produto.items()
+    ])
+
+
+async def mais_vendidos(cursor, loja_id: int, inicio: date = None, fim: date = None,
+                        limite: int = 10, ordem: str = "quantidade") -> list:
+    """Os ``limite`` produtos mais vendidos entre ``inicio`` e ``fim`` (inclusive).
+
+    ``ordem`` é ``quantidade`` ou ``valor``. Datas ausentes abrem o período.
+    """
+    sql = SQL_MAIS_VENDIDOS.format(ordem=ORDENS_MAIS_VENDIDOS[ordem])
+    await cursor.execute(sql, (loja_id, inicio or PRIMEIRO_DIA, fim or ULTIMO_DIA, limite))
+    return await cursor.fetchall()
+
+
+def reconstruir(conn, loja_id: int = None) -> int:
+    """Regera os agregados a partir de ``vendas`` numa única transação.
+
+    Recebe uma conexão síncrona do driver. Durante a reconstrução as vendas
+    lidas ficam travadas; prefira rodar fora do horário de movimento.
+    """
+    cursor = conn.cursor()
+    try:
+        linhas = 0
+        for tabela, sql in (("vendas_diarias", SQL_RECONSTRUIR),
+                            ("produtos_vendas_diarias", SQL_RECONSTRUIR_PRODUTOS)):
+            if loja_id is None:
+                cursor.execute(f"DELETE FROM {tabela}")
+                cursor.execute(sql.format(filtro=""))
+            else:
+                cursor.execute(f"DELETE FROM {tabela} WHERE loja_id = %s", (loja_id,))
+                cursor.execute(sql.format(filtro="AND v.loja_id = %s"), (loja_id,))
+            linhas += cursor.rowcount
+        conn.commit()
+        return linhas
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstrói os agregados diários de vendas")
+    parser.add_argument("--loja", type=int, default=None, help="reconstrói só esta loja")
+    args = parser.parse_args()
+
+    from backend import abrir_conexao
+
+    conn = abrir_conexao()
+    try:
+        linhas = reconstruir(conn, args.loja)
+        print(f"✅ Agregados de vendas reconstruídos: {linhas} linha(s)")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,66 @@
-from fastapi import FastAPI, HTTPException, Depends,Header, status, Request, Query
+from fastapi import FastAPI, HTTPException, Depends, status, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse
 from pydantic import BaseModel, Field
 from typing import Optional, Union, Any, List
 import mysql.connector
-from mysql.connector import Error
-import hashlib, json, os
+import json, os, re, secrets
 import uuid
 from datetime import datetime, timedelta, date
-from decimal import Decimal
 import pickle
 import time
+import asyncio
+import logging
+import random
+
+import agregados
+import banco_sqlite
+import cache
+import catalogo
+import contexto
+import database
+import exportacao
+import migrate
+import paginacao
+import repositorios
+import respostas
+import senhas
+import sessions
+import tarefas
+import tokens
+from logs import logger, logger_requisicoes, configurar_logs, encerrar_logs
+from respostas import com_booleanos, resposta
 
 app = FastAPI()
 
 
 SESSION_TIMEOUT = timedelta(minutes=30)
+# Backend das sessões: memory (um worker), sqlite ou redis (vários workers)
+SESSION_BACKEND = os.getenv("WEBOS_SESSION_BACKEND", "memory")
+SESSION_SQLITE_PATH = os.getenv("WEBOS_SESSION_SQLITE", "sessoes.db")
+SESSION_REDIS_URL = os.getenv("WEBOS_SESSION_REDIS_URL", "redis://localhost:6379/0")
+SESSION_TOUCH_INTERVAL = timedelta(seconds=int(os.getenv("WEBOS_SESSION_TOUCH_SEGUNDOS", "60")))
+SESSION_SWEEP_INTERVAL = int(os.getenv("WEBOS_SESSION_VARREDURA_SEGUNDOS", "60"))
+# Modo das sessões: store (token opaco guardado no SESSION_BACKEND) ou token
+# (JWT assinado com WEBOS_SESSION_SECRET, validado sem consultar nada)
+SESSION_MODE = os.getenv("WEBOS_SESSION_MODE", "store")
+SESSION_SECRET = os.getenv("WEBOS_SESSION_SECRET", "")
+SESSION_REVOGACAO_INTERVALO = int(os.getenv("WEBOS_SESSION_REVOGACAO_SEGUNDOS", "15"))
+
+# 🔑 Senhas: custo do scrypt, hashes simultâneos e fila por processo, e por quanto
+# tempo um login repetido com a mesma senha dispensa o hash (segundos; 0 desliga)
+SENHA_SCRYPT_N = int(os.getenv("WEBOS_SENHA_SCRYPT_N", "16384"))
+SENHA_THREADS = int(os.getenv("WEBOS_SENHA_THREADS", "2"))
+SENHA_FILA = int(os.getenv("WEBOS_SENHA_FILA", "32"))
+SENHA_CACHE_TTL = float(os.getenv("WEBOS_SENHA_CACHE_SEGUNDOS", "300"))
+# 🚧 Falhas de login aceitas na janela, por usuário e por IP, antes de responder 429
+LOGIN_JANELA = float(os.getenv("WEBOS_LOGIN_JANELA_SEGUNDOS", "300"))
+LOGIN_MAX_FALHAS_USUARIO = int(os.getenv("WEBOS_LOGIN_MAX_FALHAS_USUARIO", "5"))
+LOGIN_MAX_FALHAS_IP = int(os.getenv("WEBOS_LOGIN_MAX_FALHAS_IP", "20"))
+servico_senhas = senhas.ServicoSenhas(n=SENHA_SCRYPT_N, threads=SENHA_THREADS,
+                                      max_fila=SENHA_FILA, cache_segundos=SENHA_CACHE_TTL)
+falhas_login_usuario = senhas.LimiteTentativas(LOGIN_MAX_FALHAS_USUARIO, LOGIN_JANELA)
+falhas_login_ip = senhas.LimiteTentativas(LOGIN_MAX_FALHAS_IP, LOGIN_JANELA)
 
 # 🔥 Configuração fixa do banco
 LOJA_UNICA_ID = 1  # ID da loja boutique
@@ -25,11 +71,64 @@ DB_CONFIG = {
     "database": "webos_boutique"  # Banco fixo
 }
 
-print(f"🎯 Projeto rodando apenas para a loja boutique (ID {LOJA_UNICA_ID})")
-print(f"📊 Banco de dados selecionado: {DB_CONFIG['database']}")
-
-
-def get_db_connection():
+# 🗄️ Motor do banco: mysql (servidor) ou sqlite (arquivo local, loja de um caixa)
+DB_ENGINE = os.getenv("WEBOS_DB_ENGINE", "mysql").lower()
+if DB_ENGINE not in ("mysql", "sqlite"):
+    raise ValueError(f"Motor de banco desconhecido: {DB_ENGINE}")
+DB_SQLITE = os.getenv("WEBOS_DB_SQLITE", "webos_boutique.db")
+SQLITE_MMAP_MB = int(os.getenv("WEBOS_SQLITE_MMAP_MB", "256"))
+SQLITE_CACHE_MB = int(os.getenv("WEBOS_SQLITE_CACHE_MB", "64"))
+
+# ⚙️ Limites da camada de banco (ajustáveis por variável de ambiente)
+DB_MAX_WORKERS = int(os.getenv("WEBOS_DB_MAX_WORKERS", "10"))
+DB_MAX_PESADOS = int(os.getenv("WEBOS_DB_MAX_PESADOS", "2"))
+DB_POOL_SIZE = int(os.getenv("WEBOS_DB_POOL_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("WEBOS_DB_POOL_TIMEOUT", "5"))
+DB_POOL_RECICLAR = float(os.getenv("WEBOS_DB_POOL_RECICLAR", "1800"))
+DB_POOL_PING = float(os.getenv("WEBOS_DB_POOL_PING", "30"))
+# Prepared statements guardados por conexão (repositorios.py)
+DB_PREPARADOS = int(os.getenv("WEBOS_DB_PREPARADOS", "64"))
+# Aplica as migrações pendentes (pasta migrations/) ao iniciar a API
+DB_MIGRAR = os.getenv("WEBOS_DB_MIGRAR", "1") == "1"
+# Tentativas de uma transação de venda em caso de deadlock/lock timeout
+VENDA_MAX_TENTATIVAS = int(os.getenv("WEBOS_VENDA_TENTATIVAS", "3"))
+
+# 🧠 Cache das estatísticas do dashboard (segundos; 0 desliga)
+CACHE_DASHBOARD_TTL = float(os.getenv("WEBOS_CACHE_DASHBOARD_SEGUNDOS", "30"))
+cache_dashboard = cache.CacheTTL(CACHE_DASHBOARD_TTL)
+# 📑 Tempo máximo de cada tipo em POST /api/relatorios/gerar (segundos)
+RELATORIO_TIMEOUT = float(os.getenv("WEBOS_RELATORIO_TIMEOUT_SEGUNDOS", "20"))
+# 🗂️ Fila de relatórios em segundo plano: workers, validade dos resultados em
+# disco e tempo máximo de cada tipo dentro de uma tarefa
+TAREFAS_WORKERS = int(os.getenv("WEBOS_TAREFAS_WORKERS", "2"))
+TAREFAS_TTL = float(os.getenv("WEBOS_TAREFAS_TTL_SEGUNDOS", "3600"))
+TAREFAS_TIMEOUT = float(os.getenv("WEBOS_TAREFAS_TIMEOUT_SEGUNDOS", "300"))
+TAREFAS_DIR = os.getenv("WEBOS_TAREFAS_DIR", "relatorios_gerados")
+fila_relatorios = tarefas.FilaTarefas(TAREFAS_DIR, TAREFAS_WORKERS, TAREFAS_TTL)
+# 🏆 Cache do ranking de mais vendidos, por (loja, período, N, ordem); 0 desliga
+CACHE_MAIS_VENDIDOS_TTL = float(os.getenv("WEBOS_CACHE_MAIS_VENDIDOS_SEGUNDOS", "300"))
+cache_mais_vendidos = cache.CacheTTL(CACHE_MAIS_VENDIDOS_TTL)
+
+# 🏷️ Catálogo de produtos em memória: intervalo da verificação de versão (segundos)
+CATALOGO_VERIFICACAO = int(os.getenv("WEBOS_CATALOGO_VERIFICACAO_SEGUNDOS", "15"))
+catalogo_produtos = catalogo.Catalogo()
+
+# 📄 Tamanho de página da listagem de vendas (pedidos maiores são reduzidos)
+VENDAS_LIMITE_PADRAO = 50
+VENDAS_LIMITE_MAXIMO = 100
+
+# 📝 Logs: formato texto ou json, nível e fração de requisições registradas
+LOG_LEVEL = os.getenv("WEBOS_LOG_NIVEL", "INFO")
+LOG_FORMAT = os.getenv("WEBOS_LOG_FORMATO", "texto")
+LOG_SAMPLE_RATE = float(os.getenv("WEBOS_LOG_AMOSTRAGEM", "1.0"))
+configurar_logs(LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_RATE)
+
+logger.info(f"🎯 Projeto rodando apenas para a loja boutique (ID {LOJA_UNICA_ID})")
+logger.info(f"📊 Banco de dados selecionado: {DB_SQLITE if DB_ENGINE == 'sqlite' else DB_CONFIG['database']} ({DB_ENGINE})")
+
+
+def abrir_conexao_mysql():
+    """Abre uma conexão física; chamado só pelo pool."""
     try:
         conn = mysql.connector.connect(
             host=DB_CONFIG["host"],
@@ -38,69 +137,72 @@ def get_db_connection():
             database=DB_CONFIG["database"],
             auth_plugin='mysql_native_password',
             autocommit=False,
-            pool_size=5,
-            pool_reset_session=True,
             connection_timeout=30
         )
-        print(f"🔗 Conectado ao banco: {DB_CONFIG['database']}")
+        logger.debug(f"🔗 Nova conexão com o banco: {DB_CONFIG['database']}")
         return conn
     except mysql.connector.Error as err:
-        print(f"❌ Erro de conexão MySQL: {err}")
+        logger.error(f"❌ Erro de conexão MySQL: {err}")
         raise err
 
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
 
-def verificar_credenciais(nome: str, password: str):
-    conn = get_db_connection()
-    if conn is None:
-        return None
-    
-    try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(
-            "SELECT id, nome, password, perfil, loja_id FROM usuarios WHERE nome = %s",
-            (nome,)
-        )
-        usuarios = cursor.fetchall()
-        
-        if not usuarios:
-            return None
-        
-        for usuario in usuarios:
-            hashed_password = hash_password(password)
-            if usuario['password'] == hashed_password:
-                return usuario
-            elif password == usuario['password']:
-                return usuario
-        return None
-        
-    except Error as e:
-        print(f"Erro ao verificar credenciais: {e}")
-        return None
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
+def abrir_conexao_sqlite():
+    """Abre uma conexão com o arquivo SQLite; chamado só pelo pool."""
+    conn = banco_sqlite.abrir(DB_SQLITE, mmap_mb=SQLITE_MMAP_MB, cache_mb=SQLITE_CACHE_MB,
+                              comandos_em_cache=DB_PREPARADOS)
+    logger.debug(f"🔗 Nova conexão com o banco: {DB_SQLITE}")
+    return conn
+
+
+def abrir_conexao():
+    """Conexão física do motor configurado em WEBOS_DB_ENGINE."""
+    return abrir_conexao_sqlite() if DB_ENGINE == "sqlite" else abrir_conexao_mysql()
+
 
+def criar_pool():
+    return database.ConnectionPool(
+        abrir_conexao,
+        tamanho=DB_POOL_SIZE,
+        timeout=DB_POOL_TIMEOUT,
+        reciclar_apos=DB_POOL_RECICLAR,
+        ping_apos=DB_POOL_PING,
+        max_preparados=DB_PREPARADOS,
+    )
+
+
+def get_db_connection():
+    """Empresta uma conexão do pool (uso síncrono); ``close()`` a devolve."""
+    return database.obter_pool().obter()
 
 def get_loja_id(session_data: dict):
     """Sempre retorna a loja boutique"""
     return LOJA_UNICA_ID
 
 
-def serialize_mysql_data(data):
-    if isinstance(data, dict):
-        return {key: serialize_mysql_data(value) for key, value in data.items()}
-    elif isinstance(data, list):
-        return [serialize_mysql_data(item) for item in data]
-    elif isinstance(data, Decimal):
-        return float(data)
-    elif isinstance(data, (datetime, date)):
-        return data.isoformat()
-    elif isinstance(data, (bytes, bytearray)):
-        return data.decode('utf-8', errors='ignore')
-    else:
-        return data
+# =============================================
+# INTERVALOS DE DATA
+# =============================================
+# Filtros de data usam intervalos semiabertos [inicio, fim) calculados aqui,
+# sem funções sobre data_venda, para que o índice (loja_id, data_venda) sirva.
+
+def intervalo_dias(inicio: date, fim: date):
+    """Do início de ``inicio`` até o início do dia seguinte a ``fim``."""
+    return (datetime.combine(inicio, datetime.min.time()),
+            datetime.combine(fim + timedelta(days=1), datetime.min.time()))
+
+
+def intervalo_mes(dia: date):
+    inicio = dia.replace(day=1)
+    proximo = (inicio + timedelta(days=32)).replace(day=1)
+    return intervalo_dias(inicio, proximo - timedelta(days=1))
+
+
+def ler_data(valor: str, campo: str) -> date:
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Data inválida em '{campo}' (use AAAA-MM-DD)")
+
 
 # 1. CRIAR A APLICAÇÃO PRIMEIRO
 app = FastAPI(title="WebOS Loja-Única API", version="1.0.0")
@@ -115,28 +217,69 @@ app.add_middleware(
 )
 
 # ✅ SESSÕES ATIVAS
-active_sessions = {}
-def verificar_sessao(session_token: str):
+session_store = sessions.criar_store(
+    SESSION_BACKEND,
+    SESSION_TIMEOUT.total_seconds(),
+    sqlite_caminho=SESSION_SQLITE_PATH,
+    redis_url=SESSION_REDIS_URL,
+)
+
+# ✅ TOKENS ASSINADOS (WEBOS_SESSION_MODE=token)
+assinador_tokens = None
+revogacoes = tokens.ListaRevogacao()
+if SESSION_MODE == "token":
+    if not SESSION_SECRET:
+        logger.warning("⚠️ WEBOS_SESSION_SECRET não definido: usando segredo aleatório, válido só neste processo")
+    assinador_tokens = tokens.AssinadorTokens(SESSION_SECRET or secrets.token_hex(32), SESSION_TIMEOUT.total_seconds())
+elif SESSION_MODE != "store":
+    raise ValueError(f"Modo de sessão desconhecido: {SESSION_MODE}")
+
+def verificar_token(session_token: str):
+    """Sessão a partir do token assinado, sem consultar store nem banco."""
+    carga = assinador_tokens.verificar(session_token)
+    if carga is None:
+        logger.info("❌ Token de sessão inválido ou expirado")
+        raise HTTPException(status_code=401, detail="Sessão inválida ou expirada")
+    if revogacoes.revogado(carga):
+        logger.info("❌ Token de sessão revogado")
+        raise HTTPException(status_code=401, detail="Sessão encerrada")
+    
+    session_data = tokens.sessao_da_carga(carga)
+    session_data['created_at'] = datetime.fromtimestamp(carga['iat'])
+    session_data['carga_token'] = carga
+    return session_data
+
+async def chamar_store(metodo, *args):
+    """Chama o store de sessões sem travar o event loop (sqlite/redis fazem I/O)."""
+    if not session_store.bloqueante:
+        return metodo(*args)
+    return await asyncio.to_thread(metodo, *args)
+
+async def verificar_sessao(session_token: str):
     """Retorna os dados da sessão se estiver ativa, senão levanta exceção"""
     # Limpar "Bearer " se presente
     if session_token.startswith('Bearer '):
         session_token = session_token[7:]
     
-    session_data = active_sessions.get(session_token)
+    if assinador_tokens is not None:
+        return verificar_token(session_token)
+    
+    session_data = await chamar_store(session_store.get, session_token)
     if not session_data:
-        print(f"❌ Sessão não encontrada para token: {session_token[:10]}...")
+        logger.info("❌ Sessão não encontrada")
         raise HTTPException(status_code=401, detail="Sessão não encontrada")
 
     # Verificar timeout
     tempo_decorrido = datetime.now() - session_data['created_at']
     if tempo_decorrido > SESSION_TIMEOUT:
-        print(f"⏰ Sessão expirada: {tempo_decorrido} > {SESSION_TIMEOUT}")
-        del active_sessions[session_token]
+        logger.info(f"⏰ Sessão expirada: {tempo_decorrido} > {SESSION_TIMEOUT}")
+        await chamar_store(session_store.delete, session_token)
         raise HTTPException(status_code=401, detail="Sessão expirada")
     
-    # Atualizar tempo de criação para manter sessão ativa
-    session_data['created_at'] = datetime.now()
-    print(f"✅ Sessão válida: {session_data['nome']} - {tempo_decorrido}")
+    # Renovar a sessão (no máximo uma escrita por SESSION_TOUCH_INTERVAL)
+    if tempo_decorrido > SESSION_TOUCH_INTERVAL:
+        await chamar_store(session_store.touch, session_token)
+    logger.debug(f"✅ Sessão válida: {session_data['nome']} - {tempo_decorrido}")
     
     return session_data
 
@@ -283,9 +426,10 @@ class ProdutoResponse(ProdutoBase):
 
 class ProdutoListResponse(BaseModel):
     produtos: List[ProdutoResponse]
-    total: int
-    pagina: int
-    total_paginas: int
+    total: Optional[int] = None
+    pagina: Optional[int] = None
+    total_paginas: Optional[int] = None
+    next_cursor: Optional[str] = None
 
 class DashboardStats(BaseModel):
     totalProdutos: int
@@ -366,18 +510,43 @@ class ClienteResponse(ClienteBase):
         from_attributes = True
 
 # ✅ DEPENDÊNCIAS DE AUTENTICAÇÃO
-async def obter_usuario_atual(request: Request):
+def extrair_token(request: Request):
     session_token = request.headers.get("Authorization") or request.query_params.get("token")
+    if session_token and session_token.startswith('Bearer '):
+        session_token = session_token[7:]
+    return session_token
+
+async def obter_usuario_atual(request: Request):
+    session_token = extrair_token(request)
     
     if not session_token:
         raise HTTPException(status_code=401, detail="Token de sessão não fornecido")
     
-    session_data = verificar_sessao(session_token)
+    session_data = await verificar_sessao(session_token)
     if not session_data:
         raise HTTPException(status_code=401, detail="Sessão inválida ou expirada")
     
+    # Renovação deslizante: o token novo sai no header X-Session-Token
+    if assinador_tokens is not None:
+        novo_token = assinador_tokens.renovar(session_data['carga_token'], SESSION_TOUCH_INTERVAL.total_seconds())
+        if novo_token:
+            request.state.token_renovado = novo_token
+    
     return session_data
 
+async def revogar_sessao(cursor, chave: str, expira_em: float):
+    """Grava a revogação (vale para todos os workers após a sincronização)."""
+    instante = time.time()
+    await tokens.gravar_revogacao(cursor, chave, instante, expira_em)
+    revogacoes.revogar(chave, instante)
+
+async def encerrar_sessoes_usuario(cursor, usuario_id: int):
+    """Derruba as sessões abertas do usuário (store ou tokens já emitidos)."""
+    if assinador_tokens is None:
+        await chamar_store(session_store.delete_user, usuario_id)
+        return
+    await revogar_sessao(cursor, tokens.chave_usuario(usuario_id), time.time() + SESSION_TIMEOUT.total_seconds())
+
 def verificar_permissao(session_data: dict, perfis_permitidos: list):
     if session_data['perfil'] not in perfis_permitidos:
         raise HTTPException(
@@ -385,22 +554,38 @@ def verificar_permissao(session_data: dict, perfis_permitidos: list):
             detail=f"Acesso não autorizado. Perfil necessário: {', '.join(perfis_permitidos)}"
         )
 
-async def obter_admin(request: Request):
-    session_data = await obter_usuario_atual(request)
+# As dependências abaixo usam Depends(obter_usuario_atual): o FastAPI guarda o
+# resultado por requisição, então a sessão é verificada uma vez só
+async def obter_admin(session_data: dict = Depends(obter_usuario_atual)):
     verificar_permissao(session_data, ['admin'])
     return session_data
 
-async def obter_vendedor(request: Request):
-    session_data = await obter_usuario_atual(request)
+async def obter_vendedor(session_data: dict = Depends(obter_usuario_atual)):
     verificar_permissao(session_data, ['admin', 'vendedor'])
     return session_data
 
-async def obter_todos_usuarios(request: Request):
-    session_data = await obter_usuario_atual(request)
+async def obter_todos_usuarios(session_data: dict = Depends(obter_usuario_atual)):
     return session_data
 
+# ✅ CONTEXTO DA REQUISIÇÃO: sessão + conexão emprestada só se alguma consulta rodar
+async def contexto_requisicao(session_data: dict = Depends(obter_usuario_atual)):
+    async with contexto.Contexto(session_data, get_loja_id(session_data)) as ctx:
+        yield ctx
+
+def contexto_com_perfil(perfis_permitidos: list, pesado: bool = False):
+    """Dependência do contexto que exige um dos perfis; ``pesado`` para relatórios."""
+    async def dependencia(ctx: contexto.Contexto = Depends(contexto_requisicao)):
+        verificar_permissao(ctx.sessao, perfis_permitidos)
+        ctx.pesado = ctx.pesado or pesado
+        return ctx
+    return dependencia
+
+contexto_admin = contexto_com_perfil(['admin'])
+contexto_vendedor = contexto_com_perfil(['admin', 'vendedor'])
+contexto_relatorio = contexto_com_perfil(['admin'], pesado=True)
+
 # ✅ INICIALIZAÇÃO DA APLICAÇÃO
-app = FastAPI(title="WebOS API - Dashboard & Estoque")
+app = FastAPI(title="WebOS API - Dashboard & Estoque", default_response_class=respostas.RespostaJSON)
 
 app.add_middleware(
     CORSMiddleware,
@@ -408,24 +593,234 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Session-Token"],
 )
 
 
 
-# ✅ Middleware para debug
+@app.on_event("startup")
+async def iniciar_banco():
+    database.configurar(criar_pool(), max_workers=DB_MAX_WORKERS, max_pesados=DB_MAX_PESADOS)
+
+
+@app.on_event("startup")
+async def aplicar_migracoes():
+    if not DB_MIGRAR:
+        return
+    try:
+        async with contexto.Contexto() as ctx:
+            conn = await ctx.conexao()
+            novas = await database.executar(migrate.aplicar, conn.raw)
+        if novas:
+            logger.info(f"🛠️ Migrações aplicadas: {', '.join(novas)}")
+    except Exception as e:
+        logger.error(f"❌ Erro ao aplicar migrações: {e}")
+
+
+@app.on_event("shutdown")
+async def encerrar_banco():
+    database.encerrar()
+
+
+async def varrer_sessoes():
+    """Remove periodicamente as sessões expiradas do store."""
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+        try:
+            removidas = await asyncio.to_thread(session_store.sweep, SESSION_TIMEOUT.total_seconds())
+            if removidas:
+                logger.info(f"🧹 Sessões expiradas removidas: {removidas}")
+        except Exception as e:
+            logger.warning(f"⚠️ Erro na varredura de sessões: {e}")
+
+
+@app.on_event("startup")
+async def iniciar_varredura_sessoes():
+    app.state.varredura_sessoes = asyncio.create_task(varrer_sessoes())
+
+
+@app.on_event("shutdown")
+async def encerrar_sessoes():
+    app.state.varredura_sessoes.cancel()
+    session_store.close()
+
+
+async def carregar_revogacoes():
+    async with contexto.Contexto() as ctx:
+        revogacoes.substituir(await tokens.ler_revogacoes(ctx.cursor(dictionary=False)))
+        await ctx.commit()
+
+
+async def sincronizar_revogacoes():
+    """Relê a lista de revogação gravada pelos outros workers."""
+    while True:
+        await asyncio.sleep(SESSION_REVOGACAO_INTERVALO)
+        try:
+            await carregar_revogacoes()
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao sincronizar revogações de sessão: {e}")
+
+
+@app.on_event("startup")
+async def iniciar_revogacoes():
+    app.state.sincronizacao_revogacoes = None
+    if assinador_tokens is None:
+        return
+    try:
+        await carregar_revogacoes()
+    except Exception as e:
+        logger.warning(f"⚠️ Lista de revogação não carregada na inicialização: {e}")
+    app.state.sincronizacao_revogacoes = asyncio.create_task(sincronizar_revogacoes())
+
+
+@app.on_event("shutdown")
+async def encerrar_revogacoes():
+    if app.state.sincronizacao_revogacoes:
+        app.state.sincronizacao_revogacoes.cancel()
+
+
+# =============================================
+# CATÁLOGO DE PRODUTOS EM MEMÓRIA
+# =============================================
+
+def primeiro_valor(linhas: list, coluna: str):
+    """``coluna`` da primeira linha (cursor de dicionário ou de tuplas)."""
+    if not linhas:
+        return None
+    return linhas[0][coluna] if isinstance(linhas[0], dict) else linhas[0][0]
+
+
+async def incrementar_versao_catalogo(cursor, loja_id: int):
+    """Registra uma mudança no catálogo da loja; retorna a nova versão.
+
+    Roda dentro da transação da escrita. ``LAST_INSERT_ID(expr)`` (MySQL) e
+    ``RETURNING`` (SQLite) devolvem o valor novo sem um SELECT extra.
+    """
+    if DB_ENGINE == "sqlite":
+        await cursor.execute("""
+            INSERT INTO catalogo_versoes (loja_id, versao) VALUES (%s, 1)
+            ON CONFLICT (loja_id) DO UPDATE SET versao = versao + 1
+            RETURNING versao
+        """, (loja_id,))
+        return primeiro_valor(await cursor.fetchall(), "versao")
+    await cursor.execute("""
+        INSERT INTO catalogo_versoes (loja_id, versao) VALUES (%s, LAST_INSERT_ID(1))
+        ON DUPLICATE KEY UPDATE versao = LAST_INSERT_ID(versao + 1)
+    """, (loja_id,))
+    return cursor.lastrowid or None
+
+
+def variacoes_estoque(itens: list, campo: str, sinal: int, variacoes: dict = None) -> dict:
+    """Acumula ``sinal * item[campo]`` por produto, para ajustar o catálogo."""
+    variacoes = {} if variacoes is None else variacoes
+    for item in itens:
+        if item['produto_id']:
+            variacoes[item['produto_id']] = variacoes.get(item['produto_id'], 0) + sinal * item[campo]
+    return variacoes
+
+
+async def ler_versao_catalogo(cursor, loja_id: int) -> int:
+    await cursor.execute("SELECT versao FROM catalogo_versoes WHERE loja_id = %s", (loja_id,))
+    linha = await cursor.fetchone()
+    return linha['versao'] if linha else 0
+
+
+async def carregar_catalogo(loja_id: int):
+    async with contexto.Contexto() as ctx:
+        cursor = ctx.cursor()
+        versao = await ler_versao_catalogo(cursor, loja_id)
+        await cursor.execute(catalogo.SQL_PRODUTOS, (loja_id,))
+        produtos = await cursor.fetchall()
+        catalogo_produtos.carregar(loja_id, produtos, versao)
+        logger.info(f"🏷️ Catálogo da loja {loja_id} carregado: {len(produtos)} produtos (versão {versao})")
+
+
+async def versao_catalogo_no_banco(loja_id: int) -> int:
+    async with contexto.Contexto() as ctx:
+        return await ler_versao_catalogo(ctx.cursor(), loja_id)
+
+
+async def sincronizar_catalogo():
+    """Recarrega o catálogo quando outro worker mudou a versão da loja."""
+    while True:
+        await asyncio.sleep(CATALOGO_VERIFICACAO)
+        for loja_id in catalogo_produtos.lojas() or [LOJA_UNICA_ID]:
+            try:
+                if await versao_catalogo_no_banco(loja_id) != catalogo_produtos.versao(loja_id):
+                    await carregar_catalogo(loja_id)
+            except Exception as e:
+                logger.warning(f"⚠️ Erro ao sincronizar catálogo da loja {loja_id}: {e}")
+
+
+@app.on_event("startup")
+async def iniciar_catalogo():
+    try:
+        await carregar_catalogo(LOJA_UNICA_ID)
+    except Exception as e:
+        logger.warning(f"⚠️ Catálogo não carregado na inicialização, consultas vão ao banco: {e}")
+    app.state.sincronizacao_catalogo = asyncio.create_task(sincronizar_catalogo())
+
+
+@app.on_event("shutdown")
+async def encerrar_catalogo():
+    app.state.sincronizacao_catalogo.cancel()
+
+
+@app.on_event("startup")
+async def iniciar_fila_relatorios():
+    fila_relatorios.iniciar()
+
+
+@app.on_event("shutdown")
+async def encerrar_fila_relatorios():
+    await fila_relatorios.encerrar()
+
+
+@app.on_event("shutdown")
+async def encerrar_servico_senhas():
+    servico_senhas.encerrar()
+
+
+@app.on_event("shutdown")
+async def encerrar_registro_logs():
+    encerrar_logs()
+
+
+# ✅ Log de requisições: só método, rota, status e tempos (sem headers nem query string)
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    start_time = time.time()
-    
-    # Log da requisição
-    print(f"🔍 REQUEST: {request.method} {request.url}")
-    print(f"📋 Headers: {dict(request.headers)}")
-    
+    start_time = time.perf_counter()
+    metricas_db = database.iniciar_medicao()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        duracao_ms = (time.perf_counter() - start_time) * 1000
+        nivel = logging.WARNING if status_code >= 500 else logging.INFO
+        logger_requisicoes.log(
+            nivel,
+            f"{request.method} {request.url.path} {status_code} {duracao_ms:.1f}ms",
+            extra={
+                "metodo": request.method,
+                "rota": request.url.path,
+                "status": status_code,
+                "duracao_ms": round(duracao_ms, 2),
+                "db_ms": round(metricas_db.tempo * 1000, 2),
+                "db_operacoes": metricas_db.operacoes,
+                "amostrar": True,
+            },
+        )
+
+
+# ✅ Token de sessão renovado (modo token) vai no header da resposta
+@app.middleware("http")
+async def enviar_token_renovado(request: Request, call_next):
     response = await call_next(request)
-    
-    process_time = time.time() - start_time
-    print(f"📤 RESPONSE: {response.status_code} - {process_time:.2f}s")
-    
+    novo_token = getattr(request.state, "token_renovado", None)
+    if novo_token:
+        response.headers["X-Session-Token"] = novo_token
     return response
 # =============================================
 # ENDPOINTS DE AUTENTICAÇÃO
@@ -439,36 +834,85 @@ async def root():
 async def health_check():
     return {"status": "healthy", "server": "WebOS API", "modo": "dashboard-estoque"}
 
+@app.get("/api/metrics")
+async def metricas(session_data: dict = Depends(obter_admin)):
+    return {
+        "pool": database.estatisticas(),
+        "cache_dashboard": cache_dashboard.estatisticas(),
+        "cache_mais_vendidos": cache_mais_vendidos.estatisticas(),
+        "tarefas_relatorios": fila_relatorios.estatisticas(),
+        "catalogo": catalogo_produtos.estatisticas(),
+        "sessoes": {"modo": SESSION_MODE, "revogacoes": len(revogacoes)},
+        "senhas": servico_senhas.estatisticas(),
+        "login_bloqueios": {"usuarios": len(falhas_login_usuario), "ips": len(falhas_login_ip)},
+    }
+
+def bloqueio_login(nome: str, ip: str) -> float:
+    return max(falhas_login_usuario.bloqueado(nome.lower()), falhas_login_ip.bloqueado(ip))
+
+
+def registrar_falha_login(nome: str, ip: str):
+    falhas_login_usuario.registrar_falha(nome.lower())
+    falhas_login_ip.registrar_falha(ip)
+
+
+async def usuarios_com_nome(nome: str) -> list:
+    async with contexto.Contexto() as ctx:
+        return await repositorios.UsuarioRepo(ctx).credenciais(nome)
+
+
+async def regravar_senha(usuario_id: int, hash_antigo: str, hash_novo: str):
+    async with contexto.Contexto() as ctx:
+        await repositorios.UsuarioRepo(ctx).regravar_senha(usuario_id, hash_antigo, hash_novo)
+        await ctx.commit()
+
+
+async def autenticar(nome: str, password: str):
+    """Usuário cujo hash confere com ``password`` (ou ``None``).
+
+    A conexão é devolvida antes do hash, para uma fila de logins não prender
+    o pool. Hashes antigos (SHA-256 ou texto puro) são regravados em scrypt.
+    """
+    usuarios = await usuarios_com_nome(nome)
+    if not usuarios:
+        await servico_senhas.gastar_tempo(password)
+        return None
+    
+    for usuario in usuarios:
+        confere, precisa_atualizar = await servico_senhas.verificar(nome, password, usuario['password'])
+        if not confere:
+            continue
+        if precisa_atualizar:
+            try:
+                novo_hash = await servico_senhas.gerar_hash(password)
+                await regravar_senha(usuario['id'], usuario['password'], novo_hash)
+                servico_senhas.lembrar(nome, password, novo_hash)
+                logger.info(f"🔑 Senha do usuário {usuario['id']} migrada para scrypt")
+            except Exception as e:
+                # O login segue valendo; a migração é tentada de novo no próximo
+                logger.warning(f"⚠️ Não foi possível migrar a senha do usuário {usuario['id']}: {e}")
+        return usuario
+    return None
+
+
 @app.post("/api/login", response_model=LoginResponse)
-async def login(login_data: LoginData):
-    conn = get_db_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Erro de conexão com o banco")
+async def login(login_data: LoginData, request: Request):
+    ip = request.client.host if request.client else "desconhecido"
+    espera = bloqueio_login(login_data.nome, ip)
+    if espera > 0:
+        logger.warning(f"🚧 Login bloqueado por excesso de tentativas: {login_data.nome} ({ip})")
+        raise HTTPException(status_code=429, detail="Muitas tentativas de login. Tente novamente mais tarde",
+                            headers={"Retry-After": str(int(espera) + 1)})
     
     try:
-        cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute(
-            "SELECT id, nome, password, perfil, loja_id FROM usuarios WHERE nome = %s",
-            (login_data.nome,)
-        )
-        usuarios = cursor.fetchall()
-        
-        if not usuarios:
-            raise HTTPException(status_code=401, detail="Credenciais inválidas")
-        
-        usuario_encontrado = None
-        
-        for usuario in usuarios:
-            hashed_password = hash_password(login_data.password)
-            if usuario['password'] == hashed_password or login_data.password == usuario['password']:
-                usuario_encontrado = usuario
-                break
+        usuario_encontrado = await autenticar(login_data.nome, login_data.password)
         
         if not usuario_encontrado:
+            registrar_falha_login(login_data.nome, ip)
             raise HTTPException(status_code=401, detail="Credenciais inválidas")
         
-        session_token = str(uuid.uuid4())
+        falhas_login_usuario.limpar(login_data.nome.lower())
+        
         session_data = {
             'user_id': usuario_encontrado['id'],
             'nome': usuario_encontrado['nome'],
@@ -477,9 +921,13 @@ async def login(login_data: LoginData):
             'created_at': datetime.now()
         }
         
-        active_sessions[session_token] = session_data
+        if assinador_tokens is not None:
+            session_token = assinador_tokens.emitir(session_data)
+        else:
+            session_token = str(uuid.uuid4())
+            await chamar_store(session_store.set, session_token, session_data)
         
-        print(f"✅ Login realizado: {usuario_encontrado['nome']} - Loja ID: {usuario_encontrado['loja_id']}")
+        logger.info(f"✅ Login realizado: {usuario_encontrado['nome']} - Loja ID: {usuario_encontrado['loja_id']}")
         
         return LoginResponse(
             success=True,
@@ -492,50 +940,40 @@ async def login(login_data: LoginData):
         
     except HTTPException:
         raise
+    except senhas.ServicoOcupado:
+        logger.warning("⚠️ Fila de verificação de senhas cheia")
+        raise HTTPException(status_code=503, detail="Servidor ocupado, tente novamente em instantes",
+                            headers={"Retry-After": "1"})
     except Exception as e:
-        print(f"Erro no login: {e}")
+        logger.error(f"Erro no login: {e}")
         raise HTTPException(status_code=500, detail=f"Erro no login: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 @app.get("/api/user-info")
-def user_info(authorization: str = Header(None)):
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Token não enviado")
-
-    print(f"📝 Token recebido: {authorization}")
-    session = verificar_sessao(authorization)
-    
-    if not session:
-        print("⚠️ Sessão inválida ou expirada")
-        raise HTTPException(status_code=401, detail="Sessão inválida ou expirada")
-
-    print(f"📝 Sessão ativa: {session}")
+async def user_info(session: dict = Depends(obter_todos_usuarios)):
+    logger.debug(f"📝 Sessão ativa: {session.get('nome')}")
 
     # Retorna apenas os dados essenciais do usuário
-    user_data = {
-        "id": session.get("id"),
+    return {
+        "id": session.get("user_id"),
         "nome": session.get("nome"),
         "perfil": session.get("perfil"),
         "loja_id": session.get("loja_id", 1),  # Mono-loja: default 1
     }
-    return user_data
-
-    if cursor: cursor.close()
-    if conn: conn.close()
 
 @app.post("/api/logout")
-async def logout(session_data: dict = Depends(obter_todos_usuarios)):
-    session_token = None
-    
-    for token, data in active_sessions.items():
-        if data['user_id'] == session_data['user_id']:
-            session_token = token
-            break
+async def logout(request: Request, ctx: contexto.Contexto = Depends(contexto_requisicao)):
+    if assinador_tokens is None:
+        await chamar_store(session_store.delete, extrair_token(request))
+        return {"success": True, "message": "Logout realizado com sucesso"}
     
-    if session_token:
-        del active_sessions[session_token]
+    try:
+        carga = ctx.sessao['carga_token']
+        await revogar_sessao(ctx.cursor(dictionary=False), carga['jti'], carga['exp'])
+        await ctx.commit()
+        request.state.token_renovado = None
+    except Exception as e:
+        logger.error(f"❌ Erro ao revogar token no logout: {e}")
+        raise HTTPException(status_code=500, detail="Erro ao encerrar a sessão")
     
     return {"success": True, "message": "Logout realizado com sucesso"}
 
@@ -543,78 +981,84 @@ async def logout(session_data: dict = Depends(obter_todos_usuarios)):
 # ENDPOINTS DO DASHBOARD
 # =============================================
 
-@app.get("/api/dashboard/estatisticas", response_model=DashboardStats)
-async def carregar_estatisticas(session_data: dict = Depends(obter_todos_usuarios)):
-    conn = None
-    cursor = None
-    try:
-        print(f"📊 Carregando estatísticas para usuário: {session_data['nome']}")
+def invalidar_caches(loja_id: int):
+    """Descarta o que foi calculado para a loja depois de uma escrita."""
+    cache_dashboard.invalidar(loja_id)
+    cache_mais_vendidos.invalidar_grupo(loja_id)
+    fila_relatorios.invalidar_grupo(loja_id)
+
+
+async def calcular_mais_vendidos(loja_id: int, inicio: Optional[date], fim: Optional[date],
+                                 limite: int, ordem: str) -> list:
+    async with contexto.Contexto() as ctx:
+        return await agregados.mais_vendidos(ctx.cursor(), loja_id, inicio, fim, limite, ordem)
+
+
+async def produtos_mais_vendidos(loja_id: int, inicio: Optional[date] = None, fim: Optional[date] = None,
+                                 limite: int = 10, ordem: str = "quantidade") -> list:
+    """Ranking do agregado por produto, em cache por (loja, período, N, ordem).
+
+    Abre a própria conexão: chame antes de pegar a conexão da rota.
+    """
+    chave = (loja_id, inicio, fim, limite, ordem)
+    return await cache_mais_vendidos.obter_ou_carregar(
+        chave, lambda: calcular_mais_vendidos(loja_id, inicio, fim, limite, ordem)
+    )
+
+
+async def calcular_estatisticas(loja_id: int) -> DashboardStats:
+    """Consulta os números do dashboard; erros sobem para quem chamou."""
+    async with contexto.Contexto() as ctx:
+        cursor = ctx.cursor()
         
-        conn = get_db_connection()
-        if not conn:
-            print("❌ Erro de conexão com o banco")
-            raise HTTPException(status_code=500, detail="Erro de conexão com o banco")
-            
-        cursor = conn.cursor(dictionary=True)
+        hoje = date.today()
+        mes = tuple(limite.date() for limite in intervalo_mes(hoje))
         
-        loja_id = get_loja_id(session_data)
-        print(f"🏪 Loja ID: {loja_id}")
+        await cursor.execute("""
+            SELECT 
+                -- Total de Produtos
+                (SELECT COUNT(*) FROM produtos WHERE loja_id = %s AND ativo = 1) as total_produtos,
+                
+                -- Vendas do Mês
+                (SELECT COALESCE(SUM(valor_total), 0) FROM vendas_diarias 
+                 WHERE loja_id = %s AND dia >= %s AND dia < %s) as vendas_mes,
+                
+                -- Estoque Baixo
+                (SELECT COUNT(*) FROM produtos 
+                 WHERE loja_id = %s AND ativo = 1 
+                 AND estoque_atual <= estoque_minimo AND estoque_atual > 0) as estoques_baixos,
+                
+                -- Total de Clientes
+                (SELECT COUNT(*) FROM clientes WHERE loja_id = %s AND ativo = 1) as total_clientes,
+                
+                -- Ticket Médio
+                (SELECT COALESCE(SUM(valor_total) / NULLIF(SUM(quantidade_vendas), 0), 0) FROM vendas_diarias 
+                 WHERE loja_id = %s AND dia >= %s AND dia < %s) as ticket_medio,
+                
+                -- Vendas de Hoje
+                (SELECT COALESCE(SUM(valor_total), 0) FROM vendas_diarias 
+                 WHERE loja_id = %s AND dia = %s) as vendas_hoje,
+                
+                -- Produtos Sem Estoque
+                (SELECT COUNT(*) FROM produtos 
+                 WHERE loja_id = %s AND ativo = 1 AND estoque_atual = 0) as produtos_sem_estoque,
+                 
+                -- Total de Vendas (quantidade)
+                (SELECT COALESCE(SUM(quantidade_vendas), 0) FROM vendas_diarias 
+                 WHERE loja_id = %s AND dia >= %s AND dia < %s) as total_vendas
+        """, (
+            loja_id,
+            loja_id, *mes,
+            loja_id,
+            loja_id,
+            loja_id, *mes,
+            loja_id, hoje,
+            loja_id,
+            loja_id, *mes,
+        ))
         
-        # ✅ Query corrigida com tratamento de erro
-        try:
-            cursor.execute("""
-                SELECT 
-                    -- Total de Produtos
-                    (SELECT COUNT(*) FROM produtos WHERE loja_id = %s AND ativo = 1) as total_produtos,
-                    
-                    -- Vendas do Mês
-                    (SELECT COALESCE(SUM(total_venda), 0) FROM vendas 
-                     WHERE loja_id = %s AND MONTH(data_venda) = MONTH(CURRENT_DATE()) 
-                     AND YEAR(data_venda) = YEAR(CURRENT_DATE())) as vendas_mes,
-                    
-                    -- Estoque Baixo
-                    (SELECT COUNT(*) FROM produtos 
-                     WHERE loja_id = %s AND ativo = 1 
-                     AND estoque_atual <= estoque_minimo AND estoque_atual > 0) as estoques_baixos,
-                    
-                    -- Total de Clientes
-                    (SELECT COUNT(*) FROM clientes WHERE loja_id = %s AND ativo = 1) as total_clientes,
-                    
-                    -- Ticket Médio
-                    (SELECT COALESCE(AVG(total_venda), 0) FROM vendas 
-                     WHERE loja_id = %s AND MONTH(data_venda) = MONTH(CURRENT_DATE()) 
-                     AND YEAR(data_venda) = YEAR(CURRENT_DATE())) as ticket_medio,
-                    
-                    -- Vendas de Hoje
-                    (SELECT COALESCE(SUM(total_venda), 0) FROM vendas 
-                     WHERE loja_id = %s AND DATE(data_venda) = CURDATE()) as vendas_hoje,
-                    
-                    -- Produtos Sem Estoque
-                    (SELECT COUNT(*) FROM produtos 
-                     WHERE loja_id = %s AND ativo = 1 AND estoque_atual = 0) as produtos_sem_estoque,
-                     
-                    -- Total de Vendas (quantidade)
-                    (SELECT COUNT(*) FROM vendas 
-                     WHERE loja_id = %s AND MONTH(data_venda) = MONTH(CURRENT_DATE()) 
-                     AND YEAR(data_venda) = YEAR(CURRENT_DATE())) as total_vendas
-            """, [loja_id] * 8)
-            
-            stats = cursor.fetchone()
-            print(f"📈 Estatísticas obtidas: {stats}")
-            
-        except Exception as db_error:
-            print(f"❌ Erro na query do banco: {db_error}")
-            # Fallback seguro
-            stats = {
-                'total_produtos': 0,
-                'vendas_mes': 0,
-                'estoques_baixos': 0,
-                'total_clientes': 0,
-                'ticket_medio': 0,
-                'vendas_hoje': 0,
-                'produtos_sem_estoque': 0,
-                'total_vendas': 0
-            }
+        stats = await cursor.fetchone()
+        logger.debug(f"📈 Estatísticas obtidas: {stats}")
         
         return DashboardStats(
             totalProdutos=stats['total_produtos'] or 0,
@@ -626,11 +1070,22 @@ async def carregar_estatisticas(session_data: dict = Depends(obter_todos_usuario
             produtosSemEstoque=stats['produtos_sem_estoque'] or 0,
             totalVendas=stats['total_vendas'] or 0
         )
+
+@app.get("/api/dashboard/estatisticas", response_model=DashboardStats)
+async def carregar_estatisticas(session_data: dict = Depends(obter_todos_usuarios)):
+    try:
+        logger.debug(f"📊 Carregando estatísticas para usuário: {session_data['nome']}")
+        
+        loja_id = get_loja_id(session_data)
+        logger.debug(f"🏪 Loja ID: {loja_id}")
         
+        # ✅ Cache por loja: vários dashboards abertos custam uma consulta
+        return await cache_dashboard.obter_ou_carregar(loja_id, lambda: calcular_estatisticas(loja_id))
+        
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ ERRO em carregar_estatisticas: {str(e)}")
-        import traceback
-        print(f"🔍 Traceback: {traceback.format_exc()}")
+        logger.error(f"❌ ERRO em carregar_estatisticas: {str(e)}", exc_info=True)
         
         # Fallback seguro
         return DashboardStats(
@@ -643,24 +1098,14 @@ async def carregar_estatisticas(session_data: dict = Depends(obter_todos_usuario
             produtosSemEstoque=0,
             totalVendas=0
         )
-    finally:
-        if cursor: 
-            cursor.close()
-        if conn: 
-            conn.close()
 
 @app.get("/api/dashboard/graficos")
 async def dashboard_graficos(
     periodo: str = Query("month", regex="^(today|week|month|quarter|year)$"),
-    session_data: dict = Depends(obter_admin)
+    ctx: contexto.Contexto = Depends(contexto_admin)
 ):
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        loja_id = get_loja_id(session_data)
+        loja_id = ctx.loja_id
         
         hoje = datetime.now().date()
         data_inicio = hoje
@@ -676,426 +1121,378 @@ async def dashboard_graficos(
         elif periodo == "year":
             data_inicio = hoje - timedelta(days=365)
         
-        cursor.execute("""
-            SELECT 
-                DATE(data_venda) as data,
-                SUM(total_venda) as valor,
-                COUNT(*) as quantidade
-            FROM vendas 
-            WHERE loja_id = %s AND data_venda >= %s
-            GROUP BY DATE(data_venda)
-            ORDER BY data
-        """, (loja_id, data_inicio))
-        
-        vendas_por_dia = cursor.fetchall()
-        
-        cursor.execute("""
+        # Ranking do agregado por produto, antes de pegar a conexão da rota
+        ranking = await produtos_mais_vendidos(loja_id, data_inicio, hoje, 5)
+        
+        cursor = ctx.cursor()
+        
+        # Séries por dia e por forma de pagamento vêm do agregado diário
+        await cursor.execute("""
             SELECT 
-                p.nome as produto,
-                SUM(iv.quantidade) as quantidade
-            FROM itens_venda iv
-            INNER JOIN produtos p ON iv.produto_id = p.id
-            INNER JOIN vendas v ON iv.venda_id = v.id
-            WHERE v.loja_id = %s AND v.data_venda >= %s
-            GROUP BY p.id, p.nome
-            ORDER BY quantidade DESC
-            LIMIT 5
-        """, (loja_id, data_inicio))
-        
-        produtos_mais_vendidos = cursor.fetchall()
-        
-        cursor.execute("""
+                dia as data,
+                SUM(valor_total) as valor,
+                SUM(quantidade_vendas) as quantidade
+            FROM vendas_diarias 
+            WHERE loja_id = %s AND dia >= %s AND dia <= %s
+            GROUP BY dia
+            ORDER BY dia
+        """, (loja_id, data_inicio, hoje))
+        
+        vendas_por_dia = await cursor.fetchall()
+        
+        await cursor.execute("""
             SELECT 
-                forma_pagamento,
-                COUNT(*) as quantidade,
-                SUM(total_venda) as valor
-            FROM vendas 
-            WHERE loja_id = %s AND data_venda >= %s
+                NULLIF(forma_pagamento, '') as forma_pagamento,
+                SUM(quantidade_vendas) as quantidade,
+                SUM(valor_total) as valor
+            FROM vendas_diarias 
+            WHERE loja_id = %s AND dia >= %s AND dia <= %s
             GROUP BY forma_pagamento
-        """, (loja_id, data_inicio))
+        """, (loja_id, data_inicio, hoje))
         
-        formas_pagamento = cursor.fetchall()
+        formas_pagamento = await cursor.fetchall()
         
-        return {
-            "vendas_por_dia": serialize_mysql_data(vendas_por_dia),
-            "produtos_mais_vendidos": serialize_mysql_data(produtos_mais_vendidos),
-            "formas_pagamento": serialize_mysql_data(formas_pagamento),
+        return resposta({
+            "vendas_por_dia": vendas_por_dia,
+            "produtos_mais_vendidos": [
+                {"produto": item["produto"], "quantidade": item["quantidade_vendida"]} for item in ranking
+            ],
+            "formas_pagamento": formas_pagamento,
             "periodo": periodo
-        }
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao carregar dados dos gráficos: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 # =============================================
 # ENDPOINTS DE CONTROLE DE ESTOQUE
 # =============================================
 
-@app.get("/api/produtos", response_model=ProdutoListResponse)
+@app.get("/api/produtos", responses={200: {"model": ProdutoListResponse}})
 async def listar_produtos(
     pagina: Optional[int] = Query(None, ge=1),
     limite: int = Query(10, ge=1, le=1000),
     busca: Optional[str] = Query(None),
     categoria: Optional[str] = Query(None),
-    session_data: dict = Depends(obter_todos_usuarios)
+    apos: Optional[str] = Query(None, alias="cursor"),
+    com_total: bool = Query(False),
+    ctx: contexto.Contexto = Depends(contexto_requisicao)
 ):
-    conn = None
-    cursor = None
+    """Lista produtos ativos.
+
+    Com ``cursor`` (vazio na primeira página) a paginação é por chave
+    ``(nome, id)`` e o total só é calculado com ``com_total=true``; sem ele
+    continua valendo ``pagina``/``limite`` com OFFSET.
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = ctx.cursor()
         
-        loja_id = get_loja_id(session_data)
+        loja_id = ctx.loja_id
+        por_cursor = apos is not None
+        todos = not por_cursor and (limite == 1000 or pagina is None)
+        total = None
+        proximo = None
         
-        query = """
-            SELECT id, loja_id, codigo_barras, nome, descricao, categoria, marca,
-                   estoque_atual, estoque_minimo, preco_custo, preco_venda, ativo,
-                   data_cadastro, data_atualizacao
+        query = f"""
+            SELECT {repositorios.COLUNAS_PRODUTO}
             FROM produtos 
             WHERE loja_id = %s AND ativo = 1
         """
         params = [loja_id]
+        ids_busca = None
         
-        if busca:
-            query += " AND (nome LIKE %s OR codigo_barras LIKE %s OR descricao LIKE %s)"
-            search_term = f"%{busca}%"
-            params.extend([search_term, search_term, search_term])
-        
-        if categoria:
-            query += " AND categoria = %s"
-            params.append(categoria)
-        
-        count_query = f"SELECT COUNT(*) as total FROM ({query}) as subquery"
-        cursor.execute(count_query, params)
-        total = cursor.fetchone()['total']
-        
-        if limite == 1000 or pagina is None:
-            query += " ORDER BY nome"
-            cursor.execute(query, params)
-            produtos = cursor.fetchall()
+        if busca and catalogo_produtos.carregado(loja_id):
+            # Índice em memória: ranqueia e pagina aqui; do banco vêm só as
+            # linhas da página, na ordem de relevância. O cursor guarda a posição.
+            if por_cursor:
+                inicio = paginacao.decodificar(apos, 1)[0] if apos else 0
+            else:
+                inicio = 0 if todos else (pagina - 1) * limite
+            fim = None if todos else inicio + limite
+            if categoria:
+                encontrados, _ = catalogo_produtos.buscar(loja_id, busca)
+                ids_busca = [p.id for p in encontrados if p.categoria == categoria]
+                total = len(ids_busca)
+            else:
+                encontrados, total = catalogo_produtos.buscar(loja_id, busca, fim)
+                ids_busca = [p.id for p in encontrados]
+            ids_busca = ids_busca[inicio:fim]
+            if fim is not None and fim < total:
+                proximo = paginacao.codificar([fim])
+        else:
+            if busca:
+                query += " AND (nome LIKE %s OR codigo_barras LIKE %s OR descricao LIKE %s)"
+                search_term = f"%{busca}%"
+                params.extend([search_term, search_term, search_term])
             
-            # ✅ CORREÇÃO: Serialização garantida
-            produtos_serializados = []
-            for produto in produtos:
-                produto_serializado = {
-                    'id': produto['id'],
-                    'loja_id': produto['loja_id'],
-                    'codigo_barras': str(produto['codigo_barras']) if produto['codigo_barras'] else None,
-                    'nome': str(produto['nome']),
-                    'descricao': str(produto['descricao']) if produto['descricao'] else None,
-                    'categoria': str(produto['categoria']) if produto['categoria'] else None,
-                    'marca': str(produto['marca']) if produto['marca'] else None,
-                    'estoque_atual': float(produto['estoque_atual']) if produto['estoque_atual'] is not None else 0.0,
-                    'estoque_minimo': float(produto['estoque_minimo']) if produto['estoque_minimo'] is not None else 0.0,
-                    'preco_custo': float(produto['preco_custo']) if produto['preco_custo'] is not None else 0.0,
-                    'preco_venda': float(produto['preco_venda']) if produto['preco_venda'] is not None else 0.0,
-                    'ativo': bool(produto['ativo'])
-                }
-                
-                # Datas
-                if produto['data_cadastro']:
-                    produto_serializado['data_cadastro'] = produto['data_cadastro'].isoformat()
-                if produto['data_atualizacao']:
-                    produto_serializado['data_atualizacao'] = produto['data_atualizacao'].isoformat()
-                    
-                produtos_serializados.append(produto_serializado)
+            if categoria:
+                query += " AND categoria = %s"
+                params.append(categoria)
             
-            return {
-                "produtos": produtos_serializados,
+            if not busca and not categoria and catalogo_produtos.carregado(loja_id):
+                # Sem filtros o total é o tamanho do catálogo em memória
+                total = catalogo_produtos.quantidade(loja_id)
+            elif com_total or not por_cursor:
+                count_query = f"SELECT COUNT(*) as total FROM ({query}) as subquery"
+                await cursor.execute(count_query, params)
+                total = (await cursor.fetchone())['total']
+        
+        if todos:
+            if ids_busca is not None:
+                produtos = await repositorios.ProdutoRepo(ctx).por_ids(loja_id, ids_busca)
+            else:
+                query += " ORDER BY nome, id"
+                await cursor.execute(query, params)
+                produtos = await cursor.fetchall()
+            
+            return resposta({
+                "produtos": com_booleanos(produtos),
                 "total": total,
                 "pagina": 1,
                 "total_paginas": 1
-            }
+            })
         else:
-            offset = (pagina - 1) * limite
-            total_paginas = (total + limite - 1) // limite
+            total_paginas = (total + limite - 1) // limite if total is not None else None
             
-            query += " ORDER BY nome LIMIT %s OFFSET %s"
-            params.extend([limite, offset])
-            cursor.execute(query, params)
-            produtos = cursor.fetchall()
-        
-        for produto in produtos:
-            if produto['data_cadastro']:
-                produto['data_cadastro'] = produto['data_cadastro'].isoformat()
-            if produto['data_atualizacao']:
-                produto['data_atualizacao'] = produto['data_atualizacao'].isoformat()
-        
-        return {
-            "produtos": produtos,
+            if ids_busca is not None:
+                produtos = await repositorios.ProdutoRepo(ctx).por_ids(loja_id, ids_busca)
+            else:
+                if apos:
+                    condicao, valores = paginacao.condicao(("nome", "id"), apos)
+                    query += f" AND {condicao}"
+                    params.extend(valores)
+                query += " ORDER BY nome, id LIMIT %s"
+                params.append(limite + 1)
+                if not por_cursor:
+                    query += " OFFSET %s"
+                    params.append((pagina - 1) * limite)
+                await cursor.execute(query, params)
+                produtos, proximo = paginacao.fatiar(await cursor.fetchall(), limite, ("nome", "id"))
+        
+        return resposta({
+            "produtos": com_booleanos(produtos),
             "total": total,
-            "pagina": pagina or 1,
-            "total_paginas": total_paginas
-        }
+            "pagina": None if por_cursor else pagina,
+            "total_paginas": total_paginas,
+            "next_cursor": proximo
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar produtos: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 @app.get("/api/produtos/todos")
-async def listar_todos_produtos(session_data: dict = Depends(obter_todos_usuarios)):
-    conn = None
-    cursor = None
+async def listar_todos_produtos(ctx: contexto.Contexto = Depends(contexto_requisicao)):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        loja_id = ctx.loja_id
+        
+        if catalogo_produtos.carregado(loja_id):
+            produtos = [
+                {'id': p.id, 'nome': p.nome, 'codigo_barras': p.codigo_barras,
+                 'preco_venda': p.preco_venda, 'estoque_atual': p.estoque_atual}
+                for p in catalogo_produtos.produtos(loja_id)
+            ]
+            return resposta({
+                "success": True,
+                "produtos": produtos,
+                "total": len(produtos)
+            })
         
-        loja_id = get_loja_id(session_data)
+        cursor = ctx.cursor()
         
-        cursor.execute("""
+        await cursor.execute("""
             SELECT id, nome, codigo_barras, preco_venda, estoque_atual
             FROM produtos 
             WHERE loja_id = %s AND ativo = 1
             ORDER BY nome
         """, (loja_id,))
         
-        produtos = cursor.fetchall()
+        produtos = await cursor.fetchall()
         
-        return {
+        return resposta({
             "success": True,
             "produtos": produtos,
             "total": len(produtos)
-        }
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar produtos: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
-@app.get("/api/produtos/{produto_id}")
-async def obter_produto(produto_id: int, session_data: dict = Depends(obter_todos_usuarios)):
-    conn = None
-    cursor = None
+@app.get("/api/produtos/codigo/{codigo_barras}")
+async def obter_produto_por_codigo(codigo_barras: str, ctx: contexto.Contexto = Depends(contexto_requisicao)):
+    """Leitura de código de barras no PDV: responde do catálogo em memória."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        loja_id = ctx.loja_id
         
-        loja_id = get_loja_id(session_data)
+        if catalogo_produtos.carregado(loja_id):
+            produto = catalogo_produtos.por_codigo(loja_id, codigo_barras)
+            if not produto:
+                raise HTTPException(status_code=404, detail="Produto não encontrado")
+            return resposta(produto.como_dict())
         
-        cursor.execute("""
-            SELECT id, loja_id, codigo_barras, nome, descricao, categoria, marca,
-                   estoque_atual, estoque_minimo, preco_custo, preco_venda, ativo,
-                   data_cadastro, data_atualizacao
-            FROM produtos 
-            WHERE id = %s AND loja_id = %s AND ativo = 1
-        """, (produto_id, loja_id))
+        cursor = ctx.cursor()
         
-        produto = cursor.fetchone()
+        await cursor.execute(catalogo.SQL_PRODUTOS + " AND codigo_barras = %s LIMIT 1", (loja_id, codigo_barras.strip()))
+        produto = await cursor.fetchone()
         
         if not produto:
             raise HTTPException(status_code=404, detail="Produto não encontrado")
         
-        if produto['data_cadastro']:
-            produto['data_cadastro'] = produto['data_cadastro'].isoformat()
-        if produto['data_atualizacao']:
-            produto['data_atualizacao'] = produto['data_atualizacao'].isoformat()
-        
-        return produto
+        return resposta(catalogo.ProdutoCatalogo(produto).como_dict())
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar produto: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
-@app.post("/api/produtos")
-async def criar_produto(produto_data: ProdutoCreate, session_data: dict = Depends(obter_todos_usuarios)):
-    conn = None
-    cursor = None
+@app.get("/api/produtos/sugestoes")
+async def sugerir_produtos(
+    q: str = Query(..., min_length=1),
+    limite: int = Query(10, ge=1, le=50),
+    ctx: contexto.Contexto = Depends(contexto_requisicao)
+):
+    """Sugestões enquanto se digita no PDV: nome, código, marca, categoria e descrição."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        loja_id = ctx.loja_id
         
-        loja_id = get_loja_id(session_data)
-        
-        if produto_data.codigo_barras:
-            cursor.execute(
-                "SELECT id FROM produtos WHERE codigo_barras = %s AND loja_id = %s",
-                (produto_data.codigo_barras, loja_id)
-            )
-            if cursor.fetchone():
-                raise HTTPException(status_code=400, detail="Já existe produto com este código de barras")
-        
-        # ✅ QUERY ATUALIZADA COM TODOS OS CAMPOS
-        cursor.execute("""
-            INSERT INTO produtos (
-                loja_id, codigo_barras, nome, descricao, categoria, marca,
-                estoque_atual, estoque_minimo, preco_custo, preco_venda, ativo,
-                subcategoria, tamanho_sutia, tamanho_calcinha, cor, material, colecao
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            loja_id, produto_data.codigo_barras, produto_data.nome, 
-            produto_data.descricao, produto_data.categoria, produto_data.marca,
-            produto_data.estoque_atual, produto_data.estoque_minimo, 
-            produto_data.preco_custo, produto_data.preco_venda, produto_data.ativo,
-            produto_data.subcategoria, produto_data.tamanho_sutia, 
-            produto_data.tamanho_calcinha, produto_data.cor,
-            produto_data.material, produto_data.colecao  # ✅ NOVOS CAMPOS
-        ))
+        if catalogo_produtos.carregado(loja_id):
+            produtos, _ = catalogo_produtos.buscar(loja_id, q, limite, contar=False)
+            return resposta({"produtos": [p.como_dict() for p in produtos]})
         
-        produto_id = cursor.lastrowid
-        conn.commit()
+        # Sem catálogo: prefixo do nome ou código, que aproveita os índices
+        cursor = ctx.cursor()
         
-        # ✅ BUSCAR PRODUTO CRIADO COM TODOS OS CAMPOS
-        cursor.execute("""
-            SELECT id, loja_id, codigo_barras, nome, descricao, categoria, marca,
-                   estoque_atual, estoque_minimo, preco_custo, preco_venda, ativo,
-                   subcategoria, tamanho_sutia, tamanho_calcinha, cor, material, colecao,
-                   data_cadastro, data_atualizacao
-            FROM produtos WHERE id = %s
-        """, (produto_id,))
-        
-        produto = cursor.fetchone()
-        
-        # ✅ SERIALIZAR DATAS
-        if produto and produto['data_cadastro']:
-            produto['data_cadastro'] = produto['data_cadastro'].isoformat()
-        if produto and produto['data_atualizacao']:
-            produto['data_atualizacao'] = produto['data_atualizacao'].isoformat()
+        prefixo = f"{q.strip()}%"
+        await cursor.execute(
+            catalogo.SQL_PRODUTOS + " AND (nome LIKE %s OR codigo_barras LIKE %s) ORDER BY nome LIMIT %s",
+            (loja_id, prefixo, prefixo, limite)
+        )
+        produtos = await cursor.fetchall()
         
-        return {
-            "success": True,
-            "message": "Produto criado com sucesso",
-            "produto": produto
-        }
+        return resposta({"produtos": [catalogo.ProdutoCatalogo(p).como_dict() for p in produtos]})
         
     except HTTPException:
         raise
     except Exception as e:
-        if conn: conn.rollback()
-        print(f"❌ Erro ao criar produto: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Erro ao criar produto: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
+        raise HTTPException(status_code=500, detail=f"Erro ao buscar sugestões: {str(e)}")
+
+@app.get("/api/produtos/{produto_id}")
+async def obter_produto(produto_id: int, ctx: contexto.Contexto = Depends(contexto_requisicao)):
+    try:
+        produtos = repositorios.ProdutoRepo(ctx)
+        
+        loja_id = ctx.loja_id
+        
+        produto = await produtos.buscar(loja_id, produto_id, so_ativos=True)
+        
+        if not produto:
+            raise HTTPException(status_code=404, detail="Produto não encontrado")
+        
+        return resposta(com_booleanos(produto))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao buscar produto: {str(e)}")
+
+@app.post("/api/produtos")
+async def criar_produto(produto_data: ProdutoCreate, ctx: contexto.Contexto = Depends(contexto_requisicao)):
+    try:
+        cursor = ctx.cursor()
+        produtos = repositorios.ProdutoRepo(ctx)
+        
+        loja_id = ctx.loja_id
+        
+        if produto_data.codigo_barras and await produtos.codigo_em_uso(loja_id, produto_data.codigo_barras):
+            raise HTTPException(status_code=400, detail="Já existe produto com este código de barras")
+        
+        # ✅ TODOS OS CAMPOS (repositorios.CAMPOS_PRODUTO)
+        produto_id = await produtos.inserir(loja_id, produto_data)
+        versao_catalogo = await incrementar_versao_catalogo(cursor, loja_id)
+        await ctx.commit()
+        invalidar_caches(loja_id)
+        
+        # ✅ BUSCAR PRODUTO CRIADO COM TODOS OS CAMPOS
+        produto = await produtos.buscar(loja_id, produto_id)
+        if produto:
+            catalogo_produtos.atualizar_produto(loja_id, produto, versao_catalogo)
+        
+        return resposta({
+            "success": True,
+            "message": "Produto criado com sucesso",
+            "produto": com_booleanos(produto)
+        })
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Erro ao criar produto: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro ao criar produto: {str(e)}")
 
 @app.put("/api/produtos/{produto_id}")
-async def atualizar_produto(produto_id: int, produto_data: ProdutoUpdate, session_data: dict = Depends(obter_todos_usuarios)):
-    conn = None
-    cursor = None
+async def atualizar_produto(produto_id: int, produto_data: ProdutoUpdate, ctx: contexto.Contexto = Depends(contexto_requisicao)):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = ctx.cursor()
+        produtos = repositorios.ProdutoRepo(ctx)
         
-        loja_id = get_loja_id(session_data)
+        loja_id = ctx.loja_id
         
-        cursor.execute(
-            "SELECT id FROM produtos WHERE id = %s AND loja_id = %s",
-            (produto_id, loja_id)
-        )
-        if not cursor.fetchone():
+        if not await produtos.existe(loja_id, produto_id):
             raise HTTPException(status_code=404, detail="Produto não encontrado")
         
-        if produto_data.codigo_barras:
-            cursor.execute(
-                "SELECT id FROM produtos WHERE codigo_barras = %s AND loja_id = %s AND id != %s",
-                (produto_data.codigo_barras, loja_id, produto_id)
-            )
-            if cursor.fetchone():
-                raise HTTPException(status_code=400, detail="Código de barras já está em uso por outro produto")
-        
-        update_fields = []
-        update_values = []
-        
-        # ✅ ADICIONAR TODOS OS CAMPOS PARA ATUALIZAÇÃO
-        campos_para_atualizar = [
-            ('codigo_barras', produto_data.codigo_barras),
-            ('nome', produto_data.nome),
-            ('descricao', produto_data.descricao),
-            ('categoria', produto_data.categoria),
-            ('marca', produto_data.marca),
-            ('estoque_atual', produto_data.estoque_atual),
-            ('estoque_minimo', produto_data.estoque_minimo),
-            ('preco_custo', produto_data.preco_custo),
-            ('preco_venda', produto_data.preco_venda),
-            ('ativo', produto_data.ativo),
-            ('subcategoria', produto_data.subcategoria),
-            ('tamanho_sutia', produto_data.tamanho_sutia),
-            ('tamanho_calcinha', produto_data.tamanho_calcinha),
-            ('cor', produto_data.cor),
-            ('material', produto_data.material),      # ✅ NOVO CAMPO
-            ('colecao', produto_data.colecao)         # ✅ NOVO CAMPO
-        ]
-        
-        for campo, valor in campos_para_atualizar:
-            if valor is not None:
-                update_fields.append(f"{campo} = %s")
-                update_values.append(valor)
-        
-        if not update_fields:
-            raise HTTPException(status_code=400, detail="Nenhum campo fornecido para atualização")
+        if produto_data.codigo_barras and await produtos.codigo_em_uso(loja_id, produto_data.codigo_barras, produto_id):
+            raise HTTPException(status_code=400, detail="Código de barras já está em uso por outro produto")
         
-        update_fields.append("data_atualizacao = CURRENT_TIMESTAMP")
-        update_values.extend([produto_id, loja_id])
+        # ✅ SÓ OS CAMPOS INFORMADOS (todos os de repositorios.CAMPOS_PRODUTO)
+        campos = repositorios.campos_informados(produto_data, repositorios.CAMPOS_PRODUTO)
+        if not campos:
+            raise HTTPException(status_code=400, detail="Nenhum campo fornecido para atualização")
         
-        query = f"UPDATE produtos SET {', '.join(update_fields)} WHERE id = %s AND loja_id = %s"
-        cursor.execute(query, update_values)
+        await produtos.atualizar(loja_id, produto_id, campos)
+        versao_catalogo = await incrementar_versao_catalogo(cursor, loja_id)
         
-        conn.commit()
+        await ctx.commit()
+        invalidar_caches(loja_id)
         
         # ✅ BUSCAR PRODUTO ATUALIZADO COM TODOS OS CAMPOS
-        cursor.execute("""
-            SELECT id, loja_id, codigo_barras, nome, descricao, categoria, marca,
-                   estoque_atual, estoque_minimo, preco_custo, preco_venda, ativo,
-                   subcategoria, tamanho_sutia, tamanho_calcinha, cor, material, colecao,
-                   data_cadastro, data_atualizacao
-            FROM produtos WHERE id = %s AND loja_id = %s
-        """, (produto_id, loja_id))
-        
-        produto_atualizado = cursor.fetchone()
-        
-        # ✅ SERIALIZAR DATAS
-        if produto_atualizado and produto_atualizado['data_cadastro']:
-            produto_atualizado['data_cadastro'] = produto_atualizado['data_cadastro'].isoformat()
-        if produto_atualizado and produto_atualizado['data_atualizacao']:
-            produto_atualizado['data_atualizacao'] = produto_atualizado['data_atualizacao'].isoformat()
+        produto_atualizado = await produtos.buscar(loja_id, produto_id)
+        if produto_atualizado:
+            catalogo_produtos.atualizar_produto(loja_id, produto_atualizado, versao_catalogo)
         
-        return {
+        return resposta({
             "success": True,
             "message": "Produto atualizado com sucesso",
-            "produto": produto_atualizado
-        }
+            "produto": com_booleanos(produto_atualizado)
+        })
         
     except HTTPException:
         raise
     except Exception as e:
-        if conn: conn.rollback()
-        print(f"❌ Erro ao atualizar produto: {str(e)}")
+        logger.error(f"❌ Erro ao atualizar produto: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao atualizar produto: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 @app.delete("/api/produtos/{produto_id}")
-async def excluir_produto(produto_id: int, session_data: dict = Depends(obter_todos_usuarios)):
-    conn = None
-    cursor = None
+async def excluir_produto(produto_id: int, ctx: contexto.Contexto = Depends(contexto_requisicao)):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        cursor = ctx.cursor(dictionary=False)
+        produtos = repositorios.ProdutoRepo(ctx)
         
-        loja_id = get_loja_id(session_data)
+        loja_id = ctx.loja_id
         
-        cursor.execute(
-            "SELECT id FROM produtos WHERE id = %s AND loja_id = %s",
-            (produto_id, loja_id)
-        )
-        if not cursor.fetchone():
+        if not await produtos.existe(loja_id, produto_id):
             raise HTTPException(status_code=404, detail="Produto não encontrado")
         
-        cursor.execute(
-            "UPDATE produtos SET ativo = 0, data_atualizacao = CURRENT_TIMESTAMP WHERE id = %s AND loja_id = %s",
-            (produto_id, loja_id)
-        )
+        await produtos.desativar(loja_id, produto_id)
+        versao_catalogo = await incrementar_versao_catalogo(cursor, loja_id)
         
-        conn.commit()
+        await ctx.commit()
+        invalidar_caches(loja_id)
+        catalogo_produtos.remover_produto(loja_id, produto_id, versao_catalogo)
         
         return {
             "success": True,
@@ -1105,16 +1502,7 @@ async def excluir_produto(produto_id: int, session_data: dict = Depends(obter_to
     except HTTPException:
         raise
     except Exception as e:
-        if conn: conn.rollback()
         raise HTTPException(status_code=500, detail=f"Erro ao excluir produto: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
-
-
-
-
-
 
 # =============================================
 # ENDPOINTS DE VENDAS RÁPIDAS
@@ -1125,33 +1513,12 @@ async def excluir_produto(produto_id: int, session_data: dict = Depends(obter_to
 
 # ✅ ENDPOINT CORRIGIDO PARA VENDAS RECENTES
 @app.get("/api/dashboard/vendas-recentes")
-async def vendas_recentes_dashboard(session_data: dict = Depends(obter_todos_usuarios)):
-    conn = None
-    cursor = None
+async def vendas_recentes_dashboard(ctx: contexto.Contexto = Depends(contexto_requisicao)):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        loja_id = get_loja_id(session_data)
-        
-        # ✅ QUERY CORRIGIDA - Buscar últimas 5 vendas
-        cursor.execute("""
-            SELECT 
-                v.id,
-                v.numero_venda,
-                v.cliente,
-                v.total_venda,
-                v.forma_pagamento,
-                v.data_venda,
-                u.nome as vendedor
-            FROM vendas v
-            LEFT JOIN usuarios u ON v.usuario_id = u.id
-            WHERE v.loja_id = %s
-            ORDER BY v.data_venda DESC
-            LIMIT 5
-        """, (loja_id,))
+        loja_id = ctx.loja_id
         
-        vendas = cursor.fetchall()
+        # ✅ Buscar últimas 5 vendas
+        vendas = await repositorios.VendaRepo(ctx).recentes(loja_id, 5)
         
         # ✅ FORMATAR OS DADOS PARA O FRONTEND
         vendas_formatadas = []
@@ -1184,26 +1551,240 @@ async def vendas_recentes_dashboard(session_data: dict = Depends(obter_todos_usu
                 "vendedor": venda['vendedor']
             })
         
-        print(f"✅ Vendas recentes encontradas: {len(vendas_formatadas)}")
+        logger.debug(f"✅ Vendas recentes encontradas: {len(vendas_formatadas)}")
         
-        return {
+        return resposta({
             "success": True,
             "vendas_recentes": vendas_formatadas
-        }
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ Erro ao buscar vendas recentes: {str(e)}")
-        return {
+        logger.error(f"❌ Erro ao buscar vendas recentes: {str(e)}")
+        return resposta({
             "success": False,
             "vendas_recentes": [],
             "error": str(e)
-        }
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
+        })
+
+async def resolver_itens_venda(cursor, loja_id: int, itens: List[ItemVenda]) -> list:
+    """Localiza os produtos do carrinho com um único SELECT ... FOR UPDATE.
+
+    Cada item é procurado pelo ``produto_id`` e, se não houver, pelo nome.
+    Com o catálogo carregado, os nomes viram ids em memória e o SELECT
+    trava só pela chave primária. As linhas ficam travadas até o fim da
+    transação, e o estoque é validado contra a quantidade total de cada
+    produto no carrinho.
+    """
+    itens_validos = []
+    for index, item in enumerate(itens):
+        if not item.produto or not item.quantidade or item.quantidade <= 0:
+            logger.warning(f"⚠️ Item {index + 1} inválido, pulando...")
+            continue
+        itens_validos.append(item)
+    
+    if not itens_validos:
+        return []
+    
+    # Id de cada item segundo o catálogo (None: procurar no banco pelo nome)
+    ids_catalogo = []
+    ids = set()
+    nomes = set()
+    usar_catalogo = catalogo_produtos.carregado(loja_id)
+    for item in itens_validos:
+        produto = None
+        if usar_catalogo:
+            produto = catalogo_produtos.por_id(loja_id, item.produto_id) if item.produto_id else None
+            produto = produto or catalogo_produtos.por_nome(loja_id, item.produto)
+        ids_catalogo.append(produto.id if produto else None)
+        if produto:
+            ids.add(produto.id)
+            continue
+        if item.produto_id:
+            ids.add(item.produto_id)
+        nomes.add(item.produto)
+    
+    filtros = []
+    params = [loja_id]
+    if ids:
+        filtros.append(f"id IN ({', '.join(['%s'] * len(ids))})")
+        params.extend(sorted(ids))
+    if nomes:
+        filtros.append(f"nome IN ({', '.join(['%s'] * len(nomes))})")
+        params.extend(sorted(nomes))
+    
+    await cursor.execute(f"""
+        SELECT id, nome, estoque_atual, preco_venda
+        FROM produtos
+        WHERE loja_id = %s AND ativo = 1 AND ({' OR '.join(filtros)})
+        ORDER BY id
+        FOR UPDATE
+    """, params)
+    produtos = await cursor.fetchall()
+    
+    por_id = {produto['id']: produto for produto in produtos}
+    por_nome = {}
+    for produto in produtos:
+        por_nome.setdefault(catalogo.normalizar(produto['nome']), produto)
+    
+    linhas = []
+    quantidade_por_produto = {}
+    for item, id_catalogo in zip(itens_validos, ids_catalogo):
+        produto = por_id.get(id_catalogo) if id_catalogo else None
+        if produto is None and item.produto_id:
+            produto = por_id.get(item.produto_id)
+        if produto is None:
+            produto = por_nome.get(catalogo.normalizar(item.produto))
+        if produto is None:
+            logger.warning(f"❌ Produto não encontrado: {item.produto}")
+            raise HTTPException(
+                status_code=404,
+                detail=f"Produto '{item.produto}' não encontrado no estoque"
+            )
+        
+        quantidade_por_produto[produto['id']] = quantidade_por_produto.get(produto['id'], 0) + item.quantidade
+        estoque_atual = produto['estoque_atual']
+        if estoque_atual is not None and estoque_atual < quantidade_por_produto[produto['id']]:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Estoque insuficiente para '{produto['nome']}'. Disponível: {estoque_atual}, Solicitado: {quantidade_por_produto[produto['id']]}"
+            )
+        
+        # ✅ USAR PREÇO DO BANCO DE DADOS SE NECESSÁRIO
+        if item.preco_Unitario <= 0:
+            item.preco_Unitario = produto['preco_venda']
+            item.preco_Total = item.preco_Unitario * item.quantidade
+        
+        linhas.append({
+            'produto_id': produto['id'],
+            'nome': produto['nome'],
+            'quantidade_vendida': item.quantidade,
+            'item_data': item
+        })
+    
+    return linhas
+
+async def transacao_com_retentativa(ctx, operacao, tentativas: int = None):
+    """Executa ``operacao()`` e faz commit, repetindo em deadlock ou lock timeout.
+
+    Qualquer erro desfaz a transação; só conflitos de trava são repetidos,
+    com uma pequena espera aleatória para os caixas não colidirem de novo.
+    """
+    tentativas = tentativas or VENDA_MAX_TENTATIVAS
+    for tentativa in range(1, tentativas + 1):
+        try:
+            resultado = await operacao()
+            await ctx.commit()
+            return resultado
+        except Exception as e:
+            await ctx.rollback()
+            if tentativa >= tentativas or not database.erro_retentavel(e):
+                raise
+            logger.warning(f"⚠️ Conflito de travas no banco (tentativa {tentativa}/{tentativas}), repetindo: {e}")
+            await asyncio.sleep(0.02 * tentativa + random.random() * 0.03)
+
+async def repor_estoque(cursor, loja_id: int, itens: list):
+    """Devolve ao estoque as quantidades de ``itens`` (produto_id, quantidade) num único UPDATE."""
+    quantidades = {}
+    for item in itens:
+        if item['produto_id']:
+            quantidades[item['produto_id']] = quantidades.get(item['produto_id'], 0) + item['quantidade']
+    if not quantidades:
+        return
+    
+    ids = sorted(quantidades)
+    caso = ' '.join(['WHEN %s THEN %s'] * len(ids))
+    pares = [valor for produto_id in ids for valor in (produto_id, quantidades[produto_id])]
+    await cursor.execute(f"""
+        UPDATE produtos
+        SET estoque_atual = estoque_atual + (CASE id {caso} END)
+        WHERE loja_id = %s AND id IN ({', '.join(['%s'] * len(ids))})
+    """, pares + [loja_id] + ids)
+
+async def baixar_estoque(cursor, loja_id: int, linhas: list):
+    """Decrementa o estoque de todos os produtos num único UPDATE.
+
+    A guarda ``estoque_atual >= quantidade`` garante que nenhum produto fica
+    negativo; se alguma linha não for atualizada a venda é recusada.
+    """
+    quantidades = {}
+    for linha in linhas:
+        quantidades[linha['produto_id']] = quantidades.get(linha['produto_id'], 0) + linha['quantidade_vendida']
+    if not quantidades:
+        return
+    
+    ids = sorted(quantidades)
+    caso = ' '.join(['WHEN %s THEN %s'] * len(ids))
+    pares = [valor for produto_id in ids for valor in (produto_id, quantidades[produto_id])]
+    marcadores = ', '.join(['%s'] * len(ids))
+    
+    await cursor.execute(f"""
+        UPDATE produtos
+        SET estoque_atual = estoque_atual - (CASE id {caso} END)
+        WHERE loja_id = %s AND id IN ({marcadores})
+          AND (estoque_atual IS NULL OR estoque_atual >= (CASE id {caso} END))
+    """, pares + [loja_id] + ids + pares)
+    
+    if cursor.rowcount != len(ids):
+        raise HTTPException(status_code=409, detail="Estoque alterado durante a venda, tente novamente")
+
+async def inserir_itens_venda(cursor, venda_id: int, linhas: list):
+    """Grava os itens da venda num único INSERT de várias linhas."""
+    if not linhas:
+        return
+    await cursor.executemany(
+        """INSERT INTO itens_venda 
+        (venda_id, produto_id, produto_nome, quantidade, valor_unitario, total_item) 
+        VALUES (%s, %s, %s, %s, %s, %s)""",
+        [(venda_id, linha['produto_id'], linha['nome'], linha['quantidade_vendida'],
+          linha['item_data'].preco_Unitario, linha['item_data'].preco_Total) for linha in linhas]
+    )
+
+def itens_agregado(linhas: list) -> list:
+    """Itens resolvidos no formato de ``agregados.somar_itens``."""
+    return [(linha['produto_id'], linha['quantidade_vendida'], linha['item_data'].preco_Total) for linha in linhas]
+
+async def proximo_numero_venda(cursor, loja_id: int) -> str:
+    """Reserva o próximo número de venda da loja em O(1).
+
+    O UPDATE trava a linha da loja em ``sequencias_venda`` até o fim da
+    transação da venda, então dois caixas nunca recebem o mesmo número e
+    um rollback devolve o número sem deixar buraco.
+    """
+    numero = await avancar_sequencia_venda(cursor, loja_id)
+    if numero is None:
+        # Loja sem linha semeada pela migração 011 (criada depois dela):
+        # parte do maior número já usado, uma vez só
+        await cursor.execute("""
+            INSERT IGNORE INTO sequencias_venda (loja_id, ultimo_numero)
+            SELECT %s, COALESCE(MAX(CAST(SUBSTRING(numero_venda, 2) AS UNSIGNED)), 0)
+            FROM vendas WHERE loja_id = %s
+        """, (loja_id, loja_id))
+        numero = await avancar_sequencia_venda(cursor, loja_id)
+    return f"V{numero:04d}"
+
+async def avancar_sequencia_venda(cursor, loja_id: int):
+    """Incrementa e devolve o contador numa ida ao banco (``None`` se a loja não tem linha).
+
+    Mesmo recurso de ``incrementar_versao_catalogo``: ``LAST_INSERT_ID(expr)``
+    no MySQL e ``RETURNING`` no SQLite.
+    """
+    if DB_ENGINE == "sqlite":
+        await cursor.execute(
+            "UPDATE sequencias_venda SET ultimo_numero = ultimo_numero + 1 WHERE loja_id = %s "
+            "RETURNING ultimo_numero",
+            (loja_id,)
+        )
+        return primeiro_valor(await cursor.fetchall(), "ultimo_numero")
+    await cursor.execute(
+        "UPDATE sequencias_venda SET ultimo_numero = LAST_INSERT_ID(ultimo_numero + 1) WHERE loja_id = %s",
+        (loja_id,)
+    )
+    return cursor.lastrowid if cursor.rowcount else None
 
 @app.post("/api/vendas", response_model=VendaResponse)
-async def criar_venda(venda_data: VendaData, session_data: dict = Depends(obter_vendedor)):
+async def criar_venda(venda_data: VendaData, ctx: contexto.Contexto = Depends(contexto_vendedor)):
     if not venda_data.itens or len(venda_data.itens) == 0:
         raise HTTPException(status_code=400, detail="Nenhum item na venda")
     
@@ -1217,184 +1798,58 @@ async def criar_venda(venda_data: VendaData, session_data: dict = Depends(obter_
     if venda_data.total_venda is None or venda_data.total_venda <= 0:
         venda_data.total_venda = sum(item.preco_Total for item in venda_data.itens)
     
-    venda_data.usuario_id = session_data['user_id']
+    venda_data.usuario_id = ctx.usuario_id
+    venda_data.observacoes = venda_data.observacoes or "Venda rápida - Sistema WebOS"
     
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        if not conn:
-            raise HTTPException(status_code=500, detail="Erro de conexão com o banco")
-        
-        cursor = conn.cursor(dictionary=True)
-        
-        loja_id = get_loja_id(session_data)
-        
-        print(f"🛒 Processando venda para cliente: {venda_data.cliente}")
-        print(f"💰 Total da venda: R$ {venda_data.total_venda:.2f}")
-        print(f"📦 Itens: {len(venda_data.itens)}")
-        
-        # ✅ VERIFICAÇÃO DE ESTOQUE MELHORADA
-        produtos_para_atualizar = []
-        
-        for index, item in enumerate(venda_data.itens):
-            print(f"🔍 Processando item {index + 1}: {item.produto}")
-            
-            if not item.produto or not item.quantidade or item.quantidade <= 0:
-                print(f"⚠️ Item {index + 1} inválido, pulando...")
-                continue
-            
-            # ✅ BUSCAR PRODUTO POR ID OU NOME
-            produto_encontrado = None
-            
-            # Tentar buscar por ID se disponível
-            if hasattr(item, 'produto_id') and item.produto_id:
-                cursor.execute(
-                    """SELECT id, nome, estoque_atual, preco_venda 
-                    FROM produtos 
-                    WHERE id = %s AND loja_id = %s AND ativo = 1""",
-                    (item.produto_id, loja_id)
-                )
-                produto_encontrado = cursor.fetchone()
-            
-            # Se não encontrou por ID, buscar por nome
-            if not produto_encontrado:
-                cursor.execute(
-                    """SELECT id, nome, estoque_atual, preco_venda 
-                    FROM produtos 
-                    WHERE nome = %s AND loja_id = %s AND ativo = 1""",
-                    (item.produto, loja_id)
-                )
-                produto_encontrado = cursor.fetchone()
-            
-            if not produto_encontrado:
-                print(f"❌ Produto não encontrado: {item.produto}")
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"Produto '{item.produto}' não encontrado no estoque"
-                )
-            
-            produto_id = produto_encontrado['id']
-            nome_produto = produto_encontrado['nome']
-            estoque_atual = produto_encontrado['estoque_atual']
-            
-            print(f"✅ Produto encontrado: {nome_produto} (ID: {produto_id}), Estoque: {estoque_atual}")
-            
-            # ✅ VALIDAR ESTOQUE
-            if estoque_atual is not None and estoque_atual < item.quantidade:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Estoque insuficiente para '{nome_produto}'. Disponível: {estoque_atual}, Solicitado: {item.quantidade}"
-                )
-            
-            # ✅ USAR PREÇO DO BANCO DE DADOS SE NECESSÁRIO
-            if item.preco_Unitario <= 0:
-                item.preco_Unitario = produto_encontrado['preco_venda']
-                item.preco_Total = item.preco_Unitario * item.quantidade
-                print(f"💰 Preço ajustado: R$ {item.preco_Unitario:.2f} x {item.quantidade} = R$ {item.preco_Total:.2f}")
-            
-            # ✅ ADICIONAR À LISTA PARA ATUALIZAÇÃO
-            produtos_para_atualizar.append({
-                'produto_id': produto_id,
-                'nome': nome_produto,
-                'quantidade_vendida': item.quantidade,
-                'estoque_atual': estoque_atual,
-                'novo_estoque': estoque_atual - item.quantidade,
-                'item_data': item
-            })
-        
-        # ✅ GERAR NÚMERO DA VENDA
-        numero_venda = None
-        tentativas = 0
-        max_tentativas = 10
+        cursor = ctx.cursor()
+        vendas = repositorios.VendaRepo(ctx)
         
-        while not numero_venda and tentativas < max_tentativas:
-            try:
-                cursor.execute("""
-                    SELECT COALESCE(MAX(CAST(SUBSTRING(numero_venda, 2) AS UNSIGNED)), 0) 
-                    FROM vendas WHERE loja_id = %s
-                """, (loja_id,))
-                
-                resultado = cursor.fetchone()
-                ultimo_numero = int(resultado['COALESCE(MAX(CAST(SUBSTRING(numero_venda, 2) AS UNSIGNED)), 0)']) if resultado else 0
-                proximo_numero = ultimo_numero + 1
-                numero_venda_candidato = f"V{proximo_numero:04d}"
-                
-                cursor.execute(
-                    "SELECT id FROM vendas WHERE numero_venda = %s AND loja_id = %s",
-                    (numero_venda_candidato, loja_id)
-                )
-                
-                if not cursor.fetchone():
-                    numero_venda = numero_venda_candidato
-                else:
-                    tentativas += 1
-                    continue
-                    
-            except Exception as e:
-                print(f"⚠️ Erro ao gerar número venda (tentativa {tentativas + 1}): {e}")
-                tentativas += 1
-                continue
-        
-        if not numero_venda:
-            timestamp = int(datetime.now().timestamp())
-            numero_venda = f"V{timestamp % 10000:04d}"
-            print(f"⚠️ Usando fallback para número da venda: {numero_venda}")
+        loja_id = ctx.loja_id
         
-        print(f"🔢 Número da venda gerado: {numero_venda}")
+        logger.debug(f"🛒 Processando venda para cliente: {venda_data.cliente}")
+        logger.debug(f"💰 Total da venda: R$ {venda_data.total_venda:.2f}")
+        logger.debug(f"📦 Itens: {len(venda_data.itens)}")
         
         # ✅ CORREÇÃO: DEFINIR STATUS COMO "concluida" (SEM ACENTO)
         status_venda = "concluida"
         
-        # ✅ INSERIR VENDA PRINCIPAL - CORRIGIDO COM STATUS
-        cursor.execute(
-            """INSERT INTO vendas 
-            (loja_id, numero_venda, cliente, total_venda, total_pago, forma_pagamento, 
-             observacoes, data_venda, vendedor_id, usuario_id, status) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-            (loja_id, numero_venda, venda_data.cliente, venda_data.total_venda,
-             venda_data.total_venda, venda_data.forma_pagamento, 
-             venda_data.observacoes or "Venda rápida - Sistema WebOS", 
-             venda_data.data_venda, session_data['user_id'], venda_data.usuario_id, status_venda)
-        )
-        
-        venda_id = cursor.lastrowid
-        print(f"✅ Venda principal criada: ID {venda_id}")
-        
-        # ✅ PROCESSAR ITENS DA VENDA E ATUALIZAR ESTOQUE
-        for produto_info in produtos_para_atualizar:
-            produto_id = produto_info['produto_id']
-            quantidade_vendida = produto_info['quantidade_vendida']
-            novo_estoque = produto_info['novo_estoque']
-            item_data = produto_info['item_data']
+        async def registrar():
+            # ✅ RESOLVER E TRAVAR TODOS OS PRODUTOS DO CARRINHO NUMA ÚNICA CONSULTA
+            linhas = await resolver_itens_venda(cursor, loja_id, venda_data.itens)
             
-            print(f"📦 Atualizando estoque do produto {produto_id}: {produto_info['estoque_atual']} -> {novo_estoque}")
+            # ✅ GERAR NÚMERO DA VENDA (sequência por loja, travada até o commit)
+            numero_venda = await proximo_numero_venda(cursor, loja_id)
             
-            # ✅ ATUALIZAR ESTOQUE
-            cursor.execute(
-                "UPDATE produtos SET estoque_atual = %s WHERE id = %s",
-                (novo_estoque, produto_id)
-            )
+            logger.debug(f"🔢 Número da venda gerado: {numero_venda}")
             
-            # ✅ INSERIR ITEM DA VENDA
-            cursor.execute(
-                """INSERT INTO itens_venda 
-                (venda_id, produto_id, produto_nome, quantidade, valor_unitario, total_item) 
-                VALUES (%s, %s, %s, %s, %s, %s)""",
-                (venda_id, produto_id, produto_info['nome'], quantidade_vendida, 
-                 item_data.preco_Unitario, item_data.preco_Total)
-            )
+            # ✅ INSERIR VENDA PRINCIPAL - CORRIGIDO COM STATUS
+            venda_id = await vendas.inserir(loja_id, numero_venda, venda_data, ctx.usuario_id, status_venda)
+            logger.debug(f"✅ Venda principal criada: ID {venda_id}")
             
-            print(f"✅ Item registrado: {produto_info['nome']} x {quantidade_vendida}")
-        
-        conn.commit()
+            # ✅ BAIXAR ESTOQUE E INSERIR ITENS EM LOTE
+            await baixar_estoque(cursor, loja_id, linhas)
+            await inserir_itens_venda(cursor, venda_id, linhas)
+            await agregados.somar_venda(
+                cursor, loja_id, venda_data.data_venda, venda_data.forma_pagamento,
+                venda_data.total_venda, sum(linha['quantidade_vendida'] for linha in linhas)
+            )
+            await agregados.somar_itens(cursor, loja_id, venda_data.data_venda, itens_agregado(linhas))
+            versao_catalogo = await incrementar_versao_catalogo(cursor, loja_id)
+            return venda_id, numero_venda, linhas, versao_catalogo
+        
+        venda_id, numero_venda, produtos_para_atualizar, versao_catalogo = await transacao_com_retentativa(ctx, registrar)
+        invalidar_caches(loja_id)
+        catalogo_produtos.ajustar_estoque(
+            loja_id, variacoes_estoque(produtos_para_atualizar, 'quantidade_vendida', -1), versao_catalogo
+        )
         
-        print(f"✅ Venda #{numero_venda} registrada com sucesso!")
-        print(f"   Cliente: {venda_data.cliente}")
-        print(f"   Total: R$ {venda_data.total_venda:.2f}")
-        print(f"   Itens: {len(produtos_para_atualizar)}")
-        print(f"   Venda ID: {venda_id}")
-        print(f"   Status: {status_venda}")
+        logger.info(f"✅ Venda #{numero_venda} registrada com sucesso!")
+        logger.debug(f"   Cliente: {venda_data.cliente}")
+        logger.debug(f"   Total: R$ {venda_data.total_venda:.2f}")
+        logger.debug(f"   Itens: {len(produtos_para_atualizar)}")
+        logger.debug(f"   Venda ID: {venda_id}")
+        logger.debug(f"   Status: {status_venda}")
         
         return VendaResponse(
             success=True,
@@ -1404,109 +1859,129 @@ async def criar_venda(venda_data: VendaData, session_data: dict = Depends(obter_
         )
         
     except HTTPException:
-        if conn: 
-            conn.rollback()
         raise
     except Exception as e:
-        if conn: 
-            conn.rollback()
-        print(f"❌ Erro ao registrar venda: {str(e)}")
-        import traceback
-        print(f"🔍 Traceback: {traceback.format_exc()}")
+        logger.error(f"❌ Erro ao registrar venda: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro ao registrar venda: {str(e)}")
-    finally:
-        if cursor: 
-            cursor.close()
-        if conn: 
-            conn.close()
+
+# Colunas da listagem; "completo" traz também as usadas na edição
+CAMPOS_LISTA_VENDAS = {
+    "resumo": """
+        v.id, v.numero_venda, v.cliente, v.total_venda, v.forma_pagamento,
+        v.data_venda, COALESCE(v.status, 'concluida') as status, u.nome as usuario_nome
+    """,
+    "completo": """
+        v.id, v.numero_venda, v.cliente, v.total_venda, v.forma_pagamento,
+        v.observacoes, v.data_venda, v.usuario_id, v.loja_id,
+        COALESCE(v.status, 'concluida') as status, u.nome as usuario_nome
+    """,
+}
+
 
 @app.get("/api/vendas")
-async def listar_vendas(session_data: dict = Depends(obter_vendedor)):
-    conn = None
-    cursor = None
+async def listar_vendas(
+    limite: int = Query(VENDAS_LIMITE_PADRAO, ge=1, le=VENDAS_LIMITE_MAXIMO),
+    apos: Optional[str] = Query(None, alias="cursor"),
+    data_inicio: Optional[str] = Query(None),
+    data_fim: Optional[str] = Query(None),
+    start_date: Optional[str] = Query(None, include_in_schema=False),
+    end_date: Optional[str] = Query(None, include_in_schema=False),
+    status: Optional[str] = Query(None),
+    vendedor_id: Optional[int] = Query(None),
+    forma_pagamento: Optional[str] = Query(None),
+    campos: str = Query("resumo", pattern="^(resumo|completo)$"),
+    ctx: contexto.Contexto = Depends(contexto_vendedor)
+):
+    """Vendas da mais recente para a mais antiga, em páginas.
+
+    Filtros opcionais de período (AAAA-MM-DD, inclusivo), status, vendedor
+    e forma de pagamento. A paginação é por cursor em ``(data_venda, id)``;
+    ``limite`` acima de VENDAS_LIMITE_MAXIMO responde 422 em vez de cortar
+    a lista calada: quem precisa de tudo segue o ``next_cursor``.
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        loja_id = ctx.loja_id
         
-        loja_id = get_loja_id(session_data)
+        query = f"""
+            SELECT {CAMPOS_LISTA_VENDAS[campos]}
+            FROM vendas v
+            INNER JOIN usuarios u ON v.usuario_id = u.id
+            WHERE v.loja_id = %s
+        """
+        params = [loja_id]
         
-        if session_data['perfil'] == 'admin':
-            cursor.execute("""
-                SELECT 
-                    v.id,
-                    v.numero_venda,
-                    v.cliente,
-                    v.total_venda,
-                    v.forma_pagamento,
-                    v.observacoes,
-                    v.data_venda,
-                    v.usuario_id,
-                    v.loja_id,
-                    COALESCE(v.status, 'concluida') as status,  -- ✅ CORREÇÃO: Garantir status padrão
-                    u.nome as usuario_nome 
-                FROM vendas v
-                INNER JOIN usuarios u ON v.usuario_id = u.id
-                WHERE v.loja_id = %s
-                ORDER BY v.data_venda DESC
-            """, (loja_id,))
-        else:
-            cursor.execute("""
-                SELECT 
-                    v.id,
-                    v.numero_venda,
-                    v.cliente,
-                    v.total_venda,
-                    v.forma_pagamento,
-                    v.observacoes,
-                    v.data_venda,
-                    v.usuario_id,
-                    v.loja_id,
-                    COALESCE(v.status, 'concluida') as status,  -- ✅ CORREÇÃO: Garantir status padrão
-                    u.nome as usuario_nome 
-                FROM vendas v
-                INNER JOIN usuarios u ON v.usuario_id = u.id
-                WHERE v.loja_id = %s AND v.usuario_id = %s
-                ORDER BY v.data_venda DESC
-            """, (loja_id, session_data['user_id']))
-        
-        vendas = cursor.fetchall()
-        return {"vendas": vendas}
+        # Vendedor só vê as próprias vendas
+        if ctx.perfil != 'admin':
+            vendedor_id = ctx.usuario_id
+        if vendedor_id is not None:
+            query += " AND v.usuario_id = %s"
+            params.append(vendedor_id)
+        
+        data_inicio = data_inicio or start_date
+        data_fim = data_fim or end_date
+        if data_inicio:
+            dia = ler_data(data_inicio, "data_inicio")
+            query += " AND v.data_venda >= %s"
+            params.append(intervalo_dias(dia, dia)[0])
+        if data_fim:
+            dia = ler_data(data_fim, "data_fim")
+            query += " AND v.data_venda < %s"
+            params.append(intervalo_dias(dia, dia)[1])
+        
+        if status:
+            # Status nulo (vendas antigas) é listado como 'concluida'
+            query += " AND (v.status = %s OR v.status IS NULL)" if status == 'concluida' else " AND v.status = %s"
+            params.append(status)
+        
+        if forma_pagamento:
+            query += " AND v.forma_pagamento = %s"
+            params.append(forma_pagamento)
+        
+        if apos:
+            condicao, valores = paginacao.condicao(("v.data_venda", "v.id"), apos, decrescente=True)
+            query += f" AND {condicao}"
+            params.extend(valores)
+        
+        query += " ORDER BY v.data_venda DESC, v.id DESC LIMIT %s"
+        params.append(limite + 1)
+        
+        cursor = ctx.cursor()
+        
+        await cursor.execute(query, params)
+        vendas, proximo = paginacao.fatiar(await cursor.fetchall(), limite, ("data_venda", "id"))
+        return resposta({"vendas": vendas, "next_cursor": proximo, "limite": limite})
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar vendas: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 @app.post("/api/fechamento-caixa/completo", response_model=FechamentoCaixaResponse)
-async def fechar_caixa_completo(fechamento_data: FechamentoCaixaCompleto, session_data: dict = Depends(obter_vendedor)):
-    conn = None
-    cursor = None
+async def fechar_caixa_completo(fechamento_data: FechamentoCaixaCompleto, ctx: contexto.Contexto = Depends(contexto_vendedor)):
     
-    print(f"🔄 Iniciando fechamento completo de caixa...")
+    logger.debug("🔄 Iniciando fechamento completo de caixa...")
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = ctx.cursor()
         
-        loja_id = get_loja_id(session_data)
-        user_id = session_data['user_id']
+        loja_id = ctx.loja_id
+        user_id = ctx.usuario_id
         
         if fechamento_data.valor_final < 0:
             raise HTTPException(status_code=400, detail="Valor final não pode ser negativo")
         
-        cursor.execute("""
+        await cursor.execute("""
             SELECT id, status FROM fechamento_caixa 
             WHERE user_id = %s AND data = %s AND loja_id = %s
             ORDER BY created_at DESC
             LIMIT 1
         """, (user_id, fechamento_data.data, loja_id))
         
-        fechamento_existente = cursor.fetchone()
+        fechamento_existente = await cursor.fetchone()
         
         if fechamento_existente and fechamento_existente['status'] == 'fechado':
-            print("📝 Criando novo registro de fechamento (já existe um fechado)")
-            cursor.execute("""
+            logger.debug("📝 Criando novo registro de fechamento (já existe um fechado)")
+            await cursor.execute("""
                 INSERT INTO fechamento_caixa 
                 (user_id, loja_id, data, valor_inicial, valor_final, total_vendas, 
                  total_entradas, total_saidas, total_os_entregues, observacoes, status, created_at)
@@ -1521,8 +1996,8 @@ async def fechar_caixa_completo(fechamento_data: FechamentoCaixaCompleto, sessio
             fechamento_id = cursor.lastrowid
             
         elif fechamento_existente and fechamento_existente['status'] == 'aberto':
-            print("📝 Atualizando fechamento existente")
-            cursor.execute("""
+            logger.debug("📝 Atualizando fechamento existente")
+            await cursor.execute("""
                 UPDATE fechamento_caixa 
                 SET valor_inicial = %s, valor_final = %s, total_vendas = %s,
                     total_entradas = %s, total_saidas = %s, total_os_entregues = %s,
@@ -1538,8 +2013,8 @@ async def fechar_caixa_completo(fechamento_data: FechamentoCaixaCompleto, sessio
             fechamento_id = fechamento_existente['id']
             
         else:
-            print("📝 Criando primeiro fechamento do dia")
-            cursor.execute("""
+            logger.debug("📝 Criando primeiro fechamento do dia")
+            await cursor.execute("""
                 INSERT INTO fechamento_caixa 
                 (user_id, loja_id, data, valor_inicial, valor_final, total_vendas, 
                  total_entradas, total_saidas, total_os_entregues, observacoes, status, created_at)
@@ -1553,9 +2028,9 @@ async def fechar_caixa_completo(fechamento_data: FechamentoCaixaCompleto, sessio
             ))
             fechamento_id = cursor.lastrowid
         
-        conn.commit()
+        await ctx.commit()
         
-        cursor.execute("""
+        await cursor.execute("""
             SELECT 
                 fc.*, 
                 u.nome as usuario,
@@ -1566,43 +2041,35 @@ async def fechar_caixa_completo(fechamento_data: FechamentoCaixaCompleto, sessio
             WHERE fc.id = %s
         """, (fechamento_id,))
         
-        fechamento = cursor.fetchone()
+        fechamento = await cursor.fetchone()
         
-        print(f"✅ Caixa fechado com sucesso! ID: {fechamento_id}")
+        logger.info(f"✅ Caixa fechado com sucesso! ID: {fechamento_id}")
         
         return FechamentoCaixaResponse(**fechamento)
         
     except HTTPException:
         raise
     except Exception as e:
-        if conn: 
-            conn.rollback()
-        print(f"❌ Erro ao fechar caixa: {str(e)}")
+        logger.error(f"❌ Erro ao fechar caixa: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao fechar caixa: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 @app.get("/api/fechamento-caixa/hoje")
-async def verificar_fechamento_hoje(session_data: dict = Depends(obter_vendedor)):
-    conn = None
-    cursor = None
+async def verificar_fechamento_hoje(ctx: contexto.Contexto = Depends(contexto_vendedor)):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = ctx.cursor()
         
         hoje = date.today().isoformat()
-        loja_id = get_loja_id(session_data)
+        loja_id = ctx.loja_id
         
-        cursor.execute("""
+        await cursor.execute("""
             SELECT id, data, status, valor_final, created_at, user_id
             FROM fechamento_caixa 
             WHERE user_id = %s AND data = %s AND loja_id = %s
             ORDER BY created_at DESC
             LIMIT 1
-        """, (session_data['user_id'], hoje, loja_id))
+        """, (ctx.usuario_id, hoje, loja_id))
         
-        fechamento = cursor.fetchone()
+        fechamento = await cursor.fetchone()
         
         if fechamento:
             esta_fechado = fechamento['status'] == 'fechado'
@@ -1617,201 +2084,114 @@ async def verificar_fechamento_hoje(session_data: dict = Depends(obter_vendedor)
                 "fechamento": None
             }
         
+    except HTTPException:
+        raise
     except Exception as e:
         return {
             "fechado": False,
             "fechamento": None,
             "erro": str(e)
         }
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 # =============================================
 # ENDPOINTS DE USUÁRIOS
 # =============================================
 
 @app.get("/api/usuarios")
-async def listar_usuarios(session_data: dict = Depends(obter_todos_usuarios)):
-    if session_data['perfil'] != 'admin':
+async def listar_usuarios(ctx: contexto.Contexto = Depends(contexto_requisicao)):
+    if ctx.perfil != 'admin':
         raise HTTPException(status_code=403, detail="Apenas administradores podem visualizar usuários")
     
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        if not conn:
-            raise HTTPException(status_code=500, detail="Erro de conexão com o banco")
-            
-        cursor = conn.cursor(dictionary=True)
-        
-        loja_id = get_loja_id(session_data)
+        loja_id = ctx.loja_id
         
-        cursor.execute("""
-            SELECT id, loja_id, nome, email, perfil, ativo, data_criacao
-            FROM usuarios 
-            WHERE loja_id = %s
-            ORDER BY nome
-        """, (loja_id,))
+        usuarios = await repositorios.UsuarioRepo(ctx).listar(loja_id)
         
-        usuarios = cursor.fetchall()
-        
-        for usuario in usuarios:
-            if usuario['data_criacao']:
-                usuario['data_criacao'] = usuario['data_criacao'].isoformat()
-        
-        return {"usuarios": usuarios}
+        return resposta({"usuarios": com_booleanos(usuarios)})
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar usuários: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 @app.post("/api/usuarios")
-async def criar_usuario(usuario_data: UsuarioCreate, session_data: dict = Depends(obter_todos_usuarios)):
-    if session_data['perfil'] != 'admin':
+async def criar_usuario(usuario_data: UsuarioCreate, ctx: contexto.Contexto = Depends(contexto_requisicao)):
+    if ctx.perfil != 'admin':
         raise HTTPException(status_code=403, detail="Apenas administradores podem criar usuários")
     
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        usuarios = repositorios.UsuarioRepo(ctx)
         
-        loja_id = get_loja_id(session_data)
+        loja_id = ctx.loja_id
         
-        cursor.execute(
-            "SELECT id FROM usuarios WHERE nome = %s AND loja_id = %s",
-            (usuario_data.nome, loja_id)
-        )
-        if cursor.fetchone():
+        if await usuarios.nome_em_uso(loja_id, usuario_data.nome):
             raise HTTPException(status_code=400, detail="Já existe usuário com este nome")
         
-        if usuario_data.email:
-            cursor.execute(
-                "SELECT id FROM usuarios WHERE email = %s AND loja_id = %s",
-                (usuario_data.email, loja_id)
-            )
-            if cursor.fetchone():
-                raise HTTPException(status_code=400, detail="Já existe usuário com este email")
-        
-        hashed_password = hash_password(usuario_data.password)
+        if usuario_data.email and await usuarios.email_em_uso(loja_id, usuario_data.email):
+            raise HTTPException(status_code=400, detail="Já existe usuário com este email")
         
-        cursor.execute("""
-            INSERT INTO usuarios (loja_id, nome, email, password, perfil, ativo, data_criacao)
-            VALUES (%s, %s, %s, %s, %s, %s, NOW())
-        """, (
-            loja_id, usuario_data.nome, usuario_data.email, 
-            hashed_password, usuario_data.perfil, usuario_data.ativo
-        ))
-        
-        usuario_id = cursor.lastrowid
-        conn.commit()
+        hashed_password = await servico_senhas.gerar_hash(usuario_data.password)
         
-        cursor.execute("""
-            SELECT id, loja_id, nome, email, perfil, ativo, data_criacao
-            FROM usuarios WHERE id = %s
-        """, (usuario_id,))
+        usuario_id = await usuarios.inserir(loja_id, usuario_data, hashed_password)
+        await ctx.commit()
         
-        usuario = cursor.fetchone()
+        usuario = await usuarios.buscar(loja_id, usuario_id)
         
-        if usuario and usuario['data_criacao']:
-            usuario['data_criacao'] = usuario['data_criacao'].isoformat()
-        
-        return {
+        return resposta({
             "success": True,
             "message": "Usuário criado com sucesso",
-            "usuario": usuario
-        }
+            "usuario": com_booleanos(usuario)
+        })
         
     except HTTPException:
         raise
     except Exception as e:
-        if conn: conn.rollback()
         raise HTTPException(status_code=500, detail=f"Erro ao criar usuário: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 @app.put("/api/usuarios/{usuario_id}")
-async def atualizar_usuario(usuario_id: int, usuario_data: UsuarioUpdate, session_data: dict = Depends(obter_todos_usuarios)):
-    if session_data['perfil'] != 'admin':
+async def atualizar_usuario(usuario_id: int, usuario_data: UsuarioUpdate, ctx: contexto.Contexto = Depends(contexto_requisicao)):
+    if ctx.perfil != 'admin':
         raise HTTPException(status_code=403, detail="Apenas administradores podem editar usuários")
     
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = ctx.cursor()
+        usuarios = repositorios.UsuarioRepo(ctx)
         
-        loja_id = get_loja_id(session_data)
+        loja_id = ctx.loja_id
         
-        cursor.execute(
-            "SELECT id FROM usuarios WHERE id = %s AND loja_id = %s",
-            (usuario_id, loja_id)
-        )
-        if not cursor.fetchone():
+        usuario_atual = await usuarios.buscar(loja_id, usuario_id)
+        if not usuario_atual:
             raise HTTPException(status_code=404, detail="Usuário não encontrado")
         
-        update_fields = []
-        update_values = []
-        
-        if usuario_data.nome is not None:
-            update_fields.append("nome = %s")
-            update_values.append(usuario_data.nome)
-        
-        if usuario_data.email is not None:
-            update_fields.append("email = %s")
-            update_values.append(usuario_data.email)
-        
-        if usuario_data.perfil is not None:
-            update_fields.append("perfil = %s")
-            update_values.append(usuario_data.perfil)
-        
-        if usuario_data.ativo is not None:
-            update_fields.append("ativo = %s")
-            update_values.append(usuario_data.ativo)
-        
-        if usuario_data.password is not None:
-            hashed_password = hash_password(usuario_data.password)
-            update_fields.append("password = %s")
-            update_values.append(hashed_password)
-        
-        if not update_fields:
+        campos = repositorios.campos_informados(usuario_data, repositorios.CAMPOS_USUARIO)
+        if not campos:
             raise HTTPException(status_code=400, detail="Nenhum campo fornecido para atualização")
         
-        update_values.extend([usuario_id, loja_id])
+        if 'password' in campos:
+            campos['password'] = await servico_senhas.gerar_hash(campos['password'])
         
-        query = f"UPDATE usuarios SET {', '.join(update_fields)} WHERE id = %s AND loja_id = %s"
-        cursor.execute(query, update_values)
+        await usuarios.atualizar(loja_id, usuario_id, campos)
         
-        conn.commit()
+        # Usuário desativado, com nova senha ou outro perfil perde as sessões
+        # abertas (a sessão e o token renovado guardam o perfil antigo)
+        perfil_mudou = usuario_data.perfil is not None and usuario_data.perfil != usuario_atual['perfil']
+        if usuario_data.ativo is False or usuario_data.password is not None or perfil_mudou:
+            await encerrar_sessoes_usuario(cursor, usuario_id)
         
-        cursor.execute("""
-            SELECT id, loja_id, nome, email, perfil, ativo, data_criacao
-            FROM usuarios WHERE id = %s AND loja_id = %s
-        """, (usuario_id, loja_id))
+        await ctx.commit()
         
-        usuario_atualizado = cursor.fetchone()
+        usuario_atualizado = await usuarios.buscar(loja_id, usuario_id)
         
-        if usuario_atualizado and usuario_atualizado['data_criacao']:
-            usuario_atualizado['data_criacao'] = usuario_atualizado['data_criacao'].isoformat()
-        
-        return {
+        return resposta({
             "success": True,
             "message": "Usuário atualizado com sucesso",
-            "usuario": usuario_atualizado
-        }
+            "usuario": com_booleanos(usuario_atualizado)
+        })
         
     except HTTPException:
         raise
     except Exception as e:
-        if conn: conn.rollback()
         raise HTTPException(status_code=500, detail=f"Erro ao atualizar usuário: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 # =============================================
 # ENDPOINTS DE RELATÓRIOS E ANALYTICS
@@ -1821,120 +2201,166 @@ async def atualizar_usuario(usuario_id: int, usuario_data: UsuarioUpdate, sessio
 async def relatorios_vendas_periodo(
     data_inicio: Optional[str] = Query(None),
     data_fim: Optional[str] = Query(None),
-    session_data: dict = Depends(obter_admin)
+    ctx: contexto.Contexto = Depends(contexto_relatorio)
 ):
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        loja_id = ctx.loja_id
         
-        loja_id = get_loja_id(session_data)
+        # Sem as duas datas, o relatório cobre todo o histórico
+        dia_inicio = dia_fim = None
+        if data_inicio and data_fim:
+            dia_inicio = ler_data(data_inicio, "data_inicio")
+            dia_fim = ler_data(data_fim, "data_fim")
+        
+        mais_vendidos = await produtos_mais_vendidos(loja_id, dia_inicio, dia_fim, 10)
+        
+        cursor = ctx.cursor()
         
+        # Dias e formas de pagamento saem do mesmo agregado (sem canceladas),
+        # então as seções e o total geral batem entre si
         query = """
             SELECT 
-                DATE(v.data_venda) as data,
-                COUNT(*) as quantidade_vendas,
-                SUM(v.total_venda) as valor_total,
-                AVG(v.total_venda) as ticket_medio,
-                COUNT(DISTINCT v.usuario_id) as vendedores_ativos
-            FROM vendas v
-            WHERE v.loja_id = %s
+                dia as data,
+                SUM(quantidade_vendas) as quantidade_vendas,
+                SUM(valor_total) as valor_total
+            FROM vendas_diarias
+            WHERE loja_id = %s
         """
         params = [loja_id]
         
-        if data_inicio and data_fim:
-            query += " AND DATE(v.data_venda) BETWEEN %s AND %s"
-            params.extend([data_inicio, data_fim])
-        
-        query += " GROUP BY DATE(v.data_venda) ORDER BY data"
-        
-        cursor.execute(query, params)
-        dados_vendas = cursor.fetchall()
+        # COUNT(DISTINCT) não soma entre dias: vendedores vêm das vendas, com o mesmo filtro
+        query_vendedores = """
+            SELECT DATE(v.data_venda) as data, COUNT(DISTINCT v.usuario_id) as vendedores_ativos
+            FROM vendas v
+            WHERE v.loja_id = %s AND COALESCE(v.status, 'concluida') <> 'cancelada'
+        """
+        params_vendedores = [loja_id]
         
-        cursor.execute("""
+        query_formas = """
             SELECT 
-                forma_pagamento,
-                COUNT(*) as quantidade,
-                SUM(total_venda) as valor_total
-            FROM vendas 
+                NULLIF(forma_pagamento, '') as forma_pagamento,
+                SUM(quantidade_vendas) as quantidade,
+                SUM(valor_total) as valor_total
+            FROM vendas_diarias 
             WHERE loja_id = %s
-            GROUP BY forma_pagamento
-        """, (loja_id,))
+        """
+        params_formas = [loja_id]
         
-        formas_pagamento = cursor.fetchall()
+        if dia_inicio:
+            query += " AND dia >= %s AND dia <= %s"
+            params.extend((dia_inicio, dia_fim))
+            query_vendedores += " AND v.data_venda >= %s AND v.data_venda < %s"
+            params_vendedores.extend(intervalo_dias(dia_inicio, dia_fim))
+            query_formas += " AND dia >= %s AND dia <= %s"
+            params_formas.extend((dia_inicio, dia_fim))
         
-        cursor.execute("""
-            SELECT 
-                p.nome as produto,
-                SUM(iv.quantidade) as quantidade_vendida,
-                SUM(iv.total_item) as valor_total
-            FROM itens_venda iv
-            INNER JOIN produtos p ON iv.produto_id = p.id
-            INNER JOIN vendas v ON iv.venda_id = v.id
-            WHERE v.loja_id = %s
-            GROUP BY p.id, p.nome
-            ORDER BY quantidade_vendida DESC
-            LIMIT 10
-        """, (loja_id,))
+        query += " GROUP BY dia HAVING SUM(quantidade_vendas) > 0 ORDER BY dia"
+        query_vendedores += " GROUP BY DATE(v.data_venda)"
+        query_formas += " GROUP BY forma_pagamento HAVING SUM(quantidade_vendas) > 0"
         
-        produtos_mais_vendidos = cursor.fetchall()
+        await cursor.execute(query, params)
+        dados_vendas = await cursor.fetchall()
         
-        return {
+        await cursor.execute(query_vendedores, params_vendedores)
+        vendedores = {str(linha['data']): linha['vendedores_ativos'] for linha in await cursor.fetchall()}
+        for item in dados_vendas:
+            item['ticket_medio'] = float(item['valor_total']) / item['quantidade_vendas']
+            item['vendedores_ativos'] = vendedores.get(str(item['data']), 0)
+        
+        await cursor.execute(query_formas, params_formas)
+        formas_pagamento = await cursor.fetchall()
+        
+        return resposta({
             "periodo": {
                 "inicio": data_inicio,
                 "fim": data_fim
             },
-            "vendas_por_dia": serialize_mysql_data(dados_vendas),
-            "formas_pagamento": serialize_mysql_data(formas_pagamento),
-            "produtos_mais_vendidos": serialize_mysql_data(produtos_mais_vendidos),
+            "vendas_por_dia": dados_vendas,
+            "formas_pagamento": formas_pagamento,
+            "produtos_mais_vendidos": mais_vendidos,
             "total_geral": {
                 "quantidade_vendas": sum(item['quantidade_vendas'] for item in dados_vendas),
                 "valor_total": float(sum(item['valor_total'] for item in dados_vendas)),
                 "ticket_medio": float(sum(item['valor_total'] for item in dados_vendas) / sum(item['quantidade_vendas'] for item in dados_vendas)) if dados_vendas else 0
             }
-        }
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao gerar relatório de vendas: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
+
+@app.get("/api/relatorios/mais-vendidos")
+async def relatorio_mais_vendidos(
+    data_inicio: Optional[str] = Query(None),
+    data_fim: Optional[str] = Query(None),
+    limite: int = Query(10, ge=1, le=100),
+    ordem: str = Query("quantidade", pattern="^(quantidade|valor)$"),
+    session_data: dict = Depends(obter_admin)
+):
+    """Top ``limite`` produtos do período (vendas canceladas não contam)."""
+    try:
+        loja_id = get_loja_id(session_data)
+        dia_inicio = ler_data(data_inicio, "data_inicio") if data_inicio else None
+        dia_fim = ler_data(data_fim, "data_fim") if data_fim else None
+        
+        produtos = await produtos_mais_vendidos(loja_id, dia_inicio, dia_fim, limite, ordem)
+        
+        return resposta({
+            "periodo": {"inicio": data_inicio, "fim": data_fim},
+            "ordem": ordem,
+            "produtos": produtos
+        })
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar ranking de produtos: {str(e)}")
+
+SQL_ESTOQUE_DETALHADO = """
+    SELECT 
+        p.nome,
+        p.codigo_barras,
+        p.categoria,
+        p.marca,
+        p.estoque_atual,
+        p.estoque_minimo,
+        p.preco_custo,
+        p.preco_venda,
+        (p.estoque_atual * p.preco_custo) as valor_estoque,
+        CASE 
+            WHEN p.estoque_atual = 0 THEN 'CRÍTICO'
+            WHEN p.estoque_atual <= p.estoque_minimo THEN 'BAIXO'
+            ELSE 'NORMAL'
+        END as status_estoque
+    FROM produtos p
+    WHERE p.loja_id = %s AND p.ativo = 1
+    ORDER BY status_estoque, p.nome
+"""
 
 @app.get("/api/relatorios/estoque-detalhado")
-async def relatorio_estoque_detalhado(session_data: dict = Depends(obter_admin)):
-    conn = None
-    cursor = None
+async def relatorio_estoque_detalhado(
+    formato: Optional[str] = Query(None, pattern=exportacao.PADRAO_FORMATO),
+    ctx: contexto.Contexto = Depends(contexto_relatorio)
+):
+    """Estoque por produto; ``formato=csv|ndjson`` exporta em streaming (só as linhas)."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        loja_id = ctx.loja_id
         
-        loja_id = get_loja_id(session_data)
+        if formato:
+            conn = await ctx.conexao()
+            lotes = exportacao.ler_em_lotes(conn, SQL_ESTOQUE_DETALHADO, (loja_id,))
+            partes = exportacao.em_csv(lotes) if formato == "csv" else exportacao.em_ndjson(lotes)
+            # A resposta devolve a conexão ao terminar o envio
+            return exportacao.resposta(ctx.transferir(), partes, formato, "estoque-detalhado")
         
-        cursor.execute("""
-            SELECT 
-                p.nome,
-                p.codigo_barras,
-                p.categoria,
-                p.marca,
-                p.estoque_atual,
-                p.estoque_minimo,
-                p.preco_custo,
-                p.preco_venda,
-                (p.estoque_atual * p.preco_custo) as valor_estoque,
-                CASE 
-                    WHEN p.estoque_atual = 0 THEN 'CRÍTICO'
-                    WHEN p.estoque_atual <= p.estoque_minimo THEN 'BAIXO'
-                    ELSE 'NORMAL'
-                END as status_estoque
-            FROM produtos p
-            WHERE p.loja_id = %s AND p.ativo = 1
-            ORDER BY status_estoque, p.nome
-        """, (loja_id,))
+        cursor = ctx.cursor()
+        
+        await cursor.execute(SQL_ESTOQUE_DETALHADO, (loja_id,))
         
-        produtos = cursor.fetchall()
+        produtos = await cursor.fetchall()
         
-        cursor.execute("""
+        await cursor.execute("""
             SELECT 
                 COUNT(*) as total_produtos,
                 SUM(CASE WHEN estoque_atual = 0 THEN 1 ELSE 0 END) as produtos_sem_estoque,
@@ -1945,77 +2371,352 @@ async def relatorio_estoque_detalhado(session_data: dict = Depends(obter_admin))
             WHERE loja_id = %s AND ativo = 1
         """, (loja_id,))
         
-        estatisticas = cursor.fetchone()
+        estatisticas = await cursor.fetchone()
         
-        return {
-            "produtos": serialize_mysql_data(produtos),
-            "estatisticas": serialize_mysql_data(estatisticas),
+        return resposta({
+            "produtos": produtos,
+            "estatisticas": estatisticas,
             "data_geracao": datetime.now().isoformat()
-        }
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao gerar relatório de estoque: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
+
+# =============================================
+# RELATÓRIOS DO POST /api/relatorios/gerar
+# =============================================
+# tipo pedido -> (chave na resposta, função, calculado)
+# Funções de consulta recebem (loja_id, inicio, fim) e devolvem (sql, params);
+# as calculadas são assíncronas e devolvem as linhas prontas.
+RELATORIOS = {}
+
+# Giro de estoque sem período informado: últimos N dias
+GIRO_DIAS_PADRAO = 30
+
+
+def registrar_relatorio(tipo: str, chave: str, calculado: bool = False):
+    """Registra um tipo de relatório (``inicio``/``fim``: datas inclusivas ou None)."""
+    def registrar(funcao):
+        RELATORIOS[tipo] = (chave, funcao, calculado)
+        return funcao
+    return registrar
+
+
+def filtro_data_venda(inicio: Optional[date], fim: Optional[date], coluna: str = "v.data_venda"):
+    """``(sql, params)`` do período sobre uma coluna DATETIME; vazio sem período."""
+    sql, params = "", []
+    if inicio:
+        sql += f" AND {coluna} >= %s"
+        params.append(datetime.combine(inicio, datetime.min.time()))
+    if fim:
+        sql += f" AND {coluna} < %s"
+        params.append(datetime.combine(fim + timedelta(days=1), datetime.min.time()))
+    return sql, params
+
+
+def filtro_dia(inicio: Optional[date], fim: Optional[date], coluna: str = "dia"):
+    """``(sql, params)`` do período sobre uma coluna DATE dos agregados."""
+    sql, params = "", []
+    if inicio:
+        sql += f" AND {coluna} >= %s"
+        params.append(inicio)
+    if fim:
+        sql += f" AND {coluna} <= %s"
+        params.append(fim)
+    return sql, params
+
+
+@registrar_relatorio("estoque", "estoque")
+def secao_estoque(loja_id: int, inicio, fim):
+    """Posição atual do estoque; não depende do período."""
+    return """
+        SELECT 
+            codigo_barras, nome, categoria, marca, 
+            estoque_atual, estoque_minimo, preco_custo, preco_venda,
+            CASE 
+                WHEN estoque_atual = 0 THEN 'CRÍTICO'
+                WHEN estoque_atual <= estoque_minimo THEN 'BAIXO'
+                ELSE 'NORMAL'
+            END as status_estoque
+        FROM produtos 
+        WHERE loja_id = %s AND ativo = 1
+        ORDER BY nome
+    """, (loja_id,)
+
+
+@registrar_relatorio("mais-vendidos", "mais_vendidos", calculado=True)
+async def secao_mais_vendidos(loja_id: int, inicio, fim):
+    """Top 20 por valor, do ranking em cache (ver produtos_mais_vendidos)."""
+    ranking = await produtos_mais_vendidos(loja_id, inicio, fim, 20, "valor")
+    return [{
+        "produto": item["produto"],
+        "quantidade_vendida": item["quantidade_vendida"],
+        "total_vendido": item["valor_total"],
+        "total_vendas": item["total_vendas"]
+    } for item in ranking]
+
+
+@registrar_relatorio("giro-estoque", "giro_estoque")
+def secao_giro_estoque(loja_id: int, inicio, fim):
+    """Vendido no período contra o estoque atual; sem início, os últimos 30 dias."""
+    fim = fim or date.today()
+    inicio = inicio or fim - timedelta(days=GIRO_DIAS_PADRAO - 1)
+    dias = float((fim - inicio).days + 1)
+    return """
+        SELECT 
+            p.nome, p.codigo_barras, p.categoria, p.estoque_atual,
+            COALESCE(a.quantidade, 0) as quantidade_vendida,
+            ROUND(COALESCE(a.quantidade, 0) / NULLIF(p.estoque_atual, 0), 2) as giro,
+            ROUND(p.estoque_atual / NULLIF(COALESCE(a.quantidade, 0) / %s, 0), 1) as dias_cobertura
+        FROM produtos p
+        LEFT JOIN (
+            SELECT produto_id, SUM(quantidade) as quantidade
+            FROM produtos_vendas_diarias
+            WHERE loja_id = %s AND dia >= %s AND dia <= %s
+            GROUP BY produto_id
+        ) a ON a.produto_id = p.id
+        WHERE p.loja_id = %s AND p.ativo = 1
+        ORDER BY quantidade_vendida DESC, p.nome
+    """, (dias, loja_id, inicio, fim, loja_id)
+
+
+@registrar_relatorio("vendas-vendedor", "vendas_vendedor")
+def secao_vendas_vendedor(loja_id: int, inicio, fim):
+    periodo, params = filtro_data_venda(inicio, fim)
+    return f"""
+        SELECT 
+            v.usuario_id as vendedor_id,
+            COALESCE(u.nome, 'Sem vendedor') as vendedor,
+            COUNT(*) as quantidade_vendas,
+            SUM(v.total_venda) as valor_total,
+            AVG(v.total_venda) as ticket_medio
+        FROM vendas v
+        LEFT JOIN usuarios u ON u.id = v.usuario_id
+        WHERE v.loja_id = %s AND COALESCE(v.status, 'concluida') <> 'cancelada'{periodo}
+        GROUP BY v.usuario_id, u.nome
+        ORDER BY valor_total DESC
+    """, (loja_id, *params)
+
+
+@registrar_relatorio("vendas-categoria", "vendas_categoria")
+def secao_vendas_categoria(loja_id: int, inicio, fim):
+    periodo, params = filtro_dia(inicio, fim, "a.dia")
+    return f"""
+        SELECT 
+            COALESCE(p.categoria, 'Sem categoria') as categoria,
+            SUM(a.quantidade) as quantidade_vendida,
+            SUM(a.valor_total) as valor_total,
+            COUNT(DISTINCT a.produto_id) as produtos
+        FROM produtos_vendas_diarias a
+        INNER JOIN produtos p ON p.id = a.produto_id
+        WHERE a.loja_id = %s{periodo}
+        GROUP BY COALESCE(p.categoria, 'Sem categoria')
+        HAVING SUM(a.quantidade) > 0
+        ORDER BY valor_total DESC
+    """, (loja_id, *params)
+
+
+def com_limite_tempo(sql: str, segundos: float) -> str:
+    """Pede ao MySQL que aborte o SELECT depois de ``segundos`` (hint ignorado por outros bancos)."""
+    return re.sub(r"^\s*SELECT\b", f"SELECT /*+ MAX_EXECUTION_TIME({int(segundos * 1000)}) */",
+                  sql, count=1, flags=re.IGNORECASE)
+
+
+async def executar_relatorio(tipo: str, loja_id: int, inicio, fim, limite: float,
+                             ctx: contexto.Contexto) -> list:
+    """Roda um tipo de relatório em ``ctx``, com conexão própria do pool."""
+    chave, funcao, calculado = RELATORIOS[tipo]
+    if calculado:
+        return await funcao(loja_id, inicio, fim)
+    sql, params = funcao(loja_id, inicio, fim)
+    async with ctx:
+        cursor = ctx.cursor()
+        await cursor.execute(com_limite_tempo(sql, limite), params)
+        return await cursor.fetchall()
+
+
+def _ignorar_resultado(tarefa):
+    # Relatório que estourou o tempo e foi cancelado: evita o aviso de exceção não lida
+    if not tarefa.cancelled():
+        tarefa.exception()
+
+
+async def executar_relatorios(tipos: list, loja_id: int, inicio, fim, limite: float = None):
+    """Roda os tipos em paralelo; devolve ``(relatorios, erros)`` por chave.
+
+    Quem não termina em ``limite`` segundos (padrão RELATORIO_TIMEOUT) entra
+    em ``erros``: a consulta é abortada no banco, a tarefa é cancelada e a
+    conexão é descartada assim que a thread do banco a devolve.
+    """
+    limite = limite or RELATORIO_TIMEOUT
+    contextos = {tipo: contexto.Contexto(pesado=True) for tipo in tipos}
+    execucoes = {tipo: asyncio.ensure_future(executar_relatorio(tipo, loja_id, inicio, fim, limite, contextos[tipo]))
+                 for tipo in tipos}
+    if execucoes:
+        await asyncio.wait(execucoes.values(), timeout=limite)
+    relatorios, erros = {}, {}
+    for tipo, tarefa in execucoes.items():
+        chave = RELATORIOS[tipo][0]
+        if not tarefa.done():
+            contextos[tipo].interromper()
+            tarefa.cancel()
+            tarefa.add_done_callback(_ignorar_resultado)
+            erros[chave] = f"Tempo esgotado ({limite:g}s)"
+            logger.warning(f"⏱️ Relatório {tipo} passou de {limite:g}s")
+        elif tarefa.exception() is not None:
+            erros[chave] = str(tarefa.exception())
+            logger.error(f"❌ Relatório {tipo} falhou: {tarefa.exception()}")
+        else:
+            relatorios[chave] = tarefa.result()
+    return relatorios, erros
+
+
+async def lotes_da_secao(conn, conteudo):
+    """Linhas já calculadas (lista) num lote só, ou ``(sql, params)`` lido em lotes."""
+    if isinstance(conteudo, list):
+        if conteudo:
+            yield conteudo
+        return
+    sql, params = conteudo
+    async for lote in exportacao.ler_em_lotes(conn, sql, params):
+        yield lote
+
+
+async def secoes_em_ndjson(conn, secoes: list):
+    """Seções uma após a outra; cada linha leva o campo ``relatorio``."""
+    for chave, conteudo in secoes:
+        async for parte in exportacao.em_ndjson(lotes_da_secao(conn, conteudo), {"relatorio": chave}):
+            yield parte
+
+
+def ler_pedido_relatorio(relatorio_data: RelatorioRequest):
+    """``(tipos, inicio, fim)`` do pedido; 400 se as datas forem inválidas."""
+    todos = 'todos' in relatorio_data.tipos
+    tipos = [tipo for tipo in RELATORIOS if todos or tipo in relatorio_data.tipos]
+    inicio = ler_data(relatorio_data.data_inicio, "data_inicio") if relatorio_data.data_inicio else None
+    fim = ler_data(relatorio_data.data_fim, "data_fim") if relatorio_data.data_fim else None
+    if inicio and fim and inicio > fim:
+        raise HTTPException(status_code=400, detail="data_inicio deve ser anterior ou igual a data_fim")
+    return tipos, inicio, fim
+
+
+async def montar_relatorio_completo(relatorio_data: RelatorioRequest, tipos: list, loja_id: int,
+                                    inicio, fim, limite: float = None) -> dict:
+    """Corpo JSON de POST /api/relatorios/gerar (também usado pelas tarefas)."""
+    relatorios, erros = await executar_relatorios(tipos, loja_id, inicio, fim, limite)
+    if erros and not relatorios:
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar relatório: {'; '.join(erros.values())}")
+    
+    return {
+        "success": True,
+        "relatorios": relatorios,
+        "erros": erros,
+        "parcial": bool(erros),
+        "periodo": {"inicio": relatorio_data.data_inicio, "fim": relatorio_data.data_fim},
+        "data_geracao": datetime.now().isoformat(),
+        "tipos_selecionados": relatorio_data.tipos
+    }
+
 
 @app.post("/api/relatorios/gerar")
-async def gerar_relatorio_completo(relatorio_data: RelatorioRequest, session_data: dict = Depends(obter_admin)):
-    conn = None
-    cursor = None
+async def gerar_relatorio_completo(
+    relatorio_data: RelatorioRequest,
+    formato: Optional[str] = Query(None, pattern=exportacao.PADRAO_FORMATO),
+    ctx: contexto.Contexto = Depends(contexto_relatorio)
+):
+    """Relatórios selecionados no período ``data_inicio``..``data_fim``.
+
+    Cada tipo roda em paralelo na sua conexão; os que falham ou passam do
+    tempo vão para ``erros`` e o restante é devolvido (``parcial``).
+    ``formato=ndjson`` (ou ``csv``, com um único tipo) exporta em streaming,
+    um tipo após o outro na mesma conexão.
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        loja_id = get_loja_id(session_data)
-        
-        relatorios = {}
-        
-        if 'estoque' in relatorio_data.tipos or 'todos' in relatorio_data.tipos:
-            cursor.execute("""
-                SELECT 
-                    codigo_barras, nome, categoria, marca, 
-                    estoque_atual, estoque_minimo, preco_custo, preco_venda,
-                    CASE 
-                        WHEN estoque_atual = 0 THEN 'CRÍTICO'
-                        WHEN estoque_atual <= estoque_minimo THEN 'BAIXO'
-                        ELSE 'NORMAL'
-                    END as status_estoque
-                FROM produtos 
-                WHERE loja_id = %s AND ativo = 1
-                ORDER BY nome
-            """, (loja_id,))
-            relatorios['estoque'] = cursor.fetchall()
-        
-        if 'mais-vendidos' in relatorio_data.tipos or 'todos' in relatorio_data.tipos:
-            cursor.execute("""
-                SELECT 
-                    p.nome as produto,
-                    SUM(iv.quantidade) as quantidade_vendida,
-                    SUM(iv.total_item) as total_vendido,
-                    COUNT(iv.id) as total_vendas
-                FROM itens_venda iv
-                INNER JOIN produtos p ON iv.produto_id = p.id
-                INNER JOIN vendas v ON iv.venda_id = v.id
-                WHERE v.loja_id = %s
-                GROUP BY p.id, p.nome
-                ORDER BY total_vendido DESC
-                LIMIT 20
-            """, (loja_id,))
-            relatorios['mais_vendidos'] = cursor.fetchall()
+        tipos, inicio, fim = ler_pedido_relatorio(relatorio_data)
+        if formato == "csv" and len(tipos) != 1:
+            raise HTTPException(status_code=400, detail="CSV exporta um relatório por vez; use formato=ndjson para vários")
+        
+        loja_id = ctx.loja_id
+        
+        if formato:
+            # Calculados primeiro: usam conexão própria, não a do streaming
+            secoes = []
+            for tipo in tipos:
+                chave, funcao, calculado = RELATORIOS[tipo]
+                conteudo = await funcao(loja_id, inicio, fim) if calculado else funcao(loja_id, inicio, fim)
+                secoes.append((chave, conteudo))
+            
+            conn = await ctx.conexao()
+            if formato == "csv":
+                partes = exportacao.em_csv(lotes_da_secao(conn, secoes[0][1]))
+            else:
+                partes = secoes_em_ndjson(conn, secoes)
+            # A resposta devolve a conexão ao terminar o envio
+            return exportacao.resposta(ctx.transferir(), partes, formato, "relatorio")
         
-        return {
-            "success": True,
-            "relatorios": relatorios,
-            "data_geracao": datetime.now().isoformat(),
-            "tipos_selecionados": relatorio_data.tipos
-        }
+        return resposta(await montar_relatorio_completo(relatorio_data, tipos, loja_id, inicio, fim))
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao gerar relatório: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
+
+
+def situacao_tarefa(meta: dict) -> dict:
+    situacao = fila_relatorios.publico(meta)
+    situacao["status_url"] = f"/api/relatorios/tarefas/{meta['id']}"
+    situacao["resultado_url"] = f"/api/relatorios/tarefas/{meta['id']}/resultado"
+    return situacao
+
+
+def tarefa_da_loja(tarefa_id: str, loja_id: int) -> dict:
+    meta = fila_relatorios.status(tarefa_id)
+    if meta is None or meta["grupo"] != loja_id:
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada ou expirada")
+    return meta
+
+
+@app.post("/api/relatorios/tarefas", status_code=202)
+async def submeter_relatorio(relatorio_data: RelatorioRequest, session_data: dict = Depends(obter_admin)):
+    """Enfileira o relatório de POST /api/relatorios/gerar e responde na hora.
+
+    Acompanhe por ``status_url`` e baixe em ``resultado_url``. Um pedido
+    igual a outro ainda na fila (ou já pronto) recebe a mesma tarefa.
+    """
+    tipos, inicio, fim = ler_pedido_relatorio(relatorio_data)
+    loja_id = get_loja_id(session_data)
+    
+    try:
+        meta = fila_relatorios.submeter(
+            (loja_id, tuple(tipos), inicio, fim),
+            lambda: montar_relatorio_completo(relatorio_data, tipos, loja_id, inicio, fim, TAREFAS_TIMEOUT),
+            {"tipos": tipos, "data_inicio": relatorio_data.data_inicio, "data_fim": relatorio_data.data_fim}
+        )
+    except tarefas.FilaCheia:
+        raise HTTPException(status_code=503, detail="Muitos relatórios na fila, tente novamente em instantes")
+    
+    return resposta(situacao_tarefa(meta), status_code=202)
+
+
+@app.get("/api/relatorios/tarefas/{tarefa_id}")
+async def status_relatorio(tarefa_id: str, session_data: dict = Depends(obter_admin)):
+    return resposta(situacao_tarefa(tarefa_da_loja(tarefa_id, get_loja_id(session_data))))
+
+
+@app.get("/api/relatorios/tarefas/{tarefa_id}/resultado")
+async def resultado_relatorio(tarefa_id: str, session_data: dict = Depends(obter_admin)):
+    meta = tarefa_da_loja(tarefa_id, get_loja_id(session_data))
+    if meta["estado"] == tarefas.ERRO:
+        raise HTTPException(status_code=500, detail=meta["erro"] or "Erro ao gerar relatório")
+    if meta["estado"] != tarefas.CONCLUIDA:
+        raise HTTPException(status_code=409, detail=f"Relatório ainda não está pronto ({meta['estado']})")
+    
+    caminho = fila_relatorios.caminho_resultado(tarefa_id)
+    if not os.path.exists(caminho):
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada ou expirada")
+    return FileResponse(caminho, media_type="application/json", filename=f"relatorio-{tarefa_id}.json")
         
         
 # =============================================
@@ -2027,18 +2728,20 @@ async def listar_clientes(
     pagina: Optional[int] = Query(1, ge=1),
     limite: int = Query(10, ge=1, le=100),
     pesquisa: Optional[str] = Query(None),
-    session_data: dict = Depends(obter_todos_usuarios)
+    apos: Optional[str] = Query(None, alias="cursor"),
+    com_total: bool = Query(False),
+    ctx: contexto.Contexto = Depends(contexto_requisicao)
 ):
-    conn = None
-    cursor = None
+    """Lista clientes; com ``cursor`` pagina por ``(nome, id)`` em vez de OFFSET."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = ctx.cursor()
         
-        loja_id = get_loja_id(session_data)
+        loja_id = ctx.loja_id
+        por_cursor = apos is not None
+        total = None
         
         # Construir query base
-        query = "SELECT * FROM clientes WHERE loja_id = %s"
+        query = f"SELECT {repositorios.COLUNAS_CLIENTE} FROM clientes WHERE loja_id = %s"
         params = [loja_id]
         
         # Adicionar filtro de pesquisa se fornecido
@@ -2047,348 +2750,181 @@ async def listar_clientes(
             search_term = f"%{pesquisa}%"
             params.extend([search_term, search_term, search_term])
         
-        # Contar total
-        count_query = f"SELECT COUNT(*) as total FROM ({query}) as subquery"
-        cursor.execute(count_query, params)
-        total = cursor.fetchone()['total']
+        # Contar total (no modo cursor, só se pedido)
+        if com_total or not por_cursor:
+            count_query = f"SELECT COUNT(*) as total FROM ({query}) as subquery"
+            await cursor.execute(count_query, params)
+            total = (await cursor.fetchone())['total']
         
         # Adicionar paginação e ordenação
-        offset = (pagina - 1) * limite
-        query += " ORDER BY nome LIMIT %s OFFSET %s"
-        params.extend([limite, offset])
-        
-        cursor.execute(query, params)
-        clientes = cursor.fetchall()
-        
-        # Serializar datas
-        for cliente in clientes:
-            if cliente['data_cadastro']:
-                cliente['data_cadastro'] = cliente['data_cadastro'].isoformat()
-            if cliente['data_atualizacao']:
-                cliente['data_atualizacao'] = cliente['data_atualizacao'].isoformat()
-        
-        return {
-            "clientes": clientes,
+        if apos:
+            condicao, valores = paginacao.condicao(("nome", "id"), apos)
+            query += f" AND {condicao}"
+            params.extend(valores)
+        query += " ORDER BY nome, id LIMIT %s"
+        params.append(limite + 1)
+        if not por_cursor:
+            query += " OFFSET %s"
+            params.append((pagina - 1) * limite)
+        
+        await cursor.execute(query, params)
+        clientes, proximo = paginacao.fatiar(await cursor.fetchall(), limite, ("nome", "id"))
+        
+        return resposta({
+            "clientes": com_booleanos(clientes),
             "total": total,
-            "pagina": pagina,
-            "total_paginas": (total + limite - 1) // limite,
-            "limite": limite
-        }
+            "pagina": None if por_cursor else pagina,
+            "total_paginas": (total + limite - 1) // limite if total is not None else None,
+            "limite": limite,
+            "next_cursor": proximo
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ Erro ao listar clientes: {str(e)}")
+        logger.error(f"❌ Erro ao listar clientes: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao listar clientes: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 @app.get("/api/clientes/{cliente_id}")
-async def obter_cliente(cliente_id: int, session_data: dict = Depends(obter_todos_usuarios)):
-    conn = None
-    cursor = None
+async def obter_cliente(cliente_id: int, ctx: contexto.Contexto = Depends(contexto_requisicao)):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        loja_id = ctx.loja_id
         
-        loja_id = get_loja_id(session_data)
-        
-        cursor.execute(
-            "SELECT * FROM clientes WHERE id = %s AND loja_id = %s",
-            (cliente_id, loja_id)
-        )
-        
-        cliente = cursor.fetchone()
+        cliente = await repositorios.ClienteRepo(ctx).buscar(loja_id, cliente_id)
         
         if not cliente:
             raise HTTPException(status_code=404, detail="Cliente não encontrado")
         
-        # Serializar datas
-        if cliente['data_cadastro']:
-            cliente['data_cadastro'] = cliente['data_cadastro'].isoformat()
-        if cliente['data_atualizacao']:
-            cliente['data_atualizacao'] = cliente['data_atualizacao'].isoformat()
-        
-        return cliente
+        return resposta(com_booleanos(cliente))
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Erro ao obter cliente: {str(e)}")
+        logger.error(f"❌ Erro ao obter cliente: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao obter cliente: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 @app.post("/api/clientes", response_model=ClienteResponse)
-async def criar_cliente(cliente_data: ClienteCreate, session_data: dict = Depends(obter_vendedor)):
-    conn = None
-    cursor = None
+async def criar_cliente(cliente_data: ClienteCreate, ctx: contexto.Contexto = Depends(contexto_vendedor)):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        clientes = repositorios.ClienteRepo(ctx)
         
-        loja_id = get_loja_id(session_data)
+        loja_id = ctx.loja_id
         
         # Verificar se CPF já existe
-        if cliente_data.cpf:
-            cursor.execute(
-                "SELECT id FROM clientes WHERE cpf = %s AND loja_id = %s",
-                (cliente_data.cpf, loja_id)
-            )
-            if cursor.fetchone():
-                raise HTTPException(status_code=400, detail="Já existe cliente com este CPF")
+        if cliente_data.cpf and await clientes.cpf_em_uso(loja_id, cliente_data.cpf):
+            raise HTTPException(status_code=400, detail="Já existe cliente com este CPF")
         
         # Inserir cliente
-        cursor.execute("""
-            INSERT INTO clientes (
-                loja_id, nome, email, telefone, cpf, endereco, cidade, estado, observacoes, ativo
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            loja_id, cliente_data.nome, cliente_data.email, cliente_data.telefone,
-            cliente_data.cpf, cliente_data.endereco, cliente_data.cidade,
-            cliente_data.estado, cliente_data.observacoes, cliente_data.ativo
-        ))
-        
-        cliente_id = cursor.lastrowid
-        conn.commit()
+        cliente_id = await clientes.inserir(loja_id, cliente_data)
+        await ctx.commit()
+        invalidar_caches(loja_id)
         
         # Buscar cliente criado
-        cursor.execute("SELECT * FROM clientes WHERE id = %s", (cliente_id,))
-        cliente = cursor.fetchone()
-        
-        if cliente and cliente['data_cadastro']:
-            cliente['data_cadastro'] = cliente['data_cadastro'].isoformat()
-        if cliente and cliente['data_atualizacao']:
-            cliente['data_atualizacao'] = cliente['data_atualizacao'].isoformat()
+        cliente = await clientes.buscar(loja_id, cliente_id)
         
         return cliente
         
     except HTTPException:
         raise
     except Exception as e:
-        if conn: conn.rollback()
-        print(f"❌ Erro ao criar cliente: {str(e)}")
+        logger.error(f"❌ Erro ao criar cliente: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao criar cliente: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 @app.put("/api/clientes/{cliente_id}")
-async def atualizar_cliente(cliente_id: int, cliente_data: ClienteUpdate, session_data: dict = Depends(obter_vendedor)):
-    conn = None
-    cursor = None
+async def atualizar_cliente(cliente_id: int, cliente_data: ClienteUpdate, ctx: contexto.Contexto = Depends(contexto_vendedor)):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        clientes = repositorios.ClienteRepo(ctx)
         
-        loja_id = get_loja_id(session_data)
+        loja_id = ctx.loja_id
         
         # Verificar se cliente existe
-        cursor.execute(
-            "SELECT id FROM clientes WHERE id = %s AND loja_id = %s",
-            (cliente_id, loja_id)
-        )
-        if not cursor.fetchone():
+        if not await clientes.buscar(loja_id, cliente_id):
             raise HTTPException(status_code=404, detail="Cliente não encontrado")
         
         # Verificar se CPF já existe em outro cliente
-        if cliente_data.cpf:
-            cursor.execute(
-                "SELECT id FROM clientes WHERE cpf = %s AND loja_id = %s AND id != %s",
-                (cliente_data.cpf, loja_id, cliente_id)
-            )
-            if cursor.fetchone():
-                raise HTTPException(status_code=400, detail="CPF já está em uso por outro cliente")
+        if cliente_data.cpf and await clientes.cpf_em_uso(loja_id, cliente_data.cpf, cliente_id):
+            raise HTTPException(status_code=400, detail="CPF já está em uso por outro cliente")
         
-        # Construir query de atualização
-        update_fields = []
-        update_values = []
-        
-        if cliente_data.nome is not None:
-            update_fields.append("nome = %s")
-            update_values.append(cliente_data.nome)
-        
-        if cliente_data.email is not None:
-            update_fields.append("email = %s")
-            update_values.append(cliente_data.email)
-        
-        if cliente_data.telefone is not None:
-            update_fields.append("telefone = %s")
-            update_values.append(cliente_data.telefone)
-        
-        if cliente_data.cpf is not None:
-            update_fields.append("cpf = %s")
-            update_values.append(cliente_data.cpf)
-        
-        if cliente_data.endereco is not None:
-            update_fields.append("endereco = %s")
-            update_values.append(cliente_data.endereco)
-        
-        if cliente_data.cidade is not None:
-            update_fields.append("cidade = %s")
-            update_values.append(cliente_data.cidade)
-        
-        if cliente_data.estado is not None:
-            update_fields.append("estado = %s")
-            update_values.append(cliente_data.estado)
-        
-        if cliente_data.observacoes is not None:
-            update_fields.append("observacoes = %s")
-            update_values.append(cliente_data.observacoes)
-        
-        if cliente_data.ativo is not None:
-            update_fields.append("ativo = %s")
-            update_values.append(cliente_data.ativo)
-        
-        if not update_fields:
+        # Só os campos informados
+        campos = repositorios.campos_informados(cliente_data, repositorios.CAMPOS_CLIENTE)
+        if not campos:
             raise HTTPException(status_code=400, detail="Nenhum campo fornecido para atualização")
         
-        update_fields.append("data_atualizacao = CURRENT_TIMESTAMP")
-        update_values.extend([cliente_id, loja_id])
-        
-        query = f"UPDATE clientes SET {', '.join(update_fields)} WHERE id = %s AND loja_id = %s"
-        cursor.execute(query, update_values)
+        await clientes.atualizar(loja_id, cliente_id, campos)
         
-        conn.commit()
+        await ctx.commit()
+        invalidar_caches(loja_id)
         
         # Buscar cliente atualizado
-        cursor.execute("SELECT * FROM clientes WHERE id = %s AND loja_id = %s", (cliente_id, loja_id))
-        cliente = cursor.fetchone()
+        cliente = await clientes.buscar(loja_id, cliente_id)
         
-        if cliente and cliente['data_cadastro']:
-            cliente['data_cadastro'] = cliente['data_cadastro'].isoformat()
-        if cliente and cliente['data_atualizacao']:
-            cliente['data_atualizacao'] = cliente['data_atualizacao'].isoformat()
-        
-        return cliente
+        return resposta(com_booleanos(cliente))
         
     except HTTPException:
         raise
     except Exception as e:
-        if conn: conn.rollback()
-        print(f"❌ Erro ao atualizar cliente: {str(e)}")
+        logger.error(f"❌ Erro ao atualizar cliente: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao atualizar cliente: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 @app.delete("/api/clientes/{cliente_id}")
-async def excluir_cliente(cliente_id: int, session_data: dict = Depends(obter_vendedor)):
-    conn = None
-    cursor = None
+async def excluir_cliente(cliente_id: int, ctx: contexto.Contexto = Depends(contexto_vendedor)):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        clientes = repositorios.ClienteRepo(ctx)
         
-        loja_id = get_loja_id(session_data)
+        loja_id = ctx.loja_id
         
         # Verificar se cliente existe
-        cursor.execute(
-            "SELECT id, nome FROM clientes WHERE id = %s AND loja_id = %s",
-            (cliente_id, loja_id)
-        )
-        cliente = cursor.fetchone()
+        cliente = await clientes.buscar(loja_id, cliente_id)
         
         if not cliente:
             raise HTTPException(status_code=404, detail="Cliente não encontrado")
         
         # Verificar se cliente tem vendas associadas
-        cursor.execute(
-            "SELECT id FROM vendas WHERE cliente_id = %s AND loja_id = %s LIMIT 1",
-            (cliente_id, loja_id)
-        )
-        
-        if cursor.fetchone():
+        if await clientes.tem_vendas(loja_id, cliente_id):
             # Marcar como inativo em vez de excluir
-            cursor.execute(
-                "UPDATE clientes SET ativo = 0, data_atualizacao = CURRENT_TIMESTAMP WHERE id = %s AND loja_id = %s",
-                (cliente_id, loja_id)
-            )
+            await clientes.desativar(loja_id, cliente_id)
             mensagem = f"Cliente '{cliente['nome']}' marcado como inativo (possui vendas associadas)"
         else:
             # Excluir cliente
-            cursor.execute(
-                "DELETE FROM clientes WHERE id = %s AND loja_id = %s",
-                (cliente_id, loja_id)
-            )
+            await clientes.excluir(loja_id, cliente_id)
             mensagem = f"Cliente '{cliente['nome']}' excluído com sucesso"
         
-        conn.commit()
+        await ctx.commit()
+        invalidar_caches(loja_id)
         
         return {"success": True, "message": mensagem}
         
     except HTTPException:
         raise
     except Exception as e:
-        if conn: conn.rollback()
-        print(f"❌ Erro ao excluir cliente: {str(e)}")
+        logger.error(f"❌ Erro ao excluir cliente: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao excluir cliente: {str(e)}")
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
-        
-        
+
 # =============================================
 # ENDPOINT PARA DETALHES DA VENDA POR ID - CORRIGIDO
 # =============================================
 
 @app.get("/api/vendas/{venda_id}")
-async def obter_venda_por_id(venda_id: int, session_data: dict = Depends(obter_vendedor)):
-    conn = None
-    cursor = None
+async def obter_venda_por_id(venda_id: int, ctx: contexto.Contexto = Depends(contexto_vendedor)):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        vendas = repositorios.VendaRepo(ctx)
         
-        loja_id = get_loja_id(session_data)
-        
-        print(f"🔍 Buscando venda ID: {venda_id} para loja: {loja_id}")
+        loja_id = ctx.loja_id
         
-        # ✅ BUSCAR VENDA PRINCIPAL - QUERY CORRIGIDA COM STATUS
-        cursor.execute("""
-            SELECT 
-                v.id,
-                v.numero_venda,
-                v.cliente,
-                v.total_venda,
-                v.forma_pagamento,
-                v.observacoes,
-                v.data_venda,
-                v.usuario_id,
-                v.loja_id,
-                COALESCE(v.status, 'concluida') as status,  -- ✅ CORREÇÃO: Status padrão
-                u.nome as usuario_nome
-            FROM vendas v
-            LEFT JOIN usuarios u ON v.usuario_id = u.id
-            WHERE v.id = %s AND v.loja_id = %s
-        """, (venda_id, loja_id))
+        logger.debug(f"🔍 Buscando venda ID: {venda_id} para loja: {loja_id}")
         
-        venda = cursor.fetchone()
+        # ✅ BUSCAR VENDA PRINCIPAL (status nulo sai como 'concluida')
+        venda = await vendas.buscar(loja_id, venda_id)
         
         if not venda:
             raise HTTPException(status_code=404, detail=f"Venda #{venda_id} não encontrada")
         
-        print(f"✅ Venda encontrada: {venda['numero_venda']} - Cliente: {venda['cliente']} - Status: {venda['status']}")
+        logger.debug(f"✅ Venda encontrada: {venda['numero_venda']} - Cliente: {venda['cliente']} - Status: {venda['status']}")
         
         # ✅ BUSCAR ITENS DA VENDA
-        cursor.execute("""
-            SELECT 
-                iv.id,
-                iv.produto_nome as produto,
-                iv.quantidade,
-                iv.valor_unitario as preco_unitario,
-                iv.total_item as preco_total,
-                p.codigo_barras,
-                p.categoria
-            FROM itens_venda iv
-            LEFT JOIN produtos p ON iv.produto_id = p.id
-            WHERE iv.venda_id = %s
-            ORDER BY iv.id
-        """, (venda_id,))
-        
-        itens = cursor.fetchall()
-        
-        print(f"✅ {len(itens)} itens encontrados para a venda")
+        itens = await vendas.itens(venda_id)
+        
+        logger.debug(f"✅ {len(itens)} itens encontrados para a venda")
         
         # ✅ FORMATAR OS DADOS DE FORMA SEGURA
         venda_completa = {
@@ -2398,7 +2934,7 @@ async def obter_venda_por_id(venda_id: int, session_data: dict = Depends(obter_v
             "total_venda": float(venda['total_venda']) if venda['total_venda'] else 0.0,
             "forma_pagamento": venda['forma_pagamento'],
             "observacoes": venda['observacoes'],
-            "data_venda": venda['data_venda'].isoformat() if venda['data_venda'] else None,
+            "data_venda": venda['data_venda'],
             "usuario_id": venda['usuario_id'],
             "loja_id": venda['loja_id'],
             "status": venda['status'],  # ✅ STATUS INCLUÍDO
@@ -2425,145 +2961,88 @@ async def obter_venda_por_id(venda_id: int, session_data: dict = Depends(obter_v
                 
             venda_completa['itens'].append(item_formatado)
         
-        print(f"🎯 Venda processada com sucesso: {venda_completa['numero_venda']}")
+        logger.debug(f"🎯 Venda processada com sucesso: {venda_completa['numero_venda']}")
         
-        return {
+        return resposta({
             "success": True,
             "venda": venda_completa
-        }
+        })
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Erro ao buscar venda {venda_id}: {str(e)}")
-        import traceback
-        print(f"🔍 Traceback completo: {traceback.format_exc()}")
+        logger.error(f"❌ Erro ao buscar venda {venda_id}: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro interno ao buscar venda: {str(e)}")
-    finally:
-        if cursor: 
-            cursor.close()
-        if conn: 
-            conn.close()
-            
-            
+
 # =============================================
 # ENDPOINTS PARA EDIÇÃO DE VENDAS
 # =============================================
 
 @app.put("/api/vendas/{venda_id}")
-async def atualizar_venda(venda_id: int, venda_data: VendaData, session_data: dict = Depends(obter_vendedor)):
+async def atualizar_venda(venda_id: int, venda_data: VendaData, ctx: contexto.Contexto = Depends(contexto_vendedor)):
     """
     Atualizar uma venda existente - VERSÃO CORRIGIDA
     """
-    conn = None
-    cursor = None
+    # Validar dados
+    if not venda_data.itens or len(venda_data.itens) == 0:
+        raise HTTPException(status_code=400, detail="A venda deve ter pelo menos um item")
+    
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        loja_id = get_loja_id(session_data)
-        
-        # Verificar se a venda existe e pertence à loja
-        cursor.execute(
-            "SELECT id, status FROM vendas WHERE id = %s AND loja_id = %s",
-            (venda_id, loja_id)
-        )
-        venda_existente = cursor.fetchone()
-        
-        if not venda_existente:
-            raise HTTPException(status_code=404, detail="Venda não encontrada")
-        
-        if venda_existente['status'] == 'cancelada':
-            raise HTTPException(status_code=400, detail="Não é possível editar uma venda cancelada")
-        
-        # Validar dados
-        if not venda_data.itens or len(venda_data.itens) == 0:
-            raise HTTPException(status_code=400, detail="A venda deve ter pelo menos um item")
-        
-        # ✅ CORREÇÃO: Verificar se há transação ativa antes de iniciar
-        if conn.in_transaction:
-            conn.rollback()
-        
-        # Iniciar transação
-        conn.start_transaction()
+        cursor = ctx.cursor()
+        vendas = repositorios.VendaRepo(ctx)
         
-        print(f"🔄 Iniciando atualização da venda #{venda_id}")
+        loja_id = ctx.loja_id
         
-        # 1. Restaurar estoque dos itens antigos
-        cursor.execute("""
-            SELECT produto_id, quantidade 
-            FROM itens_venda 
-            WHERE venda_id = %s
-        """, (venda_id,))
-        
-        itens_antigos = cursor.fetchall()
-        print(f"📦 Restaurando estoque de {len(itens_antigos)} itens antigos")
-        
-        for item_antigo in itens_antigos:
-            if item_antigo['produto_id']:
-                cursor.execute("""
-                    UPDATE produtos 
-                    SET estoque_atual = estoque_atual + %s 
-                    WHERE id = %s AND loja_id = %s
-                """, (item_antigo['quantidade'], item_antigo['produto_id'], loja_id))
-                print(f"✅ Estoque restaurado: Produto {item_antigo['produto_id']} +{item_antigo['quantidade']}")
-        
-        # 2. Remover itens antigos
-        cursor.execute("DELETE FROM itens_venda WHERE venda_id = %s", (venda_id,))
-        print("🗑️ Itens antigos removidos")
-        
-        # 3. Processar novos itens e atualizar estoque
-        for index, item in enumerate(venda_data.itens):
-            print(f"🔍 Processando item {index + 1}: {item.produto}")
+        async def atualizar():
+            # Travar a venda: edição e cancelamento simultâneos não repõem estoque duas vezes
+            venda_existente = await vendas.travar(loja_id, venda_id)
             
-            # Buscar produto por nome
-            cursor.execute(
-                "SELECT id, nome, estoque_atual, preco_venda FROM produtos WHERE nome = %s AND loja_id = %s AND ativo = 1",
-                (item.produto, loja_id)
-            )
-            produto = cursor.fetchone()
+            if not venda_existente:
+                raise HTTPException(status_code=404, detail="Venda não encontrada")
             
-            if not produto:
-                raise HTTPException(status_code=404, detail=f"Produto '{item.produto}' não encontrado")
+            if venda_existente['status'] == 'cancelada':
+                raise HTTPException(status_code=400, detail="Não é possível editar uma venda cancelada")
             
-            # Verificar estoque
-            if produto['estoque_atual'] < item.quantidade:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Estoque insuficiente para '{produto['nome']}'. Disponível: {produto['estoque_atual']}, Solicitado: {item.quantidade}"
-                )
+            logger.debug(f"🔄 Iniciando atualização da venda #{venda_id}")
             
-            # Atualizar estoque
-            cursor.execute(
-                "UPDATE produtos SET estoque_atual = estoque_atual - %s WHERE id = %s",
-                (item.quantidade, produto['id'])
+            # 1. Restaurar estoque dos itens antigos
+            itens_antigos = await vendas.itens_para_estorno(venda_id)
+            logger.debug(f"📦 Restaurando estoque de {len(itens_antigos)} itens antigos")
+            await repor_estoque(cursor, loja_id, itens_antigos)
+            await agregados.somar_venda(
+                cursor, loja_id, venda_existente['data_venda'], venda_existente['forma_pagamento'],
+                venda_existente['total_venda'], sum(item['quantidade'] for item in itens_antigos), sinal=-1
+            )
+            await agregados.somar_itens(
+                cursor, loja_id, venda_existente['data_venda'],
+                [(item['produto_id'], item['quantidade'], item['total_item']) for item in itens_antigos], sinal=-1
             )
-            print(f"📦 Estoque atualizado: {produto['nome']} -{item.quantidade}")
             
-            # Inserir novo item
-            cursor.execute("""
-                INSERT INTO itens_venda (venda_id, produto_id, produto_nome, quantidade, valor_unitario, total_item)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (venda_id, produto['id'], produto['nome'], item.quantidade, item.preco_Unitario, item.preco_Total))
-            print(f"✅ Item inserido: {produto['nome']} x {item.quantidade}")
-        
-        # 4. Atualizar venda principal
-        cursor.execute("""
-            UPDATE vendas 
-            SET cliente = %s, total_venda = %s, forma_pagamento = %s, observacoes = %s,
-                data_venda = %s, usuario_id = %s, status = 'concluida'
-            WHERE id = %s AND loja_id = %s
-        """, (
-            venda_data.cliente, venda_data.total_venda, venda_data.forma_pagamento,
-            venda_data.observacoes, venda_data.data_venda, venda_data.usuario_id,
-            venda_id, loja_id
-        ))
-        print(f"✅ Venda #{venda_id} atualizada")
+            # 2. Remover itens antigos
+            await vendas.remover_itens(venda_id)
+            logger.debug("🗑️ Itens antigos removidos")
+            
+            # 3. Travar os produtos dos novos itens, baixar estoque e inserir em lote
+            linhas = await resolver_itens_venda(cursor, loja_id, venda_data.itens)
+            await baixar_estoque(cursor, loja_id, linhas)
+            await inserir_itens_venda(cursor, venda_id, linhas)
+            await agregados.somar_venda(
+                cursor, loja_id, venda_data.data_venda, venda_data.forma_pagamento,
+                venda_data.total_venda, sum(linha['quantidade_vendida'] for linha in linhas)
+            )
+            await agregados.somar_itens(cursor, loja_id, venda_data.data_venda, itens_agregado(linhas))
+            variacoes = variacoes_estoque(itens_antigos, 'quantidade', 1)
+            variacoes = variacoes_estoque(linhas, 'quantidade_vendida', -1, variacoes)
+            
+            # 4. Atualizar venda principal
+            await vendas.atualizar(loja_id, venda_id, venda_data)
+            return variacoes, await incrementar_versao_catalogo(cursor, loja_id)
         
-        # Commit da transação
-        conn.commit()
-        print("💾 Transação commitada com sucesso")
+        variacoes, versao_catalogo = await transacao_com_retentativa(ctx, atualizar)
+        invalidar_caches(loja_id)
+        catalogo_produtos.ajustar_estoque(loja_id, variacoes, versao_catalogo)
+        logger.info(f"✅ Venda #{venda_id} atualizada")
         
         return {
             "success": True,
@@ -2572,89 +3051,56 @@ async def atualizar_venda(venda_id: int, venda_data: VendaData, session_data: di
         }
         
     except HTTPException:
-        if conn and conn.in_transaction:
-            conn.rollback()
-            print("❌ Transação revertida devido a erro HTTP")
         raise
     except Exception as e:
-        if conn and conn.in_transaction:
-            conn.rollback()
-            print("❌ Transação revertida devido a erro interno")
-        print(f"❌ Erro ao atualizar venda: {str(e)}")
+        logger.error(f"❌ Erro ao atualizar venda: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao atualizar venda: {str(e)}")
-    finally:
-        if cursor: 
-            cursor.close()
-        if conn: 
-            conn.close()
-            print("🔗 Conexão fechada")
 
 @app.put("/api/vendas/{venda_id}/cancelar")
-async def cancelar_venda(venda_id: int, session_data: dict = Depends(obter_vendedor)):
+async def cancelar_venda(venda_id: int, ctx: contexto.Contexto = Depends(contexto_vendedor)):
     """
     Cancelar uma venda (restaura estoque) - VERSÃO CORRIGIDA
     """
-    conn = None
-    cursor = None
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        loja_id = get_loja_id(session_data)
-        
-        # Verificar se a venda existe
-        cursor.execute(
-            "SELECT id, status, numero_venda FROM vendas WHERE id = %s AND loja_id = %s",
-            (venda_id, loja_id)
-        )
-        venda = cursor.fetchone()
-        
-        if not venda:
-            raise HTTPException(status_code=404, detail="Venda não encontrada")
-        
-        if venda['status'] == 'cancelada':
-            raise HTTPException(status_code=400, detail="Venda já está cancelada")
-        
-        # ✅ CORREÇÃO: Verificar se há transação ativa antes de iniciar
-        if conn.in_transaction:
-            conn.rollback()
-        
-        # Iniciar transação
-        conn.start_transaction()
-        
-        print(f"🔄 Iniciando cancelamento da venda #{venda_id}")
-        
-        # 1. Restaurar estoque dos itens
-        cursor.execute("""
-            SELECT iv.produto_id, iv.quantidade, p.nome
-            FROM itens_venda iv
-            LEFT JOIN produtos p ON iv.produto_id = p.id
-            WHERE iv.venda_id = %s
-        """, (venda_id,))
+        cursor = ctx.cursor()
+        vendas = repositorios.VendaRepo(ctx)
         
-        itens = cursor.fetchall()
-        print(f"📦 Restaurando estoque de {len(itens)} itens")
+        loja_id = ctx.loja_id
         
-        for item in itens:
-            if item['produto_id']:
-                cursor.execute("""
-                    UPDATE produtos 
-                    SET estoque_atual = estoque_atual + %s 
-                    WHERE id = %s AND loja_id = %s
-                """, (item['quantidade'], item['produto_id'], loja_id))
-                print(f"✅ Estoque restaurado: {item['nome']} +{item['quantidade']}")
-        
-        # 2. Marcar venda como cancelada
-        cursor.execute(
-            "UPDATE vendas SET status = 'cancelada' WHERE id = %s AND loja_id = %s",
-            (venda_id, loja_id)
-        )
-        print(f"✅ Venda #{venda_id} marcada como cancelada")
+        async def cancelar():
+            # Travar a venda: dois cancelamentos simultâneos não repõem estoque duas vezes
+            venda = await vendas.travar(loja_id, venda_id)
+            
+            if not venda:
+                raise HTTPException(status_code=404, detail="Venda não encontrada")
+            
+            if venda['status'] == 'cancelada':
+                raise HTTPException(status_code=400, detail="Venda já está cancelada")
+            
+            logger.debug(f"🔄 Iniciando cancelamento da venda #{venda_id}")
+            
+            # 1. Restaurar estoque dos itens
+            itens = await vendas.itens_para_estorno(venda_id)
+            logger.debug(f"📦 Restaurando estoque de {len(itens)} itens")
+            await repor_estoque(cursor, loja_id, itens)
+            await agregados.somar_venda(
+                cursor, loja_id, venda['data_venda'], venda['forma_pagamento'],
+                venda['total_venda'], sum(item['quantidade'] for item in itens), sinal=-1
+            )
+            await agregados.somar_itens(
+                cursor, loja_id, venda['data_venda'],
+                [(item['produto_id'], item['quantidade'], item['total_item']) for item in itens], sinal=-1
+            )
+            
+            # 2. Marcar venda como cancelada
+            await vendas.cancelar(loja_id, venda_id)
+            return variacoes_estoque(itens, 'quantidade', 1), await incrementar_versao_catalogo(cursor, loja_id)
         
-        # Commit da transação
-        conn.commit()
-        print("💾 Transação de cancelamento commitada")
+        variacoes, versao_catalogo = await transacao_com_retentativa(ctx, cancelar)
+        invalidar_caches(loja_id)
+        catalogo_produtos.ajustar_estoque(loja_id, variacoes, versao_catalogo)
+        logger.info(f"✅ Venda #{venda_id} marcada como cancelada")
         
         return {
             "success": True,
@@ -2662,27 +3108,21 @@ async def cancelar_venda(venda_id: int, session_data: dict = Depends(obter_vende
         }
         
     except HTTPException:
-        if conn and conn.in_transaction:
-            conn.rollback()
-            print("❌ Transação de cancelamento revertida devido a erro HTTP")
         raise
     except Exception as e:
-        if conn and conn.in_transaction:
-            conn.rollback()
-            print("❌ Transação de cancelamento revertida devido a erro interno")
-        print(f"❌ Erro ao cancelar venda: {str(e)}")
+        logger.error(f"❌ Erro ao cancelar venda: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao cancelar venda: {str(e)}")
-    finally:
-        if cursor: 
-            cursor.close()
-        if conn: 
-            conn.close()
-            print("🔗 Conexão de cancelamento fechada")
-            
 
 if __name__ == "__main__":
     import uvicorn
-    print("🚀 Servidor WebOS Dashboard iniciando na porta 8001...")
-    print("📊 Módulos ativos: Dashboard, Estoque, Vendas, Caixa, Usuários, Relatórios")
-    print("📈 Acesse http://localhost:8001/docs para a documentação da API")
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    logger.info("🚀 Servidor WebOS Dashboard iniciando na porta 8001...")
+    logger.info("📊 Módulos ativos: Dashboard, Estoque, Vendas, Caixa, Usuários, Relatórios")
+    logger.info("📈 Acesse http://localhost:8001/docs para a documentação da API")
+    workers = int(os.getenv("WEBOS_WORKERS", "1"))
+    if workers > 1 and SESSION_MODE == "token" and not SESSION_SECRET:
+        logger.warning("⚠️ Com mais de um worker defina WEBOS_SESSION_SECRET; forçando 1 worker")
+        workers = 1
+    elif workers > 1 and SESSION_MODE == "store" and SESSION_BACKEND == "memory":
+        logger.warning("⚠️ Com mais de um worker use WEBOS_SESSION_BACKEND=sqlite ou redis (ou WEBOS_SESSION_MODE=token); forçando 1 worker")
+        workers = 1
+    uvicorn.run("backend:app", host="0.0.0.0", port=8001, workers=workers)
\ No newline at end of file
@@ -0,0 +1,250 @@
+"""Banco embutido em SQLite (``WEBOS_DB_ENGINE=sqlite``).
+
+Para a loja de um caixa só, num PC simples: o banco é um arquivo e não há
+servidor para instalar nem subir. ``abrir`` devolve uma conexão com a
+mesma interface usada do ``mysql.connector`` (cursores ``dictionary``,
+``commit``, ``rollback``, ``in_transaction``, ``is_connected``), então o
+pool, os repositórios e as rotas funcionam sem mudança.
+
+Cada conexão liga o WAL (leituras não esperam a escrita e o commit só
+anexa ao log), ``synchronous=NORMAL`` (seguro com WAL), leitura por mmap
+e um cache de páginas maior, para as consultas saírem da memória.
+
+As rotas escrevem SQL do MySQL; ``traduzir`` converte o pouco que muda
+(marcadores ``%s``, ``FOR UPDATE``, ``INSERT IGNORE``, ``ON DUPLICATE KEY
+UPDATE``, ``CURRENT_TIMESTAMP``, divisão) e guarda o resultado por comando. O que
+não tem tradução direta (``LAST_INSERT_ID``, trava das migrações) é
+escrito por dialeto onde é usado, conferindo ``DIALETO``.
+
+As migrações também são escritas uma vez só, para o MySQL:
+``traduzir_ddl`` converte ``CREATE TABLE`` e ``CREATE INDEX`` para o
+SQLite.
+
+Escritas e ``SELECT ... FOR UPDATE`` abrem a transação com ``BEGIN
+IMMEDIATE``: a trava de escrita do arquivo faz o papel das travas de linha
+do InnoDB, e vendas simultâneas continuam uma depois da outra. Quem não
+consegue a trava dentro de ``espera_segundos`` recebe "database is
+locked", que ``database.erro_retentavel`` trata como conflito repetível.
+"""
+import functools
+import re
+import sqlite3
+from datetime import date, datetime
+from decimal import Decimal
+
+DIALETO = "sqlite"
+
+# ON CONFLICT sem alvo e RETURNING
+VERSAO_MINIMA = (3, 35, 0)
+
+_FOR_UPDATE = re.compile(r"\s+FOR\s+UPDATE\b", re.IGNORECASE)
+_INSERT_IGNORE = re.compile(r"\bINSERT\s+IGNORE\b", re.IGNORECASE)
+_DUPLICADA = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.IGNORECASE)
+_VALUES_COLUNA = re.compile(r"\bVALUES\s*\(\s*(\w+)\s*\)", re.IGNORECASE)
+_CURRENT_TIMESTAMP = re.compile(r"\bCURRENT_TIMESTAMP\b", re.IGNORECASE)
+# ``a / b`` entre espaços: no SQLite inteiro / inteiro trunca, no MySQL não
+_DIVISAO = re.compile(r"(?<=\s)/(?=\s)")
+_ESCRITA = re.compile(r"^\s*(INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+
+_CRIAR_TABELA = re.compile(r"^\s*CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", re.IGNORECASE)
+_CRIAR_INDICE = re.compile(r"^\s*CREATE\s+(UNIQUE\s+)?INDEX\s+(?!IF\s)", re.IGNORECASE)
+_INDICE_NA_TABELA = re.compile(r",\s*(UNIQUE\s+)?(?:KEY|INDEX)\s+(\w+)\s*(\([^)]*\))", re.IGNORECASE)
+_OPCOES_TABELA = re.compile(r"\)[^)]*$")
+_TIPOS_DDL = [
+    (re.compile(r"\bINT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY\b", re.IGNORECASE), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    (re.compile(r"\b(?:TINYINT\(1\)|BIGINT\b|INT\b)(?:\s+UNSIGNED\b)?", re.IGNORECASE), "INTEGER"),
+    (re.compile(r"\bDOUBLE\b", re.IGNORECASE), "REAL"),
+    # Texto sem diferenciar maiúsculas, como a collation padrão do MySQL
+    (re.compile(r"\b((?:VAR)?CHAR\(\d+\)|TEXT)", re.IGNORECASE), r"\1 COLLATE NOCASE"),
+    (re.compile(r"\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP\b", re.IGNORECASE), ""),
+    (re.compile(r"\bDEFAULT\s+CURRENT_TIMESTAMP\b", re.IGNORECASE), "DEFAULT (datetime('now', 'localtime'))"),
+]
+
+
+@functools.lru_cache(maxsize=1024)
+def traduzir(sql: str):
+    """``(sql_sqlite, abre_transacao)`` de um comando escrito para o MySQL."""
+    trava = _FOR_UPDATE.search(sql) is not None
+    sql = _FOR_UPDATE.sub("", sql)
+    sql = _INSERT_IGNORE.sub("INSERT OR IGNORE", sql)
+    duplicada = _DUPLICADA.search(sql)
+    if duplicada:
+        atribuicoes = _VALUES_COLUNA.sub(r"excluded.\1", sql[duplicada.end():])
+        sql = sql[:duplicada.start()] + "ON CONFLICT DO UPDATE SET" + atribuicoes
+    sql = _DIVISAO.sub("* 1.0 /", sql)
+    sql = _CURRENT_TIMESTAMP.sub("NOW()", sql).replace("%s", "?")
+    return sql, trava or _ESCRITA.match(sql) is not None
+
+
+def traduzir_ddl(comando: str) -> list:
+    """Comandos SQLite equivalentes a um comando de migração do MySQL.
+
+    DECIMAL fica como está: no SQLite é afinidade NUMERIC, que guarda
+    valores inteiros exatos (nunca REAL puro). Índices declarados dentro
+    do ``CREATE TABLE`` viram ``CREATE INDEX`` separados. Outros comandos
+    passam sem mudança (o cursor ainda aplica ``traduzir``).
+    """
+    tabela = _CRIAR_TABELA.match(comando)
+    if tabela is None:
+        return [_CRIAR_INDICE.sub(lambda m: f"CREATE {m.group(1) or ''}INDEX IF NOT EXISTS ", comando, count=1)]
+    indices = [
+        f"CREATE {unico or ''}INDEX IF NOT EXISTS {nome} ON {tabela.group(1)} {colunas}"
+        for unico, nome, colunas in _INDICE_NA_TABELA.findall(comando)
+    ]
+    comando = _OPCOES_TABELA.sub(")", _INDICE_NA_TABELA.sub("", comando))
+    for padrao, troca in _TIPOS_DDL:
+        comando = padrao.sub(troca, comando)
+    return [comando] + indices
+
+
+def _agora() -> str:
+    # NOW() do MySQL: hora local, sem fuso
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _valor(valor):
+    if isinstance(valor, datetime):
+        return valor.replace(tzinfo=None).isoformat(sep=" ")
+    if isinstance(valor, date):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    return valor
+
+
+def _parametros(params):
+    return tuple(_valor(valor) for valor in params) if params else ()
+
+
+def _ler_data_hora(valor: bytes):
+    texto = valor.decode()
+    try:
+        return datetime.fromisoformat(texto)
+    except ValueError:
+        return texto
+
+
+def _ler_data(valor: bytes):
+    texto = valor.decode()
+    try:
+        return date.fromisoformat(texto[:10])
+    except ValueError:
+        return texto
+
+
+# Colunas DATETIME/DATE voltam como datetime/date, como no mysql.connector
+sqlite3.register_converter("DATETIME", _ler_data_hora)
+sqlite3.register_converter("DATE", _ler_data)
+
+
+def _linha_dict(cursor, linha):
+    return {coluna[0]: valor for coluna, valor in zip(cursor.description, linha)}
+
+
+class CursorSQLite:
+    def __init__(self, conexao, dictionary: bool):
+        self._conexao = conexao
+        self._cursor = conexao._conn.cursor()
+        if dictionary:
+            self._cursor.row_factory = _linha_dict
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, operation, params=None):
+        sql, transacao = traduzir(operation)
+        if transacao:
+            self._conexao.start_transaction()
+        self._cursor.execute(sql, _parametros(params))
+
+    def executemany(self, operation, seq_params):
+        sql, transacao = traduzir(operation)
+        if transacao:
+            self._conexao.start_transaction()
+        self._cursor.executemany(sql, [_parametros(params) for params in seq_params])
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size: int = 1):
+        return self._cursor.fetchmany(size)
+
+    def close(self):
+        self._cursor.close()
+
+
+class ConexaoSQLite:
+    dialeto = DIALETO
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._conn.in_transaction
+
+    def cursor(self, dictionary: bool = False, buffered: bool = True, prepared: bool = False):
+        """``buffered`` e ``prepared`` só por compatibilidade: o SQLite lê sob
+        demanda e já guarda os comandos compilados (``cached_statements``)."""
+        return CursorSQLite(self, dictionary)
+
+    def interromper(self):
+        """Aborta o comando em andamento (pode ser chamado de outra thread)."""
+        self._conn.interrupt()
+
+    def start_transaction(self):
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def is_connected(self) -> bool:
+        try:
+            self._conn.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def close(self):
+        self._conn.close()
+
+
+def abrir(caminho: str, mmap_mb: int = 256, cache_mb: int = 64, espera_segundos: float = 5.0,
+          comandos_em_cache: int = 256) -> ConexaoSQLite:
+    """Abre uma conexão com o arquivo ``caminho`` (criado se não existir)."""
+    if sqlite3.sqlite_version_info < VERSAO_MINIMA:
+        raise RuntimeError(
+            f"SQLite {sqlite3.sqlite_version} é antigo demais; o WebOS precisa do "
+            f"{'.'.join(map(str, VERSAO_MINIMA))} ou mais novo"
+        )
+    conn = sqlite3.connect(
+        caminho,
+        timeout=espera_segundos,
+        isolation_level=None,
+        check_same_thread=False,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        cached_statements=comandos_em_cache,
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA mmap_size={int(mmap_mb) * 1024 * 1024}")
+    conn.execute(f"PRAGMA cache_size={-int(cache_mb) * 1024}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.create_function("NOW", 0, _agora)
+    return ConexaoSQLite(conn)
@@ -0,0 +1,96 @@
+"""Latência da busca de produtos em memória num catálogo sintético.
+
+Uso:
+
+    python benchmarks/busca_catalogo.py --produtos 50000 --consultas 2000
+
+Gera produtos com nomes, marcas e descrições aleatórios, carrega o
+catálogo de uma loja e mede o tempo de ``Catalogo.buscar`` para consultas
+de digitação (prefixos de 1 a 6 letras, duas palavras, trechos do meio e
+códigos de barras completos). Não usa banco.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalogo import Catalogo  # noqa: E402
+
+TIPOS = ["Sutiã", "Calcinha", "Body", "Camisola", "Pijama", "Cinta", "Top", "Corpete", "Robe", "Meia"]
+ESTILOS = ["Renda", "Algodão", "Microfibra", "Cetim", "Tule", "Básico", "Push-up", "Strappy", "Fio", "Conforto"]
+CORES = ["Preto", "Branco", "Nude", "Vermelho", "Vinho", "Rosé", "Azul", "Verde", "Lilás", "Café"]
+MARCAS = ["Delícia", "Aurora", "Bella", "Encanto", "Lumière", "Valentina"]
+
+
+def gerar(quantidade: int):
+    linhas = []
+    for produto_id in range(1, quantidade + 1):
+        nome = f"{random.choice(TIPOS)} {random.choice(ESTILOS)} {random.choice(CORES)} {produto_id}"
+        linhas.append({
+            "id": produto_id,
+            "loja_id": 1,
+            "codigo_barras": f"789{produto_id:09d}",
+            "nome": nome,
+            "categoria": random.choice(TIPOS),
+            "marca": random.choice(MARCAS),
+            "estoque_atual": random.randint(0, 50),
+            "estoque_minimo": 2,
+            "preco_venda": round(random.uniform(20, 300), 2),
+            "descricao": f"{nome} com acabamento {random.choice(ESTILOS).lower()}",
+        })
+    return linhas
+
+
+def consultas(linhas, quantidade: int):
+    geradas = []
+    for _ in range(quantidade):
+        linha = random.choice(linhas)
+        palavras = linha["nome"].split()
+        tipo = random.random()
+        if tipo < 0.5:
+            geradas.append(palavras[0][:random.randint(1, 6)])
+        elif tipo < 0.75:
+            geradas.append(f"{palavras[0]} {palavras[1][:3]}")
+        elif tipo < 0.9:
+            geradas.append(palavras[1][1:5])
+        else:
+            geradas.append(linha["codigo_barras"])
+    return geradas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--produtos", type=int, default=50000)
+    parser.add_argument("--consultas", type=int, default=2000)
+    parser.add_argument("--limite", type=int, default=10)
+    parser.add_argument("--contar", action="store_true",
+                        help="calcula também o total (como a listagem paginada)")
+    args = parser.parse_args()
+
+    random.seed(42)
+    linhas = gerar(args.produtos)
+    catalogo = Catalogo()
+    inicio = time.perf_counter()
+    catalogo.carregar(1, linhas, 0)
+    print(f"Carga de {args.produtos} produtos: {time.perf_counter() - inicio:.2f}s")
+
+    tempos = []
+    for consulta in consultas(linhas, args.consultas):
+        inicio = time.perf_counter()
+        catalogo.buscar(1, consulta, args.limite, args.contar)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+
+    def percentil(p):
+        return tempos[min(len(tempos) - 1, int(len(tempos) * p))]
+
+    print(f"Buscas: {len(tempos)}  p50 {percentil(0.50):.2f}ms  p95 {percentil(0.95):.2f}ms  "
+          f"p99 {percentil(0.99):.2f}ms  máx {tempos[-1]:.2f}ms  média {statistics.mean(tempos):.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
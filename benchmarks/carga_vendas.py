@@ -0,0 +1,131 @@
+"""Teste de carga do checkout: N vendas paralelas disputando os mesmos produtos.
+
+Uso (com a API rodando e um banco de teste):
+
+    python benchmarks/carga_vendas.py --usuario admin --senha admin \
+        --produtos 1,2,3 --vendas 200 --concorrencia 20
+
+O script lê o estoque inicial dos produtos, dispara as vendas em paralelo
+(cada uma compra ``--quantidade`` unidades de um produto sorteado) e, no
+fim, confere se o estoque final é exatamente o inicial menos o que foi
+vendido com sucesso e se nenhum produto ficou negativo. Sai com código 1
+se encontrar divergência.
+
+Atenção: as vendas são gravadas de verdade; use apenas em banco de teste.
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+def requisicao(url, metodo="GET", corpo=None, token=None):
+    dados = json.dumps(corpo).encode() if corpo is not None else None
+    req = urllib.request.Request(url, data=dados, method=metodo)
+    req.add_header("Content-Type", "application/json")
+    if token:
+        req.add_header("Authorization", f"Bearer {token}")
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            return resp.status, json.loads(resp.read() or b"null")
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"null")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--usuario", required=True)
+    parser.add_argument("--senha", required=True)
+    parser.add_argument("--produtos", required=True, help="IDs separados por vírgula")
+    parser.add_argument("--vendas", type=int, default=100)
+    parser.add_argument("--concorrencia", type=int, default=10)
+    parser.add_argument("--quantidade", type=int, default=1)
+    args = parser.parse_args()
+
+    status, login = requisicao(f"{args.url}/api/login", "POST", {"nome": args.usuario, "password": args.senha})
+    if status != 200:
+        sys.exit(f"Falha no login: {status} {login}")
+    token = login["session_token"]
+
+    produtos = {}
+    for produto_id in (int(p) for p in args.produtos.split(",")):
+        status, produto = requisicao(f"{args.url}/api/produtos/{produto_id}", token=token)
+        if status != 200:
+            sys.exit(f"Produto {produto_id} não encontrado: {status}")
+        produtos[produto_id] = produto
+    estoque_inicial = {pid: float(p["estoque_atual"]) for pid, p in produtos.items()}
+
+    def vender(_):
+        produto_id = random.choice(list(produtos))
+        produto = produtos[produto_id]
+        preco = float(produto["preco_venda"])
+        corpo = {
+            "cliente": "Teste de carga",
+            "itens": [{
+                "produto": produto["nome"],
+                "produto_id": produto_id,
+                "quantidade": args.quantidade,
+                "preco_Unitario": preco,
+                "preco_Total": preco * args.quantidade,
+            }],
+            "total_venda": preco * args.quantidade,
+            "forma_pagamento": "dinheiro",
+            "observacoes": "benchmarks/carga_vendas.py",
+            "data_venda": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "usuario_id": login["user_id"],
+            "loja_id": 1,
+        }
+        inicio = time.perf_counter()
+        status, resposta = requisicao(f"{args.url}/api/vendas", "POST", corpo, token)
+        return produto_id, status, time.perf_counter() - inicio, resposta
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concorrencia) as executor:
+        resultados = list(executor.map(vender, range(args.vendas)))
+    duracao = time.perf_counter() - inicio
+
+    por_status = Counter(status for _, status, _, _ in resultados)
+    vendido = Counter()
+    numeros = Counter()
+    for produto_id, status, _, resposta in resultados:
+        if status == 200:
+            vendido[produto_id] += args.quantidade
+            numeros[resposta["numero_venda"]] += 1
+    latencias = sorted(lat for _, _, lat, _ in resultados)
+
+    def percentil(p):
+        return latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000
+
+    print(f"Vendas: {args.vendas} em {duracao:.2f}s ({args.vendas / duracao:.1f} vendas/s, concorrência {args.concorrencia})")
+    print(f"Status: {dict(por_status)}")
+    print(f"Latência: p50 {percentil(0.50):.1f}ms  p95 {percentil(0.95):.1f}ms  "
+          f"p99 {percentil(0.99):.1f}ms  média {statistics.mean(latencias) * 1000:.1f}ms")
+
+    ok = True
+    duplicados = [numero for numero, qtd in numeros.items() if qtd > 1]
+    if duplicados:
+        ok = False
+        print(f"❌ Números de venda duplicados: {duplicados[:10]}")
+    for produto_id in produtos:
+        _, produto = requisicao(f"{args.url}/api/produtos/{produto_id}", token=token)
+        final = float(produto["estoque_atual"])
+        esperado = estoque_inicial[produto_id] - vendido[produto_id]
+        situacao = "✅" if final == esperado and final >= 0 else "❌"
+        if situacao == "❌":
+            ok = False
+        print(f"{situacao} Produto {produto_id}: inicial {estoque_inicial[produto_id]:g}, "
+              f"vendido {vendido[produto_id]}, final {final:g}, esperado {esperado:g}")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
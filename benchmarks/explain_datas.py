@@ -0,0 +1,86 @@
+"""Compara os planos (EXPLAIN) dos filtros de data antigos e novos.
+
+Uso (da raiz do projeto, com o banco configurado em backend.DB_CONFIG):
+
+    python benchmarks/explain_datas.py
+    python benchmarks/explain_datas.py --aplicar-migracao
+
+Para cada consulta do dashboard/relatórios, mostra o plano da forma antiga
+(``MONTH(data_venda) = ...``, ``DATE(data_venda) = ...``) e da forma nova
+(intervalo semiaberto). Com ``--aplicar-migracao``, mostra os planos,
+aplica as migrações pendentes (entre elas ``003_indices_vendas_data.sql``)
+e mostra de novo, para conferir que a forma nova passa a usar
+``idx_vendas_loja_data``.
+"""
+import argparse
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrate  # noqa: E402
+from backend import LOJA_UNICA_ID, abrir_conexao_mysql, intervalo_dias, intervalo_mes  # noqa: E402
+
+
+def consultas():
+    hoje = date.today()
+    mes = intervalo_mes(hoje)
+    dia = intervalo_dias(hoje, hoje)
+    periodo = intervalo_dias(hoje.replace(day=1), hoje)
+    return [
+        ("vendas do mês",
+         "SELECT SUM(total_venda) FROM vendas WHERE loja_id = %s "
+         "AND MONTH(data_venda) = MONTH(CURRENT_DATE()) AND YEAR(data_venda) = YEAR(CURRENT_DATE())",
+         (LOJA_UNICA_ID,),
+         "SELECT SUM(total_venda) FROM vendas WHERE loja_id = %s AND data_venda >= %s AND data_venda < %s",
+         (LOJA_UNICA_ID, *mes)),
+        ("vendas de hoje",
+         "SELECT SUM(total_venda) FROM vendas WHERE loja_id = %s AND DATE(data_venda) = CURDATE()",
+         (LOJA_UNICA_ID,),
+         "SELECT SUM(total_venda) FROM vendas WHERE loja_id = %s AND data_venda >= %s AND data_venda < %s",
+         (LOJA_UNICA_ID, *dia)),
+        ("relatório por período",
+         "SELECT DATE(data_venda), COUNT(*), SUM(total_venda) FROM vendas WHERE loja_id = %s "
+         "AND DATE(data_venda) BETWEEN %s AND %s GROUP BY DATE(data_venda)",
+         (LOJA_UNICA_ID, hoje.replace(day=1), hoje),
+         "SELECT DATE(data_venda), COUNT(*), SUM(total_venda) FROM vendas WHERE loja_id = %s "
+         "AND data_venda >= %s AND data_venda < %s GROUP BY DATE(data_venda)",
+         (LOJA_UNICA_ID, *periodo)),
+    ]
+
+
+def explicar(cursor, sql, params):
+    cursor.execute("EXPLAIN " + sql, params)
+    return cursor.fetchall()
+
+
+def imprimir_planos(cursor, titulo):
+    print(f"== {titulo} ==")
+    for nome, sql_antigo, params_antigos, sql_novo, params_novos in consultas():
+        print(f"-- {nome}")
+        for rotulo, sql, params in (("antigo", sql_antigo, params_antigos), ("novo", sql_novo, params_novos)):
+            for linha in explicar(cursor, sql, params):
+                print(f"   {rotulo:<7} type={linha['type']!s:<6} key={linha['key']!s:<24} "
+                      f"rows={linha['rows']!s:<8} extra={linha['Extra']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--aplicar-migracao", action="store_true")
+    args = parser.parse_args()
+
+    conn = abrir_conexao_mysql()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        imprimir_planos(cursor, "antes" if args.aplicar_migracao else "planos atuais")
+        if args.aplicar_migracao:
+            migrate.aplicar(conn)
+            imprimir_planos(cursor, "depois")
+        cursor.close()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
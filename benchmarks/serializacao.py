@@ -0,0 +1,128 @@
+"""Custo por linha da serialização da listagem de produtos.
+
+Uso:
+
+    python benchmarks/serializacao.py --produtos 5000
+
+Compara, para linhas sintéticas no formato que o driver devolve
+(Decimal e datetime), o caminho antigo de GET /api/produtos com o novo:
+
+- antigo (limite=1000): reconstrução campo a campo com float()/str() e
+  isoformat(), depois jsonable_encoder e json.dumps do FastAPI;
+- antigo (paginado): isoformat() por linha, validação do response_model
+  ProdutoListResponse e json.dumps;
+- novo: as linhas do banco direto para ``respostas.RespostaJSON``
+  (orjson, quando instalado).
+
+Não usa banco.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+import respostas  # noqa: E402
+from backend import ProdutoListResponse  # noqa: E402
+
+
+def gerar(quantidade: int) -> list:
+    base = datetime(2024, 1, 1, 9, 30)
+    return [{
+        "id": i,
+        "loja_id": 1,
+        "codigo_barras": f"789{i:010d}",
+        "nome": f"Sutiã Renda {i}",
+        "descricao": "Renda francesa com bojo",
+        "categoria": "Sutiãs",
+        "marca": "Aurora",
+        "estoque_atual": Decimal("12.00"),
+        "estoque_minimo": Decimal("2.00"),
+        "preco_custo": Decimal("35.90"),
+        "preco_venda": Decimal("89.90"),
+        "ativo": 1,
+        "data_cadastro": base + timedelta(minutes=i),
+        "data_atualizacao": base + timedelta(days=1, minutes=i),
+    } for i in range(1, quantidade + 1)]
+
+
+def antigo_completo(linhas: list) -> bytes:
+    produtos = []
+    for produto in linhas:
+        serializado = {
+            'id': produto['id'],
+            'loja_id': produto['loja_id'],
+            'codigo_barras': str(produto['codigo_barras']) if produto['codigo_barras'] else None,
+            'nome': str(produto['nome']),
+            'descricao': str(produto['descricao']) if produto['descricao'] else None,
+            'categoria': str(produto['categoria']) if produto['categoria'] else None,
+            'marca': str(produto['marca']) if produto['marca'] else None,
+            'estoque_atual': float(produto['estoque_atual']) if produto['estoque_atual'] is not None else 0.0,
+            'estoque_minimo': float(produto['estoque_minimo']) if produto['estoque_minimo'] is not None else 0.0,
+            'preco_custo': float(produto['preco_custo']) if produto['preco_custo'] is not None else 0.0,
+            'preco_venda': float(produto['preco_venda']) if produto['preco_venda'] is not None else 0.0,
+            'ativo': bool(produto['ativo'])
+        }
+        if produto['data_cadastro']:
+            serializado['data_cadastro'] = produto['data_cadastro'].isoformat()
+        if produto['data_atualizacao']:
+            serializado['data_atualizacao'] = produto['data_atualizacao'].isoformat()
+        produtos.append(serializado)
+    conteudo = jsonable_encoder({"produtos": produtos, "total": len(produtos), "pagina": 1, "total_paginas": 1})
+    return json.dumps(conteudo, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def antigo_paginado(linhas: list) -> bytes:
+    linhas = [dict(linha) for linha in linhas]  # o caminho antigo alterava as linhas
+    for produto in linhas:
+        produto['data_cadastro'] = produto['data_cadastro'].isoformat()
+        produto['data_atualizacao'] = produto['data_atualizacao'].isoformat()
+    modelo = ProdutoListResponse.model_validate(
+        {"produtos": linhas, "total": len(linhas), "pagina": 1, "total_paginas": 1}
+    )
+    conteudo = jsonable_encoder(modelo.model_dump(mode="json"))
+    return json.dumps(conteudo, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def novo(linhas: list) -> bytes:
+    return respostas.resposta({"produtos": linhas, "total": len(linhas), "pagina": 1, "total_paginas": 1}).body
+
+
+def medir(funcao, linhas: list, repeticoes: int) -> list:
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(linhas)
+        tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--produtos", type=int, default=5000)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+
+    linhas = gerar(args.produtos)
+    print(f"{args.produtos} produtos, {args.repeticoes} repetições, "
+          f"encoder: {'orjson' if respostas.orjson else 'json'}")
+    referencia = None
+    for nome, funcao in (("antigo (limite=1000)", antigo_completo),
+                         ("antigo (paginado)", antigo_paginado),
+                         ("novo", novo)):
+        tempos = medir(funcao, linhas, args.repeticoes)
+        mediana = statistics.median(tempos)
+        referencia = referencia or mediana
+        print(f"{nome:22s} total {mediana * 1000:8.2f}ms  por linha {mediana / args.produtos * 1e6:6.2f}µs  "
+              f"({referencia / mediana:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
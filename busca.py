@@ -0,0 +1,325 @@
+"""Índice invertido de busca de produtos, em memória.
+
+Cada termo (palavra normalizada, sem acento e em minúsculas) aponta para os
+produtos que o contêm e o campo onde aparece. A busca por prefixo usa a
+lista ordenada de termos com ``bisect``; trechos no meio do nome ("enda"
+em "renda") usam trigramas do nome. Um código de barras digitado por
+inteiro tem caminho próprio e vem sempre em primeiro.
+
+Pontuação por palavra da consulta (vale a melhor ocorrência):
+
+- nome: termo exato 10, prefixo 6, trecho 3;
+- código de barras: exato 12, prefixo 8;
+- marca/categoria: exato 4, prefixo 3;
+- descrição: exato 2, prefixo 1.
+
+Todas as palavras precisam casar; nomes que começam pela consulta ganham
+um bônus, e empates favorecem nomes mais curtos. Os produtos são
+agrupados por pontuação com operações de conjunto, e só o grupo que
+completa o ``limite`` precisa ser ordenado.
+"""
+import bisect
+import re
+import unicodedata
+
+NOME, CODIGO, MARCA, CATEGORIA, DESCRICAO = range(5)
+
+# (exato, prefixo) por campo
+PESOS = {
+    NOME: (10, 6),
+    CODIGO: (12, 8),
+    MARCA: (4, 3),
+    CATEGORIA: (4, 3),
+    DESCRICAO: (2, 1),
+}
+PESO_TRECHO = 3
+BONUS_INICIO = 5
+
+_SEPARADORES = re.compile(r"[^\w]+")
+
+
+def normalizar(texto) -> str:
+    """Minúsculas, sem acentos e com espaços simples."""
+    if not texto:
+        return ""
+    sem_acento = unicodedata.normalize("NFKD", str(texto))
+    sem_acento = "".join(c for c in sem_acento if not unicodedata.combining(c))
+    return " ".join(sem_acento.casefold().split())
+
+
+def termos(texto) -> list:
+    return [t for t in _SEPARADORES.split(normalizar(texto)) if t]
+
+
+def trigramas(palavra: str) -> set:
+    return {palavra[i:i + 3] for i in range(len(palavra) - 2)}
+
+
+class IndiceBusca:
+    def __init__(self):
+        self._termos = {}       # termo -> {campo: {produto_id}}
+        self._ordenados = []    # termos em ordem, para busca por prefixo
+        self._primeiros = {}    # primeiro termo do nome -> {produto_id}
+        self._primeiros_ordenados = []
+        self._gramas = {}       # trigrama do nome -> {produto_id}
+        self._nomes = {}        # produto_id -> nome normalizado
+        self._codigos = {}      # código de barras -> produto_id
+        self._por_produto = {}  # produto_id -> (pares termo/campo, primeiro termo, trigramas, código)
+        self._ordem = None      # ids por (tamanho do nome, nome, id); refeita após mudanças
+
+    def __len__(self):
+        return len(self._nomes)
+
+    def _termos_do_produto(self, produto, descricao) -> dict:
+        campos = {}
+        for campo, texto in ((NOME, produto.nome), (CODIGO, produto.codigo_barras),
+                             (MARCA, produto.marca), (CATEGORIA, produto.categoria),
+                             (DESCRICAO, descricao)):
+            for termo in termos(texto):
+                if campo < campos.get(termo, DESCRICAO + 1):
+                    campos[termo] = campo
+        return campos
+
+    @staticmethod
+    def _incluir_termo(indice: dict, ordenados: list, termo: str, ordenar: bool) -> dict:
+        valor = indice.get(termo)
+        if valor is None:
+            valor = indice[termo] = {}
+            if ordenar:
+                bisect.insort(ordenados, termo)
+            else:
+                ordenados.append(termo)
+        return valor
+
+    @staticmethod
+    def _retirar_termo(indice: dict, ordenados: list, termo: str):
+        del indice[termo]
+        posicao = bisect.bisect_left(ordenados, termo)
+        if posicao < len(ordenados) and ordenados[posicao] == termo:
+            del ordenados[posicao]
+
+    def adicionar(self, produto, descricao=None, ordenar: bool = True):
+        """Indexa ``produto`` (um ``ProdutoCatalogo``); substitui se já existir."""
+        if produto.id in self._por_produto:
+            self.remover(produto.id)
+        campos = self._termos_do_produto(produto, descricao)
+        for termo, campo in campos.items():
+            por_campo = self._incluir_termo(self._termos, self._ordenados, termo, ordenar)
+            por_campo.setdefault(campo, set()).add(produto.id)
+        nome = normalizar(produto.nome)
+        termos_nome = termos(nome)
+        primeiro = termos_nome[0] if termos_nome else None
+        if primeiro:
+            self._incluir_termo(self._primeiros, self._primeiros_ordenados, primeiro, ordenar)[produto.id] = True
+        gramas = set()
+        for palavra in termos_nome:
+            gramas |= trigramas(palavra)
+        for grama in gramas:
+            self._gramas.setdefault(grama, set()).add(produto.id)
+        codigo = str(produto.codigo_barras).strip() if produto.codigo_barras else None
+        if codigo:
+            self._codigos[codigo] = produto.id
+        self._nomes[produto.id] = nome
+        self._por_produto[produto.id] = (tuple(campos.items()), primeiro, tuple(gramas), codigo)
+        self._ordem = None
+
+    def construir(self, itens):
+        """Indexa em lote uma sequência de ``(produto, descricao)``."""
+        for produto, descricao in itens:
+            self.adicionar(produto, descricao, ordenar=False)
+        self._ordenados.sort()
+        self._primeiros_ordenados.sort()
+        self._ordem_global()
+
+    def remover(self, produto_id: int):
+        registro = self._por_produto.pop(produto_id, None)
+        if registro is None:
+            return
+        pares, primeiro, gramas, codigo = registro
+        for termo, campo in pares:
+            por_campo = self._termos.get(termo)
+            if por_campo is None:
+                continue
+            ids = por_campo.get(campo)
+            if ids is not None:
+                ids.discard(produto_id)
+                if not ids:
+                    del por_campo[campo]
+            if not por_campo:
+                self._retirar_termo(self._termos, self._ordenados, termo)
+        if primeiro:
+            ids = self._primeiros.get(primeiro)
+            if ids is not None:
+                ids.pop(produto_id, None)
+                if not ids:
+                    self._retirar_termo(self._primeiros, self._primeiros_ordenados, primeiro)
+        for grama in gramas:
+            ids = self._gramas.get(grama)
+            if ids is not None:
+                ids.discard(produto_id)
+                if not ids:
+                    del self._gramas[grama]
+        if codigo and self._codigos.get(codigo) == produto_id:
+            del self._codigos[codigo]
+        self._nomes.pop(produto_id, None)
+        self._ordem = None
+
+    def por_codigo(self, codigo: str):
+        return self._codigos.get(str(codigo).strip())
+
+    def _ordem_global(self) -> list:
+        if self._ordem is None:
+            self._ordem = sorted(self._nomes, key=lambda pid: (len(self._nomes[pid]), self._nomes[pid], pid))
+        return self._ordem
+
+    @staticmethod
+    def _faixa_prefixo(ordenados: list, palavra: str):
+        inicio = bisect.bisect_left(ordenados, palavra)
+        for posicao in range(inicio, len(ordenados)):
+            termo = ordenados[posicao]
+            if not termo.startswith(palavra):
+                break
+            yield termo
+
+    def _ocorrencias(self, palavra: str) -> dict:
+        """``{pontos: [ids, ...]}`` dos termos que começam com ``palavra``."""
+        ocorrencias = {}
+        for termo in self._faixa_prefixo(self._ordenados, palavra):
+            exato = termo == palavra
+            for campo, ids in self._termos[termo].items():
+                ocorrencias.setdefault(PESOS[campo][0 if exato else 1], []).append(ids)
+        return ocorrencias
+
+    def _trecho(self, palavra: str, dentro: set = None, vistos: set = None) -> set:
+        """Produtos com ``palavra`` no meio de alguma palavra do nome.
+
+        Os de ``vistos`` (já casados por prefixo) nem são conferidos.
+        """
+        if len(palavra) < 3:
+            return set()
+        conjuntos = [self._gramas.get(grama) for grama in trigramas(palavra)]
+        if not all(conjuntos):
+            return set()
+        if dentro is not None:
+            conjuntos.append(dentro)
+        conjuntos.sort(key=len)
+        candidatos = conjuntos[0].intersection(*conjuntos[1:])
+        if vistos:
+            candidatos -= vistos
+        return {pid for pid in candidatos if palavra in self._nomes[pid]}
+
+    def _faixas(self, palavra: str, ocorrencias: dict, dentro: set = None, minimo: int = 0):
+        """Produtos que casam com uma palavra, agrupados por pontuação.
+
+        Retorna ``([(pontos, ids)], todos_os_ids)``, da maior pontuação para a
+        menor; cada produto aparece só na sua melhor faixa. ``dentro``
+        restringe a um conjunto de candidatos e faixas abaixo de ``minimo``
+        não são calculadas.
+        """
+        valores = set(ocorrencias)
+        if len(palavra) >= 3:
+            valores.add(PESO_TRECHO)
+        vistos = set()
+        faixas = []
+        for pontos in sorted(valores, reverse=True):
+            if pontos < minimo:
+                break
+            conjuntos = list(ocorrencias.get(pontos, ()))
+            if pontos == PESO_TRECHO:
+                conjuntos.append(self._trecho(palavra, dentro, vistos))
+            ids = set()
+            for conjunto in conjuntos:
+                ids |= conjunto if dentro is None else conjunto & dentro
+            ids -= vistos
+            if ids:
+                vistos |= ids
+                faixas.append((pontos, ids))
+        return faixas, vistos
+
+    def _comecam_com(self, frase: str, dentro: set) -> set:
+        """Produtos de ``dentro`` cujo nome normalizado começa com ``frase``."""
+        primeira = frase.split(" ", 1)[0]
+        ids = set()
+        for termo in self._faixa_prefixo(self._primeiros_ordenados, primeira):
+            ids.update(self._primeiros[termo].keys() & dentro)
+        if " " in frase:
+            ids = {pid for pid in ids if self._nomes[pid].startswith(frase)}
+        return ids
+
+    def _ordenar(self, ids: set, quantidade: int = None) -> list:
+        """Ordena um grupo de mesma pontuação por nome mais curto e alfabético."""
+        if quantidade is not None and len(ids) > 4 * quantidade and len(ids) > 500:
+            # Grupo grande: percorre a ordem global e para ao completar
+            escolhidos = []
+            for pid in self._ordem_global():
+                if pid in ids:
+                    escolhidos.append(pid)
+                    if len(escolhidos) == quantidade:
+                        break
+            return escolhidos
+        ordenados = sorted(ids, key=lambda pid: (len(self._nomes[pid]), self._nomes[pid], pid))
+        return ordenados if quantidade is None else ordenados[:quantidade]
+
+    def buscar(self, consulta: str, limite: int = None, contar: bool = True):
+        """Retorna ``(ids, total)``: os ``limite`` ids mais relevantes e o total de acertos.
+
+        Com ``contar=False`` (sugestões enquanto se digita) o total vem
+        ``None`` e, numa consulta de uma palavra, as faixas de marca,
+        categoria, descrição e trecho só são calculadas se nome e código
+        não bastarem para completar o ``limite``.
+        """
+        palavras = termos(consulta)
+        if not palavras:
+            return [], 0
+
+        codigo = self.por_codigo(consulta)
+        ocorrencias = {p: self._ocorrencias(p) for p in set(palavras)}
+        # Palavra mais seletiva primeiro: as seguintes só olham os candidatos dela
+        unicas = sorted(ocorrencias, key=lambda p: sum(len(ids) for c in ocorrencias[p].values() for ids in c))
+
+        grupos = {}
+        if len(unicas) == 1:
+            palavra = unicas[0]
+            minimo = PESOS[NOME][1] if limite and not contar else 0
+            faixas, candidatos = self._faixas(palavra, ocorrencias[palavra], minimo=minimo)
+            if minimo and len(candidatos) <= limite:
+                faixas, candidatos = self._faixas(palavra, ocorrencias[palavra])
+            candidatos.discard(codigo)
+            bonus = self._comecam_com(palavra, candidatos)
+            for pontos, ids in faixas:
+                ids.discard(codigo)
+                com_bonus = ids & bonus
+                if com_bonus:
+                    grupos.setdefault(pontos + BONUS_INICIO, set()).update(com_bonus)
+                grupos.setdefault(pontos, set()).update(ids - com_bonus)
+            total = None if minimo and len(candidatos) > limite else len(candidatos)
+        else:
+            candidatos = None
+            por_palavra = []
+            for palavra in unicas:
+                faixas, candidatos = self._faixas(palavra, ocorrencias[palavra], dentro=candidatos)
+                por_palavra.append(faixas)
+                if not candidatos:
+                    break
+            candidatos.discard(codigo)
+            soma = dict.fromkeys(candidatos, 0)
+            for faixas in por_palavra:
+                for pontos, ids in faixas:
+                    for pid in ids & candidatos:
+                        soma[pid] += pontos
+            for pid in self._comecam_com(" ".join(palavras), candidatos):
+                soma[pid] += BONUS_INICIO
+            for pid, pontos in soma.items():
+                grupos.setdefault(pontos, set()).add(pid)
+            total = len(candidatos)
+
+        ordem = [codigo] if codigo is not None else []
+        for pontos in sorted(grupos, reverse=True):
+            falta = None if limite is None else limite - len(ordem)
+            if falta is not None and falta <= 0:
+                break
+            if grupos[pontos]:
+                ordem.extend(self._ordenar(grupos[pontos], falta))
+        if total is not None and codigo is not None:
+            total += 1
+        return ordem, total
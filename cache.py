@@ -0,0 +1,100 @@
+"""Cache em memória com expiração (TTL) para respostas caras da API.
+
+Cada processo tem o seu cache. As rotas de escrita invalidam as chaves
+afetadas logo após o commit; o TTL limita por quanto tempo outro worker
+pode servir um valor antigo. Pedidos simultâneos da mesma chave ausente
+esperam uma única carga em vez de repetir a consulta.
+"""
+import asyncio
+import threading
+import time
+
+
+class CacheTTL:
+    def __init__(self, ttl_segundos: float):
+        self.ttl = ttl_segundos
+        self._itens = {}
+        self._carregando = {}
+        self._lock = threading.Lock()
+        self._geracao = 0
+        self._contadores = {"hits": 0, "misses": 0, "invalidacoes": 0}
+
+    def get(self, chave):
+        """Retorna o valor ainda válido de ``chave`` ou ``None``."""
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None and item[0] > time.monotonic():
+                self._contadores["hits"] += 1
+                return item[1]
+            if item is not None:
+                del self._itens[chave]
+            self._contadores["misses"] += 1
+            return None
+
+    def set(self, chave, valor, geracao: int = None):
+        """Guarda ``valor``; ignora se houve invalidação desde ``geracao``."""
+        with self._lock:
+            if geracao is not None and geracao != self._geracao:
+                return
+            self._itens[chave] = (time.monotonic() + self.ttl, valor)
+
+    def invalidar(self, chave=None):
+        """Remove ``chave`` (ou tudo, sem argumento)."""
+        with self._lock:
+            self._geracao += 1
+            self._contadores["invalidacoes"] += 1
+            if chave is None:
+                self._itens.clear()
+                self._carregando.clear()
+            else:
+                self._itens.pop(chave, None)
+                self._carregando.pop(chave, None)
+
+    def invalidar_grupo(self, grupo):
+        """Remove as chaves-tupla que começam com ``grupo`` (ex.: a loja)."""
+        with self._lock:
+            self._geracao += 1
+            self._contadores["invalidacoes"] += 1
+            for itens in (self._itens, self._carregando):
+                for chave in [c for c in itens if isinstance(c, tuple) and c and c[0] == grupo]:
+                    del itens[chave]
+
+    async def obter_ou_carregar(self, chave, carregar):
+        """Valor em cache, ou o resultado de ``await carregar()``.
+
+        Uma carga que termina depois de uma invalidação é devolvida a quem
+        já esperava por ela, mas não fica no cache; pedidos posteriores à
+        invalidação disparam uma carga nova.
+        """
+        if self.ttl <= 0:
+            return await carregar()
+        valor = self.get(chave)
+        if valor is not None:
+            return valor
+        tarefa = self._carregando.get(chave)
+        if tarefa is None:
+            geracao = self._geracao
+            tarefa = asyncio.ensure_future(carregar())
+            self._carregando[chave] = tarefa
+            tarefa.add_done_callback(lambda t: self._fim_carga(chave, t, geracao))
+        return await asyncio.shield(tarefa)
+
+    def _fim_carga(self, chave, tarefa, geracao):
+        if self._carregando.get(chave) is tarefa:
+            del self._carregando[chave]
+        if not tarefa.cancelled() and tarefa.exception() is None:
+            self.set(chave, tarefa.result(), geracao)
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            c = dict(self._contadores)
+            entradas = len(self._itens)
+        consultas = c["hits"] + c["misses"]
+        return {
+            "ttl_segundos": self.ttl,
+            "entradas": entradas,
+            "hits": c["hits"],
+            "misses": c["misses"],
+            "invalidacoes": c["invalidacoes"],
+            "taxa_acerto": round(c["hits"] / consultas, 3) if consultas else 0.0,
+        }
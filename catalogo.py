@@ -0,0 +1,211 @@
+"""Catálogo de produtos ativos em memória, por loja.
+
+Atende as consultas do PDV (leitura de código de barras, busca por nome,
+lista completa) sem ida ao banco. Cada loja guarda dicionários por id,
+código de barras e nome normalizado, apontando para registros compactos.
+
+Cada loja tem também um ``IndiceBusca`` (ver busca.py), mantido junto com
+os dicionários.
+
+A tabela ``catalogo_versoes`` tem um contador por loja, incrementado em
+toda escrita que muda produtos ou estoque. O processo que fez a escrita
+aplica a mudança no próprio catálogo; os demais percebem a versão nova na
+verificação periódica e recarregam a loja.
+"""
+import threading
+
+from busca import IndiceBusca, normalizar
+
+CAMPOS = ("id", "loja_id", "codigo_barras", "nome", "categoria", "marca",
+          "estoque_atual", "estoque_minimo", "preco_venda")
+
+# A descrição entra só no índice de busca, não nos registros
+SQL_PRODUTOS = f"""
+    SELECT {', '.join(CAMPOS)}, descricao
+    FROM produtos
+    WHERE loja_id = %s AND ativo = 1
+"""
+
+
+def _numero(valor):
+    return float(valor) if valor is not None else None
+
+
+class ProdutoCatalogo:
+    __slots__ = CAMPOS
+
+    def __init__(self, linha: dict):
+        self.id = linha["id"]
+        self.loja_id = linha["loja_id"]
+        self.codigo_barras = str(linha["codigo_barras"]) if linha.get("codigo_barras") else None
+        self.nome = linha["nome"]
+        self.categoria = linha.get("categoria")
+        self.marca = linha.get("marca")
+        self.estoque_atual = _numero(linha.get("estoque_atual"))
+        self.estoque_minimo = _numero(linha.get("estoque_minimo"))
+        self.preco_venda = _numero(linha.get("preco_venda"))
+
+    def como_dict(self) -> dict:
+        return {campo: getattr(self, campo) for campo in CAMPOS}
+
+
+class CatalogoLoja:
+    __slots__ = ("versao", "por_id", "por_codigo", "por_nome", "indice")
+
+    def __init__(self, versao: int):
+        self.versao = versao
+        self.por_id = {}
+        self.por_codigo = {}
+        self.por_nome = {}
+        self.indice = IndiceBusca()
+
+    def _indexar_nome(self, produto: ProdutoCatalogo):
+        # Nomes repetidos: vale o de menor id, como no checkout
+        chave = normalizar(produto.nome)
+        atual = self.por_nome.get(chave)
+        if atual is None or produto.id < atual.id:
+            self.por_nome[chave] = produto
+
+    def incluir(self, produto: ProdutoCatalogo, descricao=None):
+        self.por_id[produto.id] = produto
+        if produto.codigo_barras:
+            self.por_codigo[produto.codigo_barras] = produto
+        self._indexar_nome(produto)
+        self.indice.adicionar(produto, descricao)
+
+    def excluir(self, produto_id: int):
+        produto = self.por_id.pop(produto_id, None)
+        if produto is None:
+            return
+        self.indice.remover(produto_id)
+        if produto.codigo_barras and self.por_codigo.get(produto.codigo_barras) is produto:
+            del self.por_codigo[produto.codigo_barras]
+        chave = normalizar(produto.nome)
+        if self.por_nome.get(chave) is produto:
+            del self.por_nome[chave]
+            for outro in self.por_id.values():
+                if normalizar(outro.nome) == chave:
+                    self._indexar_nome(outro)
+
+
+class Catalogo:
+    def __init__(self):
+        self._lojas = {}
+        self._lock = threading.Lock()
+        self._contadores = {"consultas": 0, "acertos": 0, "recargas": 0, "buscas": 0}
+
+    def carregado(self, loja_id: int) -> bool:
+        return loja_id in self._lojas
+
+    def lojas(self) -> list:
+        return list(self._lojas)
+
+    def versao(self, loja_id: int):
+        loja = self._lojas.get(loja_id)
+        return loja.versao if loja else None
+
+    def carregar(self, loja_id: int, linhas: list, versao: int):
+        """Substitui o catálogo da loja de uma vez."""
+        loja = CatalogoLoja(versao)
+        indexar = []
+        for linha in linhas:
+            produto = ProdutoCatalogo(linha)
+            loja.por_id[produto.id] = produto
+            if produto.codigo_barras:
+                loja.por_codigo[produto.codigo_barras] = produto
+            loja._indexar_nome(produto)
+            indexar.append((produto, linha.get("descricao")))
+        loja.indice.construir(indexar)
+        with self._lock:
+            self._lojas[loja_id] = loja
+            self._contadores["recargas"] += 1
+
+    def _aceitar_versao(self, loja: CatalogoLoja, versao) -> bool:
+        """Decide se uma escrita local deve ser aplicada ao catálogo.
+
+        Versão já coberta pela última carga: ignora (não aplicar duas vezes).
+        Versão seguinte à conhecida: aplica e avança. Se houve escritas de
+        outro worker no meio, aplica mas não avança, e a verificação
+        periódica recarrega a loja inteira.
+        """
+        if versao is None:
+            return True
+        if versao <= loja.versao:
+            return False
+        if versao == loja.versao + 1:
+            loja.versao = versao
+        return True
+
+    def atualizar_produto(self, loja_id: int, linha: dict, versao=None):
+        """Aplica um produto criado/alterado (inativo sai do catálogo)."""
+        with self._lock:
+            loja = self._lojas.get(loja_id)
+            if loja is None or not self._aceitar_versao(loja, versao):
+                return
+            loja.excluir(linha["id"])
+            if linha.get("ativo", True):
+                loja.incluir(ProdutoCatalogo(linha), linha.get("descricao"))
+
+    def remover_produto(self, loja_id: int, produto_id: int, versao=None):
+        with self._lock:
+            loja = self._lojas.get(loja_id)
+            if loja is None or not self._aceitar_versao(loja, versao):
+                return
+            loja.excluir(produto_id)
+
+    def ajustar_estoque(self, loja_id: int, variacoes: dict, versao=None):
+        """Soma ``variacoes`` ({produto_id: quantidade}) ao estoque em memória."""
+        with self._lock:
+            loja = self._lojas.get(loja_id)
+            if loja is None or not self._aceitar_versao(loja, versao):
+                return
+            for produto_id, quantidade in variacoes.items():
+                produto = loja.por_id.get(produto_id)
+                if produto is not None and produto.estoque_atual is not None:
+                    produto.estoque_atual += float(quantidade)
+
+    def _consultar(self, loja_id: int, indice: str, chave):
+        loja = self._lojas.get(loja_id)
+        with self._lock:
+            self._contadores["consultas"] += 1
+            produto = getattr(loja, indice).get(chave) if loja else None
+            if produto is not None:
+                self._contadores["acertos"] += 1
+        return produto
+
+    def por_id(self, loja_id: int, produto_id: int):
+        return self._consultar(loja_id, "por_id", produto_id)
+
+    def por_codigo(self, loja_id: int, codigo_barras: str):
+        return self._consultar(loja_id, "por_codigo", str(codigo_barras).strip())
+
+    def por_nome(self, loja_id: int, nome: str):
+        return self._consultar(loja_id, "por_nome", normalizar(nome))
+
+    def buscar(self, loja_id: int, consulta: str, limite: int = None, contar: bool = True):
+        """``(produtos, total)`` que casam com ``consulta``, do mais relevante ao menos."""
+        loja = self._lojas.get(loja_id)
+        if loja is None:
+            return [], 0
+        with self._lock:
+            self._contadores["buscas"] += 1
+            ids, total = loja.indice.buscar(consulta, limite, contar)
+            return [loja.por_id[produto_id] for produto_id in ids], total
+
+    def quantidade(self, loja_id: int):
+        loja = self._lojas.get(loja_id)
+        return len(loja.por_id) if loja else None
+
+    def produtos(self, loja_id: int) -> list:
+        """Todos os produtos ativos da loja, ordenados por nome."""
+        loja = self._lojas.get(loja_id)
+        if loja is None:
+            return []
+        return sorted(loja.por_id.values(), key=lambda p: (normalizar(p.nome), p.id))
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            c = dict(self._contadores)
+            lojas = {loja_id: {"versao": loja.versao, "produtos": len(loja.por_id)}
+                     for loja_id, loja in self._lojas.items()}
+        return {**c, "lojas": lojas}
@@ -0,0 +1,139 @@
+"""Contexto de uma requisição: sessão do usuário e conexão com o banco.
+
+As rotas recebem o ``Contexto`` pelas dependências do backend
+(``contexto_requisicao``, ``contexto_admin``...), que resolvem a sessão
+uma vez por requisição. ``ctx.cursor()`` não toca no pool: a conexão só é
+emprestada quando o primeiro comando roda, então rotas que respondem da
+memória (catálogo, cache) não ocupam conexão.
+
+Ao fim da requisição ``encerrar`` fecha os cursores e devolve a conexão;
+o pool desfaz o que ficou sem commit. O commit continua explícito na rota,
+antes da resposta. Fora das rotas (cargas de cache, relatórios em
+paralelo, tarefas periódicas) o mesmo objeto serve como ``async with``.
+"""
+import database
+
+
+class CursorPreguicoso:
+    """Cursor que só pega a conexão do contexto no primeiro comando."""
+
+    def __init__(self, ctx, opcoes: dict):
+        self._ctx = ctx
+        self._opcoes = opcoes
+        self._cursor = None
+
+    async def _real(self):
+        if self._cursor is None:
+            conn = await self._ctx.conexao()
+            self._cursor = conn.cursor(**self._opcoes)
+        return self._cursor
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid if self._cursor is not None else None
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount if self._cursor is not None else -1
+
+    async def execute(self, operation, params=None):
+        return await (await self._real()).execute(operation, params)
+
+    async def executemany(self, operation, seq_params):
+        return await (await self._real()).executemany(operation, seq_params)
+
+    async def fetchone(self):
+        return await (await self._real()).fetchone()
+
+    async def fetchall(self):
+        return await (await self._real()).fetchall()
+
+    async def fetchmany(self, size: int = 1):
+        return await (await self._real()).fetchmany(size)
+
+    async def close(self):
+        if self._cursor is not None:
+            cursor, self._cursor = self._cursor, None
+            await cursor.close()
+
+
+class Contexto:
+    def __init__(self, sessao: dict = None, loja_id: int = None, pesado: bool = False):
+        self.sessao = sessao or {}
+        self.loja_id = loja_id
+        self.pesado = pesado
+        self._conn = None
+        self._cursores = []
+        self._interrompido = False
+
+    @property
+    def usuario_id(self):
+        return self.sessao.get("user_id")
+
+    @property
+    def perfil(self):
+        return self.sessao.get("perfil")
+
+    @property
+    def conectado(self) -> bool:
+        return self._conn is not None
+
+    async def conexao(self):
+        """Conexão do contexto, emprestada do pool na primeira chamada."""
+        if self._conn is None:
+            self._conn = await database.connect(pesado=self.pesado)
+        return self._conn
+
+    def cursor(self, **opcoes) -> CursorPreguicoso:
+        """Cursor de dicionário por padrão (``dictionary=False`` para tuplas)."""
+        opcoes.setdefault("dictionary", True)
+        cursor = CursorPreguicoso(self, opcoes)
+        self._cursores.append(cursor)
+        return cursor
+
+    async def preparado(self, sql: str, params=(), modo: str = "todos", dictionary: bool = True):
+        """Roda ``sql`` como prepared statement na conexão do contexto."""
+        return await (await self.conexao()).preparado(sql, params, modo, dictionary)
+
+    async def commit(self):
+        if self._conn is not None:
+            await self._conn.commit()
+
+    async def rollback(self):
+        if self._conn is not None:
+            await self._conn.rollback()
+
+    def interromper(self):
+        """Aborta o comando em andamento (relatório fora do tempo).
+
+        A conexão não volta ao pool: ``encerrar`` a descarta depois que a
+        thread do banco devolver o comando.
+        """
+        self._interrompido = True
+        if self._conn is not None:
+            self._conn.interromper()
+
+    def transferir(self):
+        """Entrega a conexão a quem passa a cuidar dela (ex.: resposta em streaming)."""
+        conn, self._conn = self._conn, None
+        return conn
+
+    async def encerrar(self):
+        """Fecha os cursores e devolve a conexão ao pool (uma vez só)."""
+        cursores, self._cursores = self._cursores, []
+        descartar = self._interrompido
+        for cursor in cursores:
+            try:
+                await cursor.close()
+            except Exception:
+                # Cursor com linhas pendentes: a conexão fica em estado incerto
+                descartar = True
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            await conn.close(descartar=descartar)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *erro):
+        await self.encerrar()
@@ -0,0 +1,573 @@
+"""Camada assíncrona de acesso ao banco.
+
+O driver ``mysql.connector`` é bloqueante. Para não travar o event loop do
+uvicorn, toda operação de banco roda num ThreadPoolExecutor dedicado e de
+tamanho limitado; os endpoints usam os wrappers ``AsyncConnection`` e
+``AsyncCursor``, que espelham a API do driver com métodos ``await``.
+
+As conexões físicas vêm de um ``ConnectionPool`` único por processo, criado
+na inicialização da aplicação. O pool também guarda, por conexão física, os
+cursores preparados (prepared statements no servidor) usados pelos
+repositórios: cada consulta é analisada uma vez por conexão e reexecutada
+só com os parâmetros.
+"""
+import asyncio
+import collections
+import contextvars
+import functools
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+
+# Deadlock (1213) e lock wait timeout (1205): a transação pode ser repetida
+ERROS_RETENTAVEIS = {1213, 1205}
+
+
+def erro_retentavel(erro) -> bool:
+    if isinstance(erro, sqlite3.OperationalError):
+        # SQLite: a trava de escrita do arquivo não saiu dentro do busy_timeout
+        return "locked" in str(erro) or "busy" in str(erro)
+    return getattr(erro, "errno", None) in ERROS_RETENTAVEIS
+
+
+class PoolEsgotado(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=503, detail="Banco de dados ocupado, tente novamente em instantes")
+
+
+class ConexaoDoPool:
+    """Proxy de uma conexão emprestada: ``close()`` devolve ao pool."""
+
+    __slots__ = ("_conn", "_pool", "_criada_em")
+
+    def __init__(self, conn, pool, criada_em):
+        self._conn = conn
+        self._pool = pool
+        self._criada_em = criada_em
+
+    def __getattr__(self, nome):
+        return getattr(self._conn, nome)
+
+    def preparado(self, sql: str, dictionary: bool = True):
+        return self._pool.preparado(self._conn, sql, dictionary)
+
+    def esquecer_preparado(self, sql: str, dictionary: bool = True):
+        self._pool.esquecer_preparado(self._conn, sql, dictionary)
+
+    def close(self, descartar: bool = False):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        self._pool.devolver(conn, self._criada_em, descartar)
+
+
+class ConnectionPool:
+    """Pool de conexões com pre-ping, reciclagem e contadores de uso.
+
+    ``criar`` é a fábrica de conexões físicas. Conexões ociosas há mais de
+    ``ping_apos`` segundos são testadas antes do empréstimo e conexões com
+    mais de ``reciclar_apos`` segundos de vida são substituídas. Cada conexão
+    guarda até ``max_preparados`` cursores preparados (os menos usados saem).
+    """
+
+    def __init__(self, criar, tamanho: int = 10, timeout: float = 5.0,
+                 reciclar_apos: float = 1800, ping_apos: float = 30,
+                 max_preparados: int = 64):
+        self._criar = criar
+        self.tamanho = tamanho
+        self.timeout = timeout
+        self.reciclar_apos = reciclar_apos
+        self.ping_apos = ping_apos
+        self.max_preparados = max_preparados
+        self._preparados = {}
+        self._vagas = threading.BoundedSemaphore(tamanho)
+        self._lock = threading.Lock()
+        self._ociosas = collections.deque()
+        self._ouvintes = []
+        self._abertas = 0
+        self._em_uso = 0
+        self._contadores = {
+            "checkouts": 0,
+            "esperas": 0,
+            "timeouts": 0,
+            "criadas": 0,
+            "recicladas": 0,
+            "descartadas": 0,
+            "tempo_espera_total": 0.0,
+            "tempo_espera_max": 0.0,
+            "preparados": 0,
+            "preparados_reusados": 0,
+        }
+
+    def tentar_reservar(self) -> bool:
+        return self._vagas.acquire(blocking=False)
+
+    def reservar(self, timeout: float = None):
+        """Reserva uma vaga bloqueando a thread (uso síncrono)."""
+        if self.tentar_reservar():
+            self.registrar_espera(0.0)
+            return
+        inicio = time.monotonic()
+        ok = self._vagas.acquire(timeout=self.timeout if timeout is None else timeout)
+        self.registrar_espera(time.monotonic() - inicio, esperou=True, expirou=not ok)
+        if not ok:
+            raise PoolEsgotado()
+
+    def liberar_vaga(self):
+        self._vagas.release()
+        for ouvinte in list(self._ouvintes):
+            ouvinte()
+
+    def ao_liberar(self, ouvinte):
+        self._ouvintes.append(ouvinte)
+
+    def registrar_espera(self, segundos: float, esperou: bool = False, expirou: bool = False):
+        with self._lock:
+            c = self._contadores
+            if expirou:
+                c["timeouts"] += 1
+            if esperou:
+                c["esperas"] += 1
+            c["tempo_espera_total"] += segundos
+            c["tempo_espera_max"] = max(c["tempo_espera_max"], segundos)
+
+    def retirar(self) -> ConexaoDoPool:
+        """Entrega uma conexão saudável; exige vaga já reservada."""
+        try:
+            agora = time.monotonic()
+            while True:
+                with self._lock:
+                    item = self._ociosas.pop() if self._ociosas else None
+                if item is None:
+                    break
+                conn, criada_em, devolvida_em = item
+                if agora - criada_em > self.reciclar_apos:
+                    self._descartar(conn, "recicladas")
+                    continue
+                if agora - devolvida_em > self.ping_apos and not self._esta_viva(conn):
+                    self._descartar(conn, "descartadas")
+                    continue
+                break
+            if item is None:
+                conn, criada_em = self._criar(), time.monotonic()
+                with self._lock:
+                    self._abertas += 1
+                    self._contadores["criadas"] += 1
+            with self._lock:
+                self._em_uso += 1
+                self._contadores["checkouts"] += 1
+            return ConexaoDoPool(conn, self, criada_em)
+        except BaseException:
+            self.liberar_vaga()
+            raise
+
+    def obter(self, timeout: float = None) -> ConexaoDoPool:
+        self.reservar(timeout)
+        return self.retirar()
+
+    def devolver(self, conn, criada_em: float, descartar: bool = False):
+        """Devolve ao pool; ``descartar=True`` fecha a conexão (estado incerto)."""
+        try:
+            if descartar:
+                self._descartar(conn, "descartadas")
+                return
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                self._ociosas.append((conn, criada_em, time.monotonic()))
+        except Exception:
+            self._descartar(conn, "descartadas")
+        finally:
+            with self._lock:
+                self._em_uso -= 1
+            self.liberar_vaga()
+
+    def preparado(self, conn, sql: str, dictionary: bool = True):
+        """Cursor preparado de ``sql`` na conexão física ``conn``.
+
+        Roda na thread do banco, com a conexão emprestada (um usuário por
+        vez), então o cache de cada conexão dispensa trava própria. Drivers
+        sem prepared statements recebem um cursor comum, também reaproveitado.
+        """
+        with self._lock:
+            cursores = self._preparados.get(conn)
+            if cursores is None:
+                cursores = self._preparados[conn] = collections.OrderedDict()
+        chave = (sql, dictionary)
+        cursor = cursores.get(chave)
+        if cursor is not None:
+            cursores.move_to_end(chave)
+            with self._lock:
+                self._contadores["preparados_reusados"] += 1
+            return cursor
+        try:
+            cursor = conn.cursor(prepared=True, dictionary=dictionary)
+        except (TypeError, ValueError):
+            cursor = conn.cursor(dictionary=dictionary)
+        cursores[chave] = cursor
+        with self._lock:
+            self._contadores["preparados"] += 1
+        if len(cursores) > self.max_preparados:
+            _, antigo = cursores.popitem(last=False)
+            self._fechar_cursor(antigo)
+        return cursor
+
+    def esquecer_preparado(self, conn, sql: str, dictionary: bool = True):
+        """Tira do cache um cursor que falhou (estado incerto)."""
+        cursores = self._preparados.get(conn)
+        cursor = cursores.pop((sql, dictionary), None) if cursores else None
+        if cursor is not None:
+            self._fechar_cursor(cursor)
+
+    def _fechar_cursor(self, cursor):
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
+    def _esta_viva(self, conn) -> bool:
+        try:
+            return conn.is_connected()
+        except Exception:
+            return False
+
+    def _descartar(self, conn, motivo: str):
+        with self._lock:
+            # Os prepared statements morrem junto com a conexão no servidor
+            self._preparados.pop(conn, None)
+            self._abertas -= 1
+            self._contadores[motivo] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            c = dict(self._contadores)
+            ociosas = len(self._ociosas)
+            abertas = self._abertas
+            em_uso = self._em_uso
+        checkouts = c["checkouts"] or 1
+        return {
+            "tamanho": self.tamanho,
+            "abertas": abertas,
+            "em_uso": em_uso,
+            "ociosas": ociosas,
+            "checkouts": c["checkouts"],
+            "esperas": c["esperas"],
+            "timeouts": c["timeouts"],
+            "criadas": c["criadas"],
+            "recicladas": c["recicladas"],
+            "descartadas": c["descartadas"],
+            "tempo_espera_total_ms": round(c["tempo_espera_total"] * 1000, 2),
+            "tempo_espera_medio_ms": round(c["tempo_espera_total"] * 1000 / checkouts, 3),
+            "tempo_espera_max_ms": round(c["tempo_espera_max"] * 1000, 2),
+            "preparados": c["preparados"],
+            "preparados_reusados": c["preparados_reusados"],
+        }
+
+    def fechar(self):
+        with self._lock:
+            ociosas, self._ociosas = list(self._ociosas), collections.deque()
+            self._abertas -= len(ociosas)
+            for conn, _, _ in ociosas:
+                self._preparados.pop(conn, None)
+        for conn, _, _ in ociosas:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+_executor = None
+_pool = None
+_limite_pesados = None
+_max_pesados = 1
+_vaga_liberada = None
+
+
+def configurar(pool: ConnectionPool, max_workers: int = 10, max_pesados: int = 2):
+    """Define o pool de conexões e os limites de concorrência.
+
+    ``max_workers`` limita quantas operações de banco rodam ao mesmo tempo no
+    processo; ``max_pesados`` limita quantas conexões de relatórios podem
+    estar abertas juntas, deixando threads livres para o PDV.
+    """
+    global _executor, _pool, _max_pesados, _limite_pesados, _vaga_liberada
+    encerrar()
+    _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="webos-db")
+    _pool = pool
+    _max_pesados = max(1, max_pesados)
+    _limite_pesados = None
+    _vaga_liberada = None
+
+
+def obter_pool() -> ConnectionPool:
+    return _pool
+
+
+def estatisticas() -> dict:
+    return _pool.estatisticas() if _pool else {}
+
+
+class MetricasDB:
+    """Tempo e número de operações de banco acumulados numa requisição."""
+
+    __slots__ = ("tempo", "operacoes")
+
+    def __init__(self):
+        self.tempo = 0.0
+        self.operacoes = 0
+
+
+_metricas = contextvars.ContextVar("webos_metricas_db", default=None)
+
+
+def iniciar_medicao() -> MetricasDB:
+    metricas = MetricasDB()
+    _metricas.set(metricas)
+    return metricas
+
+
+def _medir(metricas, func, *args, **kwargs):
+    inicio = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        metricas.tempo += time.perf_counter() - inicio
+        metricas.operacoes += 1
+
+
+def _submeter(func, *args, **kwargs):
+    """Agenda ``func`` no executor do banco; devolve o ``concurrent.futures.Future``."""
+    ctx = contextvars.copy_context()
+    metricas = _metricas.get()
+    if metricas is not None:
+        args = (metricas, func) + args
+        func = _medir
+    return _executor.submit(functools.partial(ctx.run, func, *args, **kwargs))
+
+
+async def executar(func, *args, **kwargs):
+    """Executa uma função bloqueante no executor do banco."""
+    return await asyncio.wrap_future(_submeter(func, *args, **kwargs))
+
+
+def _semaforo_pesados():
+    global _limite_pesados
+    if _limite_pesados is None:
+        _limite_pesados = asyncio.Semaphore(_max_pesados)
+    return _limite_pesados
+
+
+class AsyncCursor:
+    def __init__(self, cursor, conexao):
+        self._cursor = cursor
+        self._conexao = conexao
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    async def execute(self, operation, params=None):
+        return await self._conexao._executar(self._cursor.execute, operation, params)
+
+    async def executemany(self, operation, seq_params):
+        return await self._conexao._executar(self._cursor.executemany, operation, seq_params)
+
+    async def fetchone(self):
+        return await self._conexao._executar(self._cursor.fetchone)
+
+    async def fetchall(self):
+        return await self._conexao._executar(self._cursor.fetchall)
+
+    async def fetchmany(self, size: int = 1):
+        return await self._conexao._executar(self._cursor.fetchmany, size)
+
+    async def close(self):
+        return await self._conexao._executar(self._cursor.close)
+
+
+def _rodar_preparado(conn, sql: str, params, modo: str, dictionary: bool):
+    """Executa ``sql`` no cursor preparado de ``conn`` (thread do banco).
+
+    ``modo``: ``"todos"`` (lista de linhas), ``"um"`` (primeira linha ou
+    ``None``) ou ``"escrita"`` (``(rowcount, lastrowid)``). As linhas são
+    sempre lidas até o fim, para o cursor poder ser reusado.
+    """
+    preparado = getattr(conn, "preparado", None)
+    cursor = preparado(sql, dictionary) if preparado else conn.cursor(dictionary=dictionary)
+    try:
+        cursor.execute(sql, tuple(params))
+        if modo == "escrita":
+            return cursor.rowcount, cursor.lastrowid
+        linhas = cursor.fetchall()
+    except Exception:
+        if preparado:
+            conn.esquecer_preparado(sql, dictionary)
+        raise
+    finally:
+        if not preparado:
+            cursor.close()
+    if modo == "um":
+        return linhas[0] if linhas else None
+    return linhas
+
+
+class AsyncConnection:
+    def __init__(self, conn, pesado: bool = False):
+        self._conn = conn
+        self._pesado = pesado
+        self._fechada = False
+        self._em_andamento = None
+
+    @property
+    def raw(self):
+        return self._conn
+
+    @property
+    def in_transaction(self):
+        return self._conn.in_transaction
+
+    async def _executar(self, func, *args):
+        """``executar`` com um comando por vez nesta conexão.
+
+        Um ``await`` cancelado (relatório fora do tempo) não para a thread:
+        o comando segue até o banco devolvê-lo. O próximo uso da conexão
+        (fechar cursores, devolver ao pool) espera por ele em vez de
+        disputar a conexão com a thread.
+        """
+        anterior = self._em_andamento
+        if anterior is not None and not anterior.done():
+            await asyncio.wait([asyncio.wrap_future(anterior)])
+        self._em_andamento = _submeter(func, *args)
+        return await asyncio.wrap_future(self._em_andamento)
+
+    def interromper(self):
+        """Aborta o comando em andamento no banco; seguro no event loop.
+
+        O SQLite para na hora (``interrupt``). No MySQL os relatórios já
+        levam o hint MAX_EXECUTION_TIME com o mesmo limite.
+        """
+        interromper = getattr(self._conn, "interromper", None)
+        if interromper is not None:
+            interromper()
+
+    def cursor(self, **kwargs):
+        return AsyncCursor(self._conn.cursor(**kwargs), self)
+
+    async def preparado(self, sql: str, params=(), modo: str = "todos", dictionary: bool = True):
+        """Executa ``sql`` como prepared statement (veja ``_rodar_preparado``)."""
+        return await self._executar(_rodar_preparado, self._conn, sql, params, modo, dictionary)
+
+    async def start_transaction(self):
+        return await self._executar(self._conn.start_transaction)
+
+    async def commit(self):
+        return await self._executar(self._conn.commit)
+
+    async def rollback(self):
+        return await self._executar(self._conn.rollback)
+
+    async def close(self, descartar: bool = False):
+        """Devolve a conexão ao pool; ``descartar=True`` a fecha de vez
+        (ex.: leitura sem buffer interrompida com linhas pendentes)."""
+        if self._fechada:
+            return
+        self._fechada = True
+        try:
+            await self._executar(self._conn.close, descartar)
+        finally:
+            if self._pesado:
+                _semaforo_pesados().release()
+
+
+def _evento_vaga_liberada():
+    global _vaga_liberada
+    if _vaga_liberada is None:
+        loop = asyncio.get_running_loop()
+        evento = asyncio.Event()
+        _pool.ao_liberar(lambda: loop.call_soon_threadsafe(evento.set))
+        _vaga_liberada = evento
+    return _vaga_liberada
+
+
+async def _reservar_vaga():
+    """Espera uma vaga no pool sem ocupar threads; 503 após o timeout."""
+    if _pool.tentar_reservar():
+        _pool.registrar_espera(0.0)
+        return
+    evento = _evento_vaga_liberada()
+    inicio = time.monotonic()
+    limite = inicio + _pool.timeout
+    while True:
+        evento.clear()
+        if _pool.tentar_reservar():
+            _pool.registrar_espera(time.monotonic() - inicio, esperou=True)
+            return
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            _pool.registrar_espera(time.monotonic() - inicio, esperou=True, expirou=True)
+            raise PoolEsgotado()
+        try:
+            await asyncio.wait_for(evento.wait(), restante)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def connect(pesado: bool = False) -> AsyncConnection:
+    """Empresta uma conexão do pool.
+
+    Consultas ``pesado=True`` (relatórios, exportações) disputam um limite
+    próprio, para que vários relatórios simultâneos não ocupem todas as
+    conexões e threads do executor.
+    """
+    if pesado:
+        await _semaforo_pesados().acquire()
+    try:
+        await _reservar_vaga()
+        retirada = _submeter(_pool.retirar)
+        try:
+            conn = await asyncio.wrap_future(retirada)
+        except asyncio.CancelledError:
+            _devolver_apos_cancelamento(retirada)
+            raise
+    except BaseException:
+        if pesado:
+            _semaforo_pesados().release()
+        raise
+    return AsyncConnection(conn, pesado=pesado)
+
+
+def _devolver_apos_cancelamento(retirada):
+    """Quem pediu a conexão foi cancelado (timeout, cliente desconectou).
+
+    Se a retirada não chegou a rodar, só devolve a vaga; se já está na
+    thread, a conexão volta ao pool quando ela terminar.
+    """
+    def devolver(futuro):
+        if futuro.cancelled():
+            _pool.liberar_vaga()
+        elif futuro.exception() is None:
+            futuro.result().close()
+
+    retirada.add_done_callback(devolver)
+
+
+def encerrar():
+    global _executor, _pool
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+    if _pool is not None:
+        _pool.fechar()
+        _pool = None
@@ -0,0 +1,91 @@
+"""Exportação em streaming (CSV e NDJSON) de consultas grandes.
+
+As linhas são lidas num cursor sem buffer, em lotes, e cada lote é
+convertido e enviado antes de o próximo ser buscado: a memória fica no
+tamanho de um lote, seja qual for o total, e o primeiro byte sai assim
+que o banco devolve as primeiras linhas.
+
+A conexão fica com a resposta até o fim do envio. Se o cliente desistir
+no meio, ela é descartada em vez de voltar ao pool com linhas pendentes.
+"""
+import csv
+import io
+
+from fastapi.responses import StreamingResponse
+
+from logs import logger
+from respostas import com_booleanos, para_json, valor_json
+
+FORMATOS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+PADRAO_FORMATO = "^(csv|ndjson)$"
+
+TAMANHO_LOTE = 500
+
+
+async def ler_em_lotes(conn, sql: str, params=None, tamanho: int = TAMANHO_LOTE):
+    """Executa ``sql`` num cursor sem buffer e entrega as linhas em lotes."""
+    cursor = conn.cursor(dictionary=True, buffered=False)
+    try:
+        await cursor.execute(sql, params)
+        while True:
+            lote = await cursor.fetchmany(tamanho)
+            if not lote:
+                break
+            yield lote
+    finally:
+        try:
+            await cursor.close()
+        except Exception:
+            # Linhas não lidas (cliente desistiu): a conexão será descartada
+            pass
+
+
+async def em_csv(lotes):
+    """Converte lotes de linhas em pedaços de CSV, com cabeçalho.
+
+    Começa com BOM para o Excel reconhecer os acentos.
+    """
+    buffer = io.StringIO()
+    escritor = None
+    async for lote in lotes:
+        if escritor is None:
+            buffer.write("\ufeff")
+            escritor = csv.DictWriter(buffer, fieldnames=list(lote[0]))
+            escritor.writeheader()
+        for linha in lote:
+            escritor.writerow({chave: valor_json(valor) for chave, valor in linha.items()})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+async def em_ndjson(lotes, extras: dict = None):
+    """Uma linha JSON por registro (mesma serialização das rotas JSON);
+    ``extras`` entra em todas as linhas."""
+    async for lote in lotes:
+        yield b"".join(para_json({**(extras or {}), **linha}) + b"\n" for linha in com_booleanos(lote))
+
+
+def resposta(conn, partes, formato: str, nome_arquivo: str) -> StreamingResponse:
+    """Envia ``partes`` (texto ou bytes, em gerador assíncrono) e devolve ``conn`` ao terminar."""
+    async def corpo():
+        completo = False
+        try:
+            async for parte in partes:
+                yield parte if isinstance(parte, bytes) else parte.encode("utf-8")
+            completo = True
+        except Exception as e:
+            # O status já foi enviado; só resta registrar e cortar a resposta
+            logger.error(f"❌ Exportação {nome_arquivo}.{formato} interrompida: {e}")
+            raise
+        finally:
+            await conn.close(descartar=not completo)
+
+    return StreamingResponse(
+        corpo(),
+        media_type=FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}.{formato}"'}
+    )
@@ -378,7 +378,7 @@ async function loadReports() {
         
         const [stats, sales, products] = await Promise.allSettled([
             fetchWithRetry('/api/dashboard/estatisticas'),
-            fetchWithRetry('/api/vendas?limite=100'), // Aumentei o limite para ter mais dados para gráficos
+            fetchAllSales(), // Todas as vendas, para os gráficos
             fetchWithRetry('/api/produtos?limite=200')
         ]);
         
@@ -404,6 +404,24 @@ async function loadReports() {
     }
 }
 
+// ✅ TODAS AS VENDAS DO FILTRO: a API devolve no máximo 100 por página,
+// então seguimos o next_cursor até o fim
+async function fetchAllSales(params = '', campos = 'resumo') {
+    const query = new URLSearchParams(params);
+    query.set('limite', '100');
+    query.set('campos', campos);
+    query.set('cursor', '');
+    
+    const vendas = [];
+    while (true) {
+        const pagina = await fetchWithRetry(`/api/vendas?${query}`);
+        vendas.push(...(pagina.vendas || []));
+        if (!pagina.next_cursor) break;
+        query.set('cursor', pagina.next_cursor);
+    }
+    return { vendas };
+}
+
 async function fetchWithRetry(endpoint, retries = CONFIG.maxRetries) {
     for (let i = 0; i < retries; i++) {
         try {
@@ -1607,7 +1625,7 @@ class FilterSystem {
         
         const [stats, sales, products] = await Promise.allSettled([
             fetchWithRetry(`/api/dashboard/estatisticas?${queryParams}`),
-            fetchWithRetry(`/api/vendas?${queryParams}&limite=100`),
+            fetchAllSales(queryParams),
             fetchWithRetry(`/api/produtos?${queryParams}&limite=200`)
         ]);
         
@@ -2027,14 +2045,15 @@ class ExportSystem {
             }
         }
 
-        // Limite maior para exportação
-        params.append('limite', '5000');
+        // Limite maior para exportação (produtos aceitam até 1000; as vendas
+        // vêm todas por fetchAllSales)
+        params.append('limite', '1000');
         
         return params.toString();
     }
 
     async fetchSalesData(params) {
-        const response = await apiCall(`/api/vendas?${params}`);
+        const response = await fetchAllSales(params, 'completo');
         return {
             tipo: 'vendas',
             data_exportacao: new Date().toISOString(),
@@ -2056,7 +2075,7 @@ class ExportSystem {
     async fetchFinancialData(params) {
         // Simular dados financeiros - em produção, teria endpoint específico
         const [vendas, produtos] = await Promise.all([
-            apiCall(`/api/vendas?${params}`).catch(() => ({ vendas: [] })),
+            fetchAllSales(params, 'completo').catch(() => ({ vendas: [] })),
             apiCall(`/api/produtos?${params}`).catch(() => ({ produtos: [] }))
         ]);
 
@@ -2076,7 +2095,7 @@ class ExportSystem {
     async fetchCompleteReport(params) {
         const [stats, vendas, produtos, financeiro] = await Promise.all([
             apiCall('/api/dashboard/estatisticas').catch(() => ({})),
-            apiCall(`/api/vendas?${params}`).catch(() => ({ vendas: [] })),
+            fetchAllSales(params, 'completo').catch(() => ({ vendas: [] })),
             apiCall(`/api/produtos?${params}`).catch(() => ({ produtos: [] })),
             this.fetchFinancialData(params).catch(() => ({}))
         ]);
@@ -0,0 +1,20 @@
+// renovacao_token.js - Renovação automática do token de sessão WebOS Boutique
+// Com WEBOS_SESSION_MODE=token, a API devolve um token novo no cabeçalho
+// X-Session-Token quando o atual já tem alguma idade. Este script envolve
+// o fetch() para guardar o token novo; as próximas chamadas já usam ele.
+(function () {
+    if (window.__renovacaoTokenInstalada) return;
+    window.__renovacaoTokenInstalada = true;
+
+    const fetchOriginal = window.fetch.bind(window);
+
+    window.fetch = async function (...args) {
+        const response = await fetchOriginal(...args);
+        const tokenNovo = response.headers.get('X-Session-Token');
+        if (tokenNovo && localStorage.getItem('session_token')) {
+            localStorage.setItem('session_token', tokenNovo);
+            console.log('🔄 Token de sessão renovado');
+        }
+        return response;
+    };
+})();
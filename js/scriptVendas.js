@@ -95,7 +95,23 @@ class VendasSystem {
             // Mostrar loading
             this.mostrarLoadingHistorico();
 
-            const response = await fetch(`${API_BASE}/api/vendas?limite=50`, {
+            const vendas = await this.buscarTodasVendas(token);
+
+            this.renderHistoricoVendas(vendas);
+
+        } catch (error) {
+            console.error('❌ Erro ao carregar histórico:', error);
+            this.renderErroHistorico(error.message);
+        }
+    }
+
+    // ✅ A API devolve no máximo 100 vendas por página: seguimos o next_cursor
+    // para que a lista e os totais do histórico cubram todas as vendas
+    async buscarTodasVendas(token) {
+        const vendas = [];
+        let cursor = '';
+        do {
+            const response = await fetch(`${API_BASE}/api/vendas?limite=100&cursor=${encodeURIComponent(cursor)}`, {
                 headers: {
                     'Authorization': token,
                     'Content-Type': 'application/json'
@@ -107,14 +123,10 @@ class VendasSystem {
             }
 
             const data = await response.json();
-            const vendas = data.vendas || data || [];
-
-            this.renderHistoricoVendas(vendas);
-
-        } catch (error) {
-            console.error('❌ Erro ao carregar histórico:', error);
-            this.renderErroHistorico(error.message);
-        }
+            vendas.push(...(data.vendas || []));
+            cursor = data.next_cursor;
+        } while (cursor);
+        return vendas;
     }
 
     mostrarLoadingHistorico() {
@@ -0,0 +1,98 @@
+"""Configuração de logs da API.
+
+Os registros passam por um ``QueueHandler``: quem loga só enfileira, e uma
+thread do ``QueueListener`` faz a escrita no stdout, que é bloqueante. O
+formato pode ser texto (desenvolvimento) ou JSON lines (produção), e os
+logs de requisição bem-sucedida podem ser amostrados.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+logger = logging.getLogger("webos")
+logger_requisicoes = logging.getLogger("webos.requisicoes")
+
+_CAMPOS_PADRAO = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName", "amostrar"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro; campos de ``extra`` viram chaves."""
+
+    def format(self, record):
+        dados = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for chave, valor in record.__dict__.items():
+            if chave not in _CAMPOS_PADRAO and not chave.startswith("_"):
+                dados[chave] = valor
+        if record.exc_info:
+            dados["exc"] = self.formatException(record.exc_info)
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class FiltroAmostragem(logging.Filter):
+    """Deixa passar só uma fração dos registros marcados com ``amostrar``.
+
+    Avisos e erros, e registros sem a marca, sempre passam.
+    """
+
+    def __init__(self, taxa: float):
+        super().__init__()
+        self.taxa = taxa
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not getattr(record, "amostrar", False):
+            return True
+        return self.taxa >= 1.0 or random.random() < self.taxa
+
+
+def configurar_logs(nivel: str = "INFO", formato: str = "texto", taxa_amostragem: float = 1.0):
+    global _listener
+    encerrar_logs()
+
+    saida = logging.StreamHandler(sys.stdout)
+    if formato == "json":
+        saida.setFormatter(JsonFormatter())
+    else:
+        saida.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    fila = queue.SimpleQueue()
+    handler = logging.handlers.QueueHandler(fila)
+    handler.addFilter(FiltroAmostragem(taxa_amostragem))
+
+    logger.handlers[:] = [handler]
+    logger.setLevel(nivel.upper())
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(fila, saida, respect_handler_level=False)
+    _listener.start()
+
+
+def encerrar_logs():
+    """Para a thread de escrita e volta a escrever direto no stdout.
+
+    O ``QueueHandler`` sai do logger antes do ``stop``: o que for logado
+    depois (desligamento do uvicorn, tarefas finais) não fica numa fila
+    que ninguém mais lê.
+    """
+    global _listener
+    if _listener is None:
+        return
+    for handler in list(logger.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            logger.removeHandler(handler)
+            for saida in _listener.handlers:
+                for filtro in handler.filters:
+                    saida.addFilter(filtro)
+                logger.addHandler(saida)
+    _listener.stop()
+    _listener = None
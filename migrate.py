@@ -0,0 +1,182 @@
+"""Migrações versionadas do schema.
+
+Os arquivos ``migrations/NNN_descricao.sql`` são aplicados em ordem, uma
+única vez por banco; a tabela ``schema_migrations`` guarda as versões já
+aplicadas. A API roda as pendentes na inicialização, e o mesmo pode ser
+feito pela linha de comando:
+
+    python migrate.py            # aplica as pendentes
+    python migrate.py --status   # lista aplicadas e pendentes
+
+Os arquivos são escritos para o MySQL. No SQLite (``WEBOS_DB_ENGINE=sqlite``)
+cada comando passa por ``banco_sqlite.traduzir_ddl`` antes de rodar.
+"""
+import argparse
+import logging
+import os
+import re
+
+import banco_sqlite
+
+logger = logging.getLogger("webos.migracoes")
+
+PASTA_MIGRACOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+# Tabela já existe (1050), coluna duplicada (1060), índice duplicado (1061):
+# o objeto já foi criado à mão ou por uma execução interrompida.
+ERROS_JA_APLICADO = {1050, 1060, 1061}
+
+# Vários workers sobem juntos; só um aplica as migrações por vez
+NOME_TRAVA = "webos_schema_migrations"
+
+SQL_TABELA_CONTROLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        versao INT NOT NULL PRIMARY KEY,
+        nome VARCHAR(200) NOT NULL,
+        aplicada_em DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB
+"""
+
+_PADRAO_ARQUIVO = re.compile(r"^(\d+)_(.+)\.sql$")
+
+
+def _sqlite(conn) -> bool:
+    return getattr(conn, "dialeto", "mysql") == "sqlite"
+
+
+def _comandos_do_dialeto(conn, comando: str) -> list:
+    return banco_sqlite.traduzir_ddl(comando) if _sqlite(conn) else [comando]
+
+
+def _criar_tabela_controle(conn, cursor):
+    for comando in _comandos_do_dialeto(conn, SQL_TABELA_CONTROLE):
+        cursor.execute(comando)
+
+
+def listar_migracoes(pasta: str = PASTA_MIGRACOES) -> list:
+    """Retorna ``(versao, nome, caminho)`` de cada arquivo, em ordem."""
+    migracoes = []
+    for arquivo in os.listdir(pasta):
+        encontrado = _PADRAO_ARQUIVO.match(arquivo)
+        if encontrado:
+            migracoes.append((int(encontrado.group(1)), arquivo, os.path.join(pasta, arquivo)))
+    migracoes.sort()
+    versoes = [versao for versao, _, _ in migracoes]
+    if len(versoes) != len(set(versoes)):
+        raise RuntimeError(f"Versões de migração repetidas em {pasta}")
+    return migracoes
+
+
+def dividir_comandos(texto: str) -> list:
+    """Separa o arquivo em comandos por ``;``, ignorando comentários ``--``."""
+    linhas = [linha for linha in texto.splitlines() if not linha.strip().startswith("--")]
+    return [comando.strip() for comando in "\n".join(linhas).split(";") if comando.strip()]
+
+
+def versoes_aplicadas(cursor) -> set:
+    cursor.execute("SELECT versao FROM schema_migrations")
+    return {linha[0] for linha in cursor.fetchall()}
+
+
+def _executar_comando(cursor, comando: str, arquivo: str):
+    try:
+        cursor.execute(comando)
+    except Exception as e:
+        if getattr(e, "errno", None) not in ERROS_JA_APLICADO:
+            raise
+        logger.warning(f"⚠️ {arquivo}: objeto já existente, seguindo ({e})")
+
+
+def _travar(conn, cursor):
+    if _sqlite(conn):
+        # BEGIN IMMEDIATE: o próximo worker espera a trava de escrita do arquivo
+        conn.start_transaction()
+        return
+    cursor.execute("SELECT GET_LOCK(%s, 60)", (NOME_TRAVA,))
+    if cursor.fetchone()[0] != 1:
+        raise RuntimeError("Não foi possível obter a trava das migrações")
+
+
+def _destravar(conn, cursor):
+    if _sqlite(conn):
+        return
+    cursor.execute("SELECT RELEASE_LOCK(%s)", (NOME_TRAVA,))
+    cursor.fetchall()
+
+
+def aplicar(conn, pasta: str = PASTA_MIGRACOES) -> list:
+    """Aplica as migrações pendentes numa conexão síncrona do driver.
+
+    Retorna os nomes dos arquivos aplicados. DDL no MySQL faz commit
+    implícito, então cada arquivo é registrado logo após rodar. No SQLite
+    o DDL é transacional: tudo roda numa transação só, que também serve
+    de trava entre os workers.
+    """
+    sqlite = _sqlite(conn)
+    cursor = conn.cursor()
+    try:
+        _travar(conn, cursor)
+        try:
+            _criar_tabela_controle(conn, cursor)
+            aplicadas = versoes_aplicadas(cursor)
+            novas = []
+            for versao, arquivo, caminho in listar_migracoes(pasta):
+                if versao in aplicadas:
+                    continue
+                logger.info(f"🛠️ Aplicando migração {arquivo}")
+                with open(caminho, encoding="utf-8") as f:
+                    comandos = dividir_comandos(f.read())
+                for comando in comandos:
+                    for traduzido in _comandos_do_dialeto(conn, comando):
+                        _executar_comando(cursor, traduzido, arquivo)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (versao, nome) VALUES (%s, %s)",
+                    (versao, arquivo)
+                )
+                if not sqlite:
+                    conn.commit()
+                novas.append(arquivo)
+            if sqlite:
+                conn.commit()
+            return novas
+        finally:
+            _destravar(conn, cursor)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def situacao(conn, pasta: str = PASTA_MIGRACOES) -> list:
+    """Lista ``(arquivo, aplicada)`` de todas as migrações conhecidas."""
+    cursor = conn.cursor()
+    try:
+        _criar_tabela_controle(conn, cursor)
+        aplicadas = versoes_aplicadas(cursor)
+    finally:
+        cursor.close()
+    return [(arquivo, versao in aplicadas) for versao, arquivo, _ in listar_migracoes(pasta)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aplica as migrações do banco do WebOS")
+    parser.add_argument("--status", action="store_true", help="só lista aplicadas e pendentes")
+    args = parser.parse_args()
+
+    from backend import abrir_conexao
+
+    conn = abrir_conexao()
+    try:
+        if args.status:
+            for arquivo, aplicada in situacao(conn):
+                print(f"{'✅' if aplicada else '⏳'} {arquivo}")
+            return
+        novas = aplicar(conn)
+        print(f"✅ {len(novas)} migração(ões) aplicada(s)" if novas else "✅ Banco já está atualizado")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
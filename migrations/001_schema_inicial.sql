@@ -0,0 +1,101 @@
+-- Schema base do WebOS Boutique.
+-- Usa IF NOT EXISTS para que bancos criados antes das migrações
+-- sejam adotados sem erro; as tabelas existentes não são alteradas.
+
+CREATE TABLE IF NOT EXISTS usuarios (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    loja_id INT NOT NULL,
+    nome VARCHAR(100) NOT NULL,
+    email VARCHAR(150) NULL,
+    password VARCHAR(255) NOT NULL,
+    perfil VARCHAR(20) NOT NULL DEFAULT 'vendedor',
+    ativo TINYINT(1) NOT NULL DEFAULT 1,
+    data_criacao DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    KEY idx_usuarios_nome (nome),
+    KEY idx_usuarios_loja (loja_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS produtos (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    loja_id INT NOT NULL,
+    codigo_barras VARCHAR(50) NULL,
+    nome VARCHAR(200) NOT NULL,
+    descricao TEXT NULL,
+    categoria VARCHAR(100) NULL,
+    marca VARCHAR(100) NULL,
+    estoque_atual DECIMAL(10,2) NULL DEFAULT 0,
+    estoque_minimo DECIMAL(10,2) NULL DEFAULT 0,
+    preco_custo DECIMAL(10,2) NULL DEFAULT 0,
+    preco_venda DECIMAL(10,2) NOT NULL,
+    ativo TINYINT(1) NOT NULL DEFAULT 1,
+    categoria_lingerie VARCHAR(100) NULL,
+    subcategoria VARCHAR(100) NULL,
+    tamanho_sutia VARCHAR(20) NULL,
+    tamanho_calcinha VARCHAR(20) NULL,
+    cor VARCHAR(50) NULL,
+    material VARCHAR(100) NULL,
+    colecao VARCHAR(100) NULL,
+    data_cadastro DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    data_atualizacao DATETIME NULL ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS clientes (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    loja_id INT NOT NULL,
+    nome VARCHAR(200) NOT NULL,
+    email VARCHAR(150) NULL,
+    telefone VARCHAR(30) NOT NULL,
+    cpf VARCHAR(14) NULL,
+    endereco VARCHAR(255) NULL,
+    cidade VARCHAR(100) NULL,
+    estado VARCHAR(50) NULL,
+    observacoes TEXT NULL,
+    ativo TINYINT(1) NOT NULL DEFAULT 1,
+    data_cadastro DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    data_atualizacao DATETIME NULL ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS vendas (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    loja_id INT NOT NULL,
+    numero_venda VARCHAR(20) NOT NULL,
+    cliente VARCHAR(200) NULL,
+    cliente_id INT NULL,
+    total_venda DECIMAL(10,2) NOT NULL DEFAULT 0,
+    total_pago DECIMAL(10,2) NULL,
+    forma_pagamento VARCHAR(30) NULL,
+    observacoes TEXT NULL,
+    data_venda DATETIME NOT NULL,
+    vendedor_id INT NULL,
+    usuario_id INT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'concluida'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS itens_venda (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    venda_id INT NOT NULL,
+    produto_id INT NULL,
+    produto_nome VARCHAR(200) NULL,
+    quantidade INT NOT NULL,
+    valor_unitario DECIMAL(10,2) NOT NULL,
+    total_item DECIMAL(10,2) NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS fechamento_caixa (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    loja_id INT NOT NULL,
+    data DATE NOT NULL,
+    valor_inicial DECIMAL(10,2) NOT NULL DEFAULT 0,
+    valor_final DECIMAL(10,2) NOT NULL DEFAULT 0,
+    total_vendas DECIMAL(10,2) NOT NULL DEFAULT 0,
+    total_entradas DECIMAL(10,2) NOT NULL DEFAULT 0,
+    total_saidas DECIMAL(10,2) NOT NULL DEFAULT 0,
+    total_os_entregues DECIMAL(10,2) NULL DEFAULT 0,
+    observacoes TEXT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'aberto',
+    reaberto_por INT NULL,
+    data_reabertura DATETIME NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    KEY idx_fechamento_usuario_data (user_id, data, loja_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,6 @@
+-- Contador de números de venda por loja (ver proximo_numero_venda).
+
+CREATE TABLE IF NOT EXISTS sequencias_venda (
+    loja_id INT NOT NULL PRIMARY KEY,
+    ultimo_numero INT UNSIGNED NOT NULL DEFAULT 0
+) ENGINE=InnoDB;
@@ -0,0 +1,8 @@
+-- Índices para os filtros por período do dashboard e dos relatórios.
+-- As consultas usam intervalos semiabertos em data_venda
+-- (data_venda >= inicio AND data_venda < fim), que aproveitam
+-- o índice composto (loja_id, data_venda).
+
+CREATE INDEX idx_vendas_loja_data ON vendas (loja_id, data_venda);
+
+CREATE INDEX idx_vendas_loja_status ON vendas (loja_id, status);
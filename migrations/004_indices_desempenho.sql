@@ -0,0 +1,19 @@
+-- Índices dos caminhos quentes da API.
+
+-- Listagem e busca de produtos ativos ordenada por nome
+CREATE INDEX idx_produtos_loja_ativo_nome ON produtos (loja_id, ativo, nome);
+
+-- Leitura de código de barras no PDV
+CREATE INDEX idx_produtos_loja_codigo ON produtos (loja_id, codigo_barras);
+
+-- Itens de uma venda (detalhe, edição, cancelamento)
+CREATE INDEX idx_itens_venda_venda ON itens_venda (venda_id);
+
+-- Junções de relatórios por produto
+CREATE INDEX idx_itens_venda_produto ON itens_venda (produto_id);
+
+-- Busca de cliente por CPF
+CREATE INDEX idx_clientes_loja_cpf ON clientes (loja_id, cpf);
+
+-- Consulta por número e semente da sequência de vendas
+CREATE INDEX idx_vendas_loja_numero ON vendas (loja_id, numero_venda);
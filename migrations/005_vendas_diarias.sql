@@ -0,0 +1,31 @@
+-- Agregado diário de vendas por loja e forma de pagamento (ver agregados.py).
+-- Vendas canceladas não entram. A carga inicial parte do histórico atual;
+-- depois disso o agregado é mantido pelas rotas de venda.
+
+CREATE TABLE IF NOT EXISTS vendas_diarias (
+    loja_id INT NOT NULL,
+    dia DATE NOT NULL,
+    forma_pagamento VARCHAR(30) NOT NULL DEFAULT '',
+    quantidade_vendas INT NOT NULL DEFAULT 0,
+    valor_total DECIMAL(14,2) NOT NULL DEFAULT 0,
+    itens_vendidos DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (loja_id, dia, forma_pagamento)
+) ENGINE=InnoDB;
+
+DELETE FROM vendas_diarias;
+
+INSERT INTO vendas_diarias
+    (loja_id, dia, forma_pagamento, quantidade_vendas, valor_total, itens_vendidos)
+SELECT
+    v.loja_id,
+    DATE(v.data_venda),
+    COALESCE(v.forma_pagamento, ''),
+    COUNT(*),
+    COALESCE(SUM(v.total_venda), 0),
+    COALESCE(SUM(i.itens), 0)
+FROM vendas v
+LEFT JOIN (
+    SELECT venda_id, SUM(quantidade) AS itens FROM itens_venda GROUP BY venda_id
+) i ON i.venda_id = v.id
+WHERE COALESCE(v.status, 'concluida') <> 'cancelada'
+GROUP BY v.loja_id, DATE(v.data_venda), COALESCE(v.forma_pagamento, '');
@@ -0,0 +1,8 @@
+-- Versão do catálogo de produtos por loja (ver catalogo.py).
+-- Incrementada em toda escrita que muda produtos ou estoque; os workers
+-- comparam com a versão em memória para saber quando recarregar.
+
+CREATE TABLE IF NOT EXISTS catalogo_versoes (
+    loja_id INT NOT NULL PRIMARY KEY,
+    versao BIGINT UNSIGNED NOT NULL DEFAULT 0
+) ENGINE=InnoDB;
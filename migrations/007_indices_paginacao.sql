@@ -0,0 +1,8 @@
+-- Paginação por chave (cursor): a ordenação da listagem sai do índice,
+-- com o id (chave primária) implícito no fim de cada índice secundário.
+
+-- Clientes por (nome, id)
+CREATE INDEX idx_clientes_loja_nome ON clientes (loja_id, nome);
+
+-- Vendas de um vendedor por (data_venda, id), da mais recente para trás
+CREATE INDEX idx_vendas_loja_usuario_data ON vendas (loja_id, usuario_id, data_venda);
@@ -0,0 +1,3 @@
+-- Listagem de vendas filtrada por status (ex.: só canceladas), paginada por
+-- (data_venda, id) sem percorrer as vendas dos outros status.
+CREATE INDEX idx_vendas_loja_status_data ON vendas (loja_id, status, data_venda);
@@ -0,0 +1,29 @@
+-- Agregado diário de vendas por produto (ver agregados.py), base do ranking
+-- de mais vendidos. Vendas canceladas não entram. A carga inicial parte do
+-- histórico atual; depois disso o agregado é mantido pelas rotas de venda.
+
+CREATE TABLE IF NOT EXISTS produtos_vendas_diarias (
+    loja_id INT NOT NULL,
+    dia DATE NOT NULL,
+    produto_id INT NOT NULL,
+    quantidade INT NOT NULL DEFAULT 0,
+    valor_total DECIMAL(14,2) NOT NULL DEFAULT 0,
+    itens INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (loja_id, dia, produto_id)
+) ENGINE=InnoDB;
+
+DELETE FROM produtos_vendas_diarias;
+
+INSERT INTO produtos_vendas_diarias
+    (loja_id, dia, produto_id, quantidade, valor_total, itens)
+SELECT
+    v.loja_id,
+    DATE(v.data_venda),
+    iv.produto_id,
+    COALESCE(SUM(iv.quantidade), 0),
+    COALESCE(SUM(iv.total_item), 0),
+    COUNT(*)
+FROM itens_venda iv
+INNER JOIN vendas v ON iv.venda_id = v.id
+WHERE COALESCE(v.status, 'concluida') <> 'cancelada' AND iv.produto_id IS NOT NULL
+GROUP BY v.loja_id, DATE(v.data_venda), iv.produto_id;
@@ -0,0 +1,10 @@
+-- Lista de revogação dos tokens de sessão assinados (ver tokens.py).
+-- chave: jti de um token (logout) ou "usuario:<id>" (todos os tokens do
+-- usuário emitidos até revogado_em). Instantes em segundos desde epoch.
+
+CREATE TABLE IF NOT EXISTS sessoes_revogadas (
+    chave VARCHAR(64) NOT NULL PRIMARY KEY,
+    revogado_em DOUBLE NOT NULL,
+    expira_em DOUBLE NOT NULL,
+    KEY idx_sessoes_revogadas_expira (expira_em)
+) ENGINE=InnoDB;
@@ -0,0 +1,10 @@
+-- Semeia a sequência de números de venda de cada loja já existente
+-- (usuários ou vendas), a partir do maior número usado. Com a linha
+-- presente, proximo_numero_venda reserva o número num único UPDATE.
+-- Linhas já criadas pela API são mantidas.
+
+INSERT IGNORE INTO sequencias_venda (loja_id, ultimo_numero)
+SELECT l.loja_id, COALESCE(MAX(CAST(SUBSTRING(v.numero_venda, 2) AS UNSIGNED)), 0)
+FROM (SELECT loja_id FROM usuarios UNION SELECT loja_id FROM vendas) l
+LEFT JOIN vendas v ON v.loja_id = l.loja_id
+GROUP BY l.loja_id;
@@ -0,0 +1,76 @@
+"""Paginação por chave (keyset) com cursor opaco.
+
+Em vez de ``LIMIT n OFFSET m``, a página seguinte começa depois da última
+linha entregue: ``WHERE (nome, id) > (%s, %s) ORDER BY nome, id LIMIT n``.
+Com um índice que cubra a ordenação, a página 1000 custa o mesmo que a
+primeira. O cliente recebe ``next_cursor`` e o devolve como está; o
+conteúdo (JSON em base64) não faz parte do contrato da API.
+"""
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from fastapi import HTTPException
+
+
+def _para_json(valor):
+    if isinstance(valor, datetime):
+        return {"dt": valor.isoformat(sep=" ")}
+    if isinstance(valor, date):
+        return {"d": valor.isoformat()}
+    if isinstance(valor, Decimal):
+        return {"n": str(valor)}
+    raise TypeError(f"Valor não suportado no cursor: {type(valor).__name__}")
+
+
+def _de_json(objeto):
+    if "dt" in objeto:
+        return datetime.fromisoformat(objeto["dt"])
+    if "d" in objeto:
+        return date.fromisoformat(objeto["d"])
+    if "n" in objeto:
+        return Decimal(objeto["n"])
+    return objeto
+
+
+def codificar(valores: list) -> str:
+    texto = json.dumps(valores, default=_para_json, separators=(",", ":"))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip("=")
+
+
+def decodificar(cursor: str, quantidade: int) -> list:
+    """Valores da chave guardados no cursor; 400 se vier adulterado."""
+    try:
+        texto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        valores = json.loads(texto, object_hook=_de_json)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor de paginação inválido")
+    if not isinstance(valores, list) or len(valores) != quantidade:
+        raise HTTPException(status_code=400, detail="Cursor de paginação inválido")
+    return valores
+
+
+def condicao(colunas: tuple, cursor: str, decrescente: bool = False):
+    """``(sql, params)`` que pula tudo até a última linha da página anterior."""
+    valores = decodificar(cursor, len(colunas))
+    sinal = "<" if decrescente else ">"
+    marcadores = ", ".join(["%s"] * len(colunas))
+    return f"({', '.join(colunas)}) {sinal} ({marcadores})", valores
+
+
+def ordenacao(colunas: tuple, decrescente: bool = False) -> str:
+    direcao = " DESC" if decrescente else ""
+    return ", ".join(f"{coluna}{direcao}" for coluna in colunas)
+
+
+def fatiar(linhas: list, limite: int, chaves: tuple):
+    """Corta as ``limite + 1`` linhas lidas e gera o cursor da próxima página.
+
+    ``chaves`` são os nomes das chaves nas linhas (sem prefixo de tabela).
+    """
+    if len(linhas) <= limite:
+        return linhas, None
+    linhas = linhas[:limite]
+    ultima = linhas[-1]
+    return linhas, codificar([ultima[chave] for chave in chaves])
@@ -0,0 +1,326 @@
+"""Repositórios de produtos, vendas, clientes e usuários.
+
+Cada repositório recebe o ``Contexto`` da requisição e roda as consultas na
+conexão dele como prepared statements: o pool guarda os cursores
+preparados de cada conexão física (``database``), então o servidor analisa
+uma consulta uma vez por conexão e depois só recebe os parâmetros. Por isso
+as consultas daqui têm texto fixo; as que variam (UPDATE parcial, lista de
+ids) geram poucas formas diferentes.
+
+As projeções de colunas também ficam aqui, compartilhadas pelas rotas.
+Listagens com filtros e cursor, baixa de estoque em lote e relatórios
+continuam no backend com cursores comuns.
+"""
+
+# Numéricos nulos saem como 0, como o frontend espera
+COLUNAS_PRODUTO = """id, loja_id, codigo_barras, nome, descricao, categoria, marca,
+                   COALESCE(estoque_atual, 0) AS estoque_atual,
+                   COALESCE(estoque_minimo, 0) AS estoque_minimo,
+                   COALESCE(preco_custo, 0) AS preco_custo,
+                   preco_venda, ativo, data_cadastro, data_atualizacao"""
+
+# Listagem + atributos de lingerie/moda (cadastro, edição e detalhe)
+COLUNAS_PRODUTO_DETALHE = COLUNAS_PRODUTO + """,
+                   subcategoria, tamanho_sutia, tamanho_calcinha, cor, material, colecao"""
+
+# Campos editáveis, na ordem das colunas do INSERT/UPDATE
+CAMPOS_PRODUTO = (
+    "codigo_barras", "nome", "descricao", "categoria", "marca",
+    "estoque_atual", "estoque_minimo", "preco_custo", "preco_venda", "ativo",
+    "subcategoria", "tamanho_sutia", "tamanho_calcinha", "cor", "material", "colecao",
+)
+
+COLUNAS_CLIENTE = """id, loja_id, nome, email, telefone, cpf, endereco, cidade, estado,
+                   observacoes, ativo, data_cadastro, data_atualizacao"""
+
+CAMPOS_CLIENTE = ("nome", "email", "telefone", "cpf", "endereco", "cidade", "estado", "observacoes", "ativo")
+
+COLUNAS_USUARIO = "id, loja_id, nome, email, perfil, ativo, data_criacao"
+
+CAMPOS_USUARIO = ("nome", "email", "perfil", "ativo", "password")
+
+# Maior lote de ids num IN; lotes menores são completados até a próxima
+# potência de 2, para a consulta ter no máximo 11 formas preparadas
+LOTE_IDS = 1024
+
+
+def _lote_completo(ids: list) -> list:
+    tamanho = 1
+    while tamanho < len(ids):
+        tamanho *= 2
+    return ids + [ids[-1]] * (tamanho - len(ids))
+
+
+def _marcadores(quantidade: int) -> str:
+    return ", ".join(["%s"] * quantidade)
+
+
+class Repositorio:
+    def __init__(self, ctx):
+        self.ctx = ctx
+
+    async def _todos(self, sql: str, params=()) -> list:
+        return await self.ctx.preparado(sql, params)
+
+    async def _um(self, sql: str, params=()):
+        return await self.ctx.preparado(sql, params, modo="um")
+
+    async def _escrever(self, sql: str, params=()):
+        """``(linhas_afetadas, id_inserido)``"""
+        return await self.ctx.preparado(sql, params, modo="escrita")
+
+    async def _atualizar_campos(self, tabela: str, loja_id: int, registro_id: int,
+                                campos: dict, extra: str = "") -> int:
+        """UPDATE só dos ``campos`` informados; a ordem segue a do dicionário."""
+        atribuicoes = ", ".join(f"{campo} = %s" for campo in campos) + extra
+        linhas, _ = await self._escrever(
+            f"UPDATE {tabela} SET {atribuicoes} WHERE id = %s AND loja_id = %s",
+            [*campos.values(), registro_id, loja_id]
+        )
+        return linhas
+
+
+def campos_informados(dados, nomes: tuple) -> dict:
+    """Campos de ``dados`` (modelo pydantic) diferentes de ``None``, na ordem de ``nomes``."""
+    campos = {}
+    for nome in nomes:
+        valor = getattr(dados, nome, None)
+        if valor is not None:
+            campos[nome] = valor
+    return campos
+
+
+class ProdutoRepo(Repositorio):
+    async def buscar(self, loja_id: int, produto_id: int, so_ativos: bool = False):
+        filtro = " AND ativo = 1" if so_ativos else ""
+        return await self._um(
+            f"SELECT {COLUNAS_PRODUTO_DETALHE} FROM produtos WHERE id = %s AND loja_id = %s{filtro}",
+            (produto_id, loja_id)
+        )
+
+    async def por_ids(self, loja_id: int, ids: list) -> list:
+        """Linhas dos produtos ``ids``, na mesma ordem da lista."""
+        linhas = {}
+        for inicio in range(0, len(ids), LOTE_IDS):
+            lote = _lote_completo(ids[inicio:inicio + LOTE_IDS])
+            for linha in await self._todos(
+                f"SELECT {COLUNAS_PRODUTO} FROM produtos WHERE loja_id = %s AND id IN ({_marcadores(len(lote))})",
+                [loja_id, *lote]
+            ):
+                linhas[linha['id']] = linha
+        return [linhas[produto_id] for produto_id in ids if produto_id in linhas]
+
+    async def existe(self, loja_id: int, produto_id: int) -> bool:
+        return await self._um(
+            "SELECT id FROM produtos WHERE id = %s AND loja_id = %s", (produto_id, loja_id)
+        ) is not None
+
+    async def codigo_em_uso(self, loja_id: int, codigo_barras: str, exceto_id: int = 0) -> bool:
+        return await self._um(
+            "SELECT id FROM produtos WHERE codigo_barras = %s AND loja_id = %s AND id != %s",
+            (codigo_barras, loja_id, exceto_id)
+        ) is not None
+
+    async def inserir(self, loja_id: int, dados) -> int:
+        _, produto_id = await self._escrever(
+            f"INSERT INTO produtos (loja_id, {', '.join(CAMPOS_PRODUTO)}) "
+            f"VALUES (%s, {_marcadores(len(CAMPOS_PRODUTO))})",
+            [loja_id, *(getattr(dados, campo) for campo in CAMPOS_PRODUTO)]
+        )
+        return produto_id
+
+    async def atualizar(self, loja_id: int, produto_id: int, campos: dict) -> int:
+        return await self._atualizar_campos(
+            "produtos", loja_id, produto_id, campos, ", data_atualizacao = CURRENT_TIMESTAMP"
+        )
+
+    async def desativar(self, loja_id: int, produto_id: int) -> int:
+        linhas, _ = await self._escrever(
+            "UPDATE produtos SET ativo = 0, data_atualizacao = CURRENT_TIMESTAMP WHERE id = %s AND loja_id = %s",
+            (produto_id, loja_id)
+        )
+        return linhas
+
+
+class VendaRepo(Repositorio):
+    async def recentes(self, loja_id: int, limite: int = 5) -> list:
+        return await self._todos("""
+            SELECT v.id, v.numero_venda, v.cliente, v.total_venda, v.forma_pagamento,
+                   v.data_venda, u.nome as vendedor
+            FROM vendas v
+            LEFT JOIN usuarios u ON v.usuario_id = u.id
+            WHERE v.loja_id = %s
+            ORDER BY v.data_venda DESC
+            LIMIT %s
+        """, (loja_id, limite))
+
+    async def buscar(self, loja_id: int, venda_id: int):
+        return await self._um("""
+            SELECT v.id, v.numero_venda, v.cliente, v.total_venda, v.forma_pagamento,
+                   v.observacoes, v.data_venda, v.usuario_id, v.loja_id,
+                   COALESCE(v.status, 'concluida') as status,
+                   u.nome as usuario_nome
+            FROM vendas v
+            LEFT JOIN usuarios u ON v.usuario_id = u.id
+            WHERE v.id = %s AND v.loja_id = %s
+        """, (venda_id, loja_id))
+
+    async def itens(self, venda_id: int) -> list:
+        """Itens com código e categoria do produto, para a tela de detalhe."""
+        return await self._todos("""
+            SELECT iv.id, iv.produto_nome as produto, iv.quantidade,
+                   iv.valor_unitario as preco_unitario, iv.total_item as preco_total,
+                   p.codigo_barras, p.categoria
+            FROM itens_venda iv
+            LEFT JOIN produtos p ON iv.produto_id = p.id
+            WHERE iv.venda_id = %s
+            ORDER BY iv.id
+        """, (venda_id,))
+
+    async def travar(self, loja_id: int, venda_id: int):
+        """Linha da venda travada até o fim da transação (edição/cancelamento)."""
+        return await self._um("""
+            SELECT id, status, numero_venda, data_venda, forma_pagamento, total_venda
+            FROM vendas WHERE id = %s AND loja_id = %s FOR UPDATE
+        """, (venda_id, loja_id))
+
+    async def itens_para_estorno(self, venda_id: int) -> list:
+        """``produto_id``, ``quantidade`` e ``total_item`` de cada item."""
+        return await self._todos(
+            "SELECT produto_id, quantidade, total_item FROM itens_venda WHERE venda_id = %s",
+            (venda_id,)
+        )
+
+    async def remover_itens(self, venda_id: int) -> int:
+        linhas, _ = await self._escrever("DELETE FROM itens_venda WHERE venda_id = %s", (venda_id,))
+        return linhas
+
+    async def inserir(self, loja_id: int, numero_venda: str, dados, vendedor_id: int, status: str) -> int:
+        _, venda_id = await self._escrever("""
+            INSERT INTO vendas
+            (loja_id, numero_venda, cliente, total_venda, total_pago, forma_pagamento,
+             observacoes, data_venda, vendedor_id, usuario_id, status)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, (
+            loja_id, numero_venda, dados.cliente, dados.total_venda, dados.total_venda,
+            dados.forma_pagamento, dados.observacoes, dados.data_venda,
+            vendedor_id, dados.usuario_id, status
+        ))
+        return venda_id
+
+    async def atualizar(self, loja_id: int, venda_id: int, dados) -> int:
+        linhas, _ = await self._escrever("""
+            UPDATE vendas
+            SET cliente = %s, total_venda = %s, forma_pagamento = %s, observacoes = %s,
+                data_venda = %s, usuario_id = %s, status = 'concluida'
+            WHERE id = %s AND loja_id = %s
+        """, (
+            dados.cliente, dados.total_venda, dados.forma_pagamento, dados.observacoes,
+            dados.data_venda, dados.usuario_id, venda_id, loja_id
+        ))
+        return linhas
+
+    async def cancelar(self, loja_id: int, venda_id: int) -> int:
+        linhas, _ = await self._escrever(
+            "UPDATE vendas SET status = 'cancelada' WHERE id = %s AND loja_id = %s",
+            (venda_id, loja_id)
+        )
+        return linhas
+
+
+class ClienteRepo(Repositorio):
+    async def buscar(self, loja_id: int, cliente_id: int):
+        return await self._um(
+            f"SELECT {COLUNAS_CLIENTE} FROM clientes WHERE id = %s AND loja_id = %s",
+            (cliente_id, loja_id)
+        )
+
+    async def cpf_em_uso(self, loja_id: int, cpf: str, exceto_id: int = 0) -> bool:
+        return await self._um(
+            "SELECT id FROM clientes WHERE cpf = %s AND loja_id = %s AND id != %s",
+            (cpf, loja_id, exceto_id)
+        ) is not None
+
+    async def tem_vendas(self, loja_id: int, cliente_id: int) -> bool:
+        return await self._um(
+            "SELECT id FROM vendas WHERE cliente_id = %s AND loja_id = %s LIMIT 1",
+            (cliente_id, loja_id)
+        ) is not None
+
+    async def inserir(self, loja_id: int, dados) -> int:
+        _, cliente_id = await self._escrever(
+            f"INSERT INTO clientes (loja_id, {', '.join(CAMPOS_CLIENTE)}) "
+            f"VALUES (%s, {_marcadores(len(CAMPOS_CLIENTE))})",
+            [loja_id, *(getattr(dados, campo) for campo in CAMPOS_CLIENTE)]
+        )
+        return cliente_id
+
+    async def atualizar(self, loja_id: int, cliente_id: int, campos: dict) -> int:
+        return await self._atualizar_campos(
+            "clientes", loja_id, cliente_id, campos, ", data_atualizacao = CURRENT_TIMESTAMP"
+        )
+
+    async def desativar(self, loja_id: int, cliente_id: int) -> int:
+        linhas, _ = await self._escrever(
+            "UPDATE clientes SET ativo = 0, data_atualizacao = CURRENT_TIMESTAMP WHERE id = %s AND loja_id = %s",
+            (cliente_id, loja_id)
+        )
+        return linhas
+
+    async def excluir(self, loja_id: int, cliente_id: int) -> int:
+        linhas, _ = await self._escrever(
+            "DELETE FROM clientes WHERE id = %s AND loja_id = %s", (cliente_id, loja_id)
+        )
+        return linhas
+
+
+class UsuarioRepo(Repositorio):
+    async def listar(self, loja_id: int) -> list:
+        return await self._todos(
+            f"SELECT {COLUNAS_USUARIO} FROM usuarios WHERE loja_id = %s ORDER BY nome", (loja_id,)
+        )
+
+    async def buscar(self, loja_id: int, usuario_id: int):
+        return await self._um(
+            f"SELECT {COLUNAS_USUARIO} FROM usuarios WHERE id = %s AND loja_id = %s",
+            (usuario_id, loja_id)
+        )
+
+    async def existe(self, loja_id: int, usuario_id: int) -> bool:
+        return await self._um(
+            "SELECT id FROM usuarios WHERE id = %s AND loja_id = %s", (usuario_id, loja_id)
+        ) is not None
+
+    async def nome_em_uso(self, loja_id: int, nome: str) -> bool:
+        return await self._um(
+            "SELECT id FROM usuarios WHERE nome = %s AND loja_id = %s", (nome, loja_id)
+        ) is not None
+
+    async def email_em_uso(self, loja_id: int, email: str) -> bool:
+        return await self._um(
+            "SELECT id FROM usuarios WHERE email = %s AND loja_id = %s", (email, loja_id)
+        ) is not None
+
+    async def credenciais(self, nome: str) -> list:
+        """Usuários com ``nome`` (qualquer loja), com o hash da senha, para o login."""
+        return await self._todos(
+            "SELECT id, nome, password, perfil, loja_id FROM usuarios WHERE nome = %s", (nome,)
+        )
+
+    async def inserir(self, loja_id: int, dados, hash_senha: str) -> int:
+        _, usuario_id = await self._escrever("""
+            INSERT INTO usuarios (loja_id, nome, email, password, perfil, ativo, data_criacao)
+            VALUES (%s, %s, %s, %s, %s, %s, NOW())
+        """, (loja_id, dados.nome, dados.email, hash_senha, dados.perfil, dados.ativo))
+        return usuario_id
+
+    async def atualizar(self, loja_id: int, usuario_id: int, campos: dict) -> int:
+        return await self._atualizar_campos("usuarios", loja_id, usuario_id, campos)
+
+    async def regravar_senha(self, usuario_id: int, hash_antigo: str, hash_novo: str) -> int:
+        """Troca o hash só se ninguém o alterou desde a leitura."""
+        linhas, _ = await self._escrever(
+            "UPDATE usuarios SET password = %s WHERE id = %s AND password = %s",
+            (hash_novo, usuario_id, hash_antigo)
+        )
+        return linhas
@@ -0,0 +1,79 @@
+"""Serialização das respostas JSON da API.
+
+Com ``orjson`` instalado, datetime e date saem em ISO 8601 direto do
+encoder em C e Decimal vira float. Sem ele, cai no ``json`` da biblioteca
+padrão, com as mesmas conversões.
+
+Rotas que devolvem linhas do banco retornam ``resposta(dados)``: o
+objeto já é uma Response, então o FastAPI não passa os dados pelo
+``jsonable_encoder`` nem por validação de ``response_model``. Por isso
+colunas TINYINT(1) como ``ativo``, que o driver lê como 0/1, passam por
+``com_booleanos`` antes: o frontend compara com ``false``.
+"""
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+    orjson = None
+
+
+def _converter(valor):
+    """Tipos que o encoder não conhece nativamente."""
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime, date, time)):
+        return valor.isoformat()
+    if isinstance(valor, timedelta):
+        return valor.total_seconds()
+    if isinstance(valor, (set, frozenset, tuple)):
+        return list(valor)
+    if isinstance(valor, (bytes, bytearray)):
+        return valor.decode("utf-8", errors="replace")
+    if hasattr(valor, "model_dump"):
+        return valor.model_dump(mode="json")
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+if orjson is not None:
+    _OPCOES = orjson.OPT_NON_STR_KEYS
+
+    def para_json(conteudo) -> bytes:
+        return orjson.dumps(conteudo, default=_converter, option=_OPCOES)
+else:
+    def para_json(conteudo) -> bytes:
+        return json.dumps(conteudo, default=_converter, ensure_ascii=False,
+                          separators=(",", ":")).encode("utf-8")
+
+
+def valor_json(valor):
+    """``valor`` como sai no JSON da API, para formatos sem encoder (CSV)."""
+    if valor is None or isinstance(valor, (str, int, float, bool)):
+        return valor
+    return _converter(valor)
+
+
+class RespostaJSON(JSONResponse):
+    def render(self, content) -> bytes:
+        return para_json(content)
+
+
+# Colunas TINYINT(1) que a API devolve como true/false
+COLUNAS_BOOLEANAS = ("ativo",)
+
+
+def com_booleanos(linhas, colunas=COLUNAS_BOOLEANAS):
+    """Converte ``colunas`` para bool, no lugar, numa linha ou lista de linhas."""
+    for linha in ([linhas] if isinstance(linhas, dict) else linhas or ()):
+        for coluna in colunas:
+            if linha.get(coluna) is not None:
+                linha[coluna] = bool(linha[coluna])
+    return linhas
+
+
+def resposta(conteudo, status_code: int = 200, headers: dict = None) -> RespostaJSON:
+    return RespostaJSON(conteudo, status_code=status_code, headers=headers)
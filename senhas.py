@@ -0,0 +1,180 @@
+"""Senhas dos usuários: hash scrypt, verificação e limite de tentativas.
+
+Senhas novas são gravadas como ``scrypt$N$r$p$sal$hash`` (base64). Linhas
+antigas, com SHA-256 em hexadecimal ou texto puro, continuam aceitas; no
+primeiro login certo ``verificar`` avisa que o hash deve ser regravado.
+
+O scrypt é caro de propósito (memória e CPU), então roda num pool de
+threads próprio com tamanho fixo e uma fila limitada: numa avalanche de
+logins (abertura da loja) o custo por processo fica limitado a
+``threads`` hashes simultâneos, e o excedente recebe ``ServicoOcupado``
+em vez de acumular. Logins repetidos com a mesma senha reaproveitam a
+verificação anterior por alguns minutos (``CacheTTL``), enquanto o hash
+gravado no banco não mudar.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import re
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cache
+
+PREFIXO = "scrypt"
+
+_SHA256_HEX = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ServicoOcupado(Exception):
+    """Fila de hashing cheia; quem chamou deve responder 503."""
+
+
+def _b64(dados: bytes) -> str:
+    return base64.b64encode(dados).decode("ascii")
+
+
+class ServicoSenhas:
+    def __init__(self, n: int = 2 ** 14, r: int = 8, p: int = 1, threads: int = 2,
+                 max_fila: int = 32, cache_segundos: float = 300):
+        self.n, self.r, self.p = n, r, p
+        self.threads = max(1, threads)
+        self.max_fila = max_fila
+        self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="senhas")
+        self._em_uso = 0
+        self._chave_cache = secrets.token_bytes(32)
+        self._verificadas = cache.CacheTTL(cache_segundos)
+        self._hash_ficticio = None
+        self._contadores = {"hashes": 0, "cache": 0, "atualizadas": 0, "recusadas": 0}
+
+    # ---------- síncrono (roda no pool) ----------
+
+    def _scrypt(self, senha: str, sal: bytes, n: int, r: int, p: int) -> bytes:
+        return hashlib.scrypt(senha.encode("utf-8"), salt=sal, n=n, r=r, p=p,
+                              maxmem=256 * n * r * p, dklen=32)
+
+    def gerar_hash_sync(self, senha: str) -> str:
+        sal = secrets.token_bytes(16)
+        derivada = self._scrypt(senha, sal, self.n, self.r, self.p)
+        return f"{PREFIXO}${self.n}${self.r}${self.p}${_b64(sal)}${_b64(derivada)}"
+
+    def conferir_sync(self, senha: str, armazenado: str):
+        """``(confere, precisa_atualizar)`` para ``senha`` contra o valor gravado."""
+        armazenado = armazenado or ""
+        if armazenado.startswith(PREFIXO + "$"):
+            try:
+                _, n, r, p, sal, derivada = armazenado.split("$")
+                n, r, p = int(n), int(r), int(p)
+                calculada = self._scrypt(senha, base64.b64decode(sal), n, r, p)
+            except ValueError:
+                return False, False
+            confere = hmac.compare_digest(calculada, base64.b64decode(derivada))
+            return confere, confere and (n, r, p) != (self.n, self.r, self.p)
+        if _SHA256_HEX.match(armazenado):
+            calculada = hashlib.sha256(senha.encode()).hexdigest()
+            return hmac.compare_digest(calculada, armazenado), True
+        # Texto puro (linhas muito antigas)
+        confere = bool(armazenado) and hmac.compare_digest(senha.encode("utf-8"), armazenado.encode("utf-8"))
+        return confere, True
+
+    # ---------- assíncrono ----------
+
+    async def _no_pool(self, funcao, *args):
+        if self._em_uso >= self.threads + self.max_fila:
+            self._contadores["recusadas"] += 1
+            raise ServicoOcupado()
+        self._em_uso += 1
+        try:
+            self._contadores["hashes"] += 1
+            return await asyncio.get_running_loop().run_in_executor(self._pool, funcao, *args)
+        finally:
+            self._em_uso -= 1
+
+    async def gerar_hash(self, senha: str) -> str:
+        return await self._no_pool(self.gerar_hash_sync, senha)
+
+    def _chave(self, nome: str, senha: str) -> bytes:
+        return hmac.new(self._chave_cache, f"{nome}\0{senha}".encode("utf-8"), hashlib.sha256).digest()
+
+    async def verificar(self, nome: str, senha: str, armazenado: str):
+        """``(confere, precisa_atualizar)``, usando a verificação recente se houver."""
+        chave = self._chave(nome, senha)
+        if armazenado and self._verificadas.get(chave) == armazenado:
+            self._contadores["cache"] += 1
+            return True, False
+        confere, precisa_atualizar = await self._no_pool(self.conferir_sync, senha, armazenado)
+        if confere and not precisa_atualizar:
+            self._verificadas.set(chave, armazenado)
+        return confere, precisa_atualizar
+
+    def lembrar(self, nome: str, senha: str, armazenado: str):
+        """Registra ``armazenado`` (recém-regravado) como verificado para ``senha``."""
+        self._verificadas.set(self._chave(nome, senha), armazenado)
+        self._contadores["atualizadas"] += 1
+
+    async def gastar_tempo(self, senha: str):
+        """Mesmo custo de uma verificação, para usuário inexistente (evita enumeração)."""
+        if self._hash_ficticio is None:
+            self._hash_ficticio = await self.gerar_hash(secrets.token_hex(8))
+        await self._no_pool(self.conferir_sync, senha, self._hash_ficticio)
+
+    def estatisticas(self) -> dict:
+        return {
+            **self._contadores,
+            "threads": self.threads,
+            "em_uso": self._em_uso,
+            "max_fila": self.max_fila,
+            "scrypt": {"n": self.n, "r": self.r, "p": self.p},
+        }
+
+    def encerrar(self):
+        self._pool.shutdown(wait=False)
+
+
+class LimiteTentativas:
+    """Janela deslizante de falhas por chave (usuário ou IP)."""
+
+    def __init__(self, maximo: int, janela_segundos: float):
+        self.maximo = maximo
+        self.janela = janela_segundos
+        self._falhas = {}
+        self._lock = threading.Lock()
+
+    def _recentes(self, chave, agora: float):
+        falhas = self._falhas.get(chave)
+        if falhas is None:
+            return None
+        while falhas and falhas[0] <= agora - self.janela:
+            falhas.popleft()
+        if not falhas:
+            del self._falhas[chave]
+            return None
+        return falhas
+
+    def bloqueado(self, chave) -> float:
+        """Segundos até a próxima tentativa ser aceita (0 se liberado)."""
+        agora = time.monotonic()
+        with self._lock:
+            falhas = self._recentes(chave, agora)
+            if falhas is None or len(falhas) < self.maximo:
+                return 0
+            return falhas[-self.maximo] + self.janela - agora
+
+    def registrar_falha(self, chave):
+        agora = time.monotonic()
+        with self._lock:
+            self._falhas.setdefault(chave, deque(maxlen=self.maximo)).append(agora)
+            if len(self._falhas) > 10000:
+                for outra in list(self._falhas):
+                    self._recentes(outra, agora)
+
+    def limpar(self, chave):
+        with self._lock:
+            self._falhas.pop(chave, None)
+
+    def __len__(self):
+        return len(self._falhas)
@@ -0,0 +1,297 @@
+"""Armazenamento de sessões de login.
+
+Cada sessão é indexada pelo token e também pelo ``user_id``, de modo que
+logout e "derrubar todas as sessões do usuário" não precisam varrer a
+tabela inteira. Há três backends:
+
+- ``memory``: dicionário do processo (um único worker);
+- ``sqlite``: arquivo local em modo WAL, compartilhado entre workers;
+- ``redis``: qualquer servidor compatível com o protocolo Redis.
+
+Os dados da sessão são guardados sem ``created_at``; esse campo é
+reconstruído a partir do horário da última atividade.
+
+Os backends ``sqlite`` e ``redis`` fazem I/O: ``bloqueante`` avisa o
+chamador para rodá-los fora do event loop.
+"""
+import abc
+import json
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+
+class SessionStore(abc.ABC):
+    # Chamadas fazem I/O e devem sair do event loop
+    bloqueante = True
+
+    @abc.abstractmethod
+    def get(self, token: str):
+        ...
+
+    @abc.abstractmethod
+    def set(self, token: str, data: dict):
+        ...
+
+    @abc.abstractmethod
+    def touch(self, token: str):
+        ...
+
+    @abc.abstractmethod
+    def delete(self, token: str):
+        ...
+
+    @abc.abstractmethod
+    def tokens_do_usuario(self, user_id) -> list:
+        ...
+
+    def delete_user(self, user_id) -> int:
+        removidas = 0
+        for token in self.tokens_do_usuario(user_id):
+            if self.delete(token):
+                removidas += 1
+        return removidas
+
+    @abc.abstractmethod
+    def sweep(self, timeout_segundos: float) -> int:
+        """Remove sessões sem atividade há mais de ``timeout_segundos``."""
+
+    @abc.abstractmethod
+    def count(self) -> int:
+        ...
+
+    def close(self):
+        pass
+
+
+def _serializar(data: dict) -> str:
+    return json.dumps({k: v for k, v in data.items() if k != 'created_at'})
+
+
+def _desserializar(texto: str, atividade: float) -> dict:
+    data = json.loads(texto)
+    data['created_at'] = datetime.fromtimestamp(atividade)
+    return data
+
+
+class MemorySessionStore(SessionStore):
+    bloqueante = False
+
+    def __init__(self):
+        self._sessoes = {}
+        self._por_usuario = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        return self._sessoes.get(token)
+
+    def set(self, token, data):
+        data.setdefault('created_at', datetime.now())
+        with self._lock:
+            self._sessoes[token] = data
+            self._por_usuario[data['user_id']].add(token)
+
+    def touch(self, token):
+        data = self._sessoes.get(token)
+        if data is not None:
+            data['created_at'] = datetime.now()
+
+    def delete(self, token):
+        with self._lock:
+            data = self._sessoes.pop(token, None)
+            if data is not None:
+                tokens = self._por_usuario.get(data['user_id'])
+                if tokens is not None:
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._por_usuario[data['user_id']]
+        return data
+
+    def tokens_do_usuario(self, user_id):
+        return list(self._por_usuario.get(user_id, ()))
+
+    def sweep(self, timeout_segundos):
+        limite = datetime.now().timestamp() - timeout_segundos
+        expiradas = [token for token, data in list(self._sessoes.items())
+                     if data['created_at'].timestamp() < limite]
+        for token in expiradas:
+            self.delete(token)
+        return len(expiradas)
+
+    def count(self):
+        return len(self._sessoes)
+
+
+class SQLiteSessionStore(SessionStore):
+    def __init__(self, caminho: str):
+        self._conn = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None, timeout=5)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessoes (
+                    token TEXT PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    dados TEXT NOT NULL,
+                    atividade REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessoes_usuario ON sessoes (user_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessoes_atividade ON sessoes (atividade)")
+
+    def get(self, token):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT dados, atividade FROM sessoes WHERE token = ?", (token,)
+            ).fetchone()
+        return _desserializar(row[0], row[1]) if row else None
+
+    def set(self, token, data):
+        atividade = data.get('created_at', datetime.now()).timestamp()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessoes (token, user_id, dados, atividade) VALUES (?, ?, ?, ?)",
+                (token, data['user_id'], _serializar(data), atividade)
+            )
+
+    def touch(self, token):
+        with self._lock:
+            self._conn.execute("UPDATE sessoes SET atividade = ? WHERE token = ?", (time.time(), token))
+
+    def delete(self, token):
+        with self._lock:
+            row = self._conn.execute(
+                "DELETE FROM sessoes WHERE token = ? RETURNING dados, atividade", (token,)
+            ).fetchone()
+        return _desserializar(row[0], row[1]) if row else None
+
+    def tokens_do_usuario(self, user_id):
+        with self._lock:
+            rows = self._conn.execute("SELECT token FROM sessoes WHERE user_id = ?", (user_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def delete_user(self, user_id):
+        with self._lock:
+            return self._conn.execute("DELETE FROM sessoes WHERE user_id = ?", (user_id,)).rowcount
+
+    def sweep(self, timeout_segundos):
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM sessoes WHERE atividade < ?", (time.time() - timeout_segundos,)
+            ).rowcount
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessoes").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisSessionStore(SessionStore):
+    """Sessões num servidor Redis (ou compatível) com expiração nativa.
+
+    Cada sessão é uma chave com TTL igual ao timeout; o índice por usuário é
+    um SET, limpo de forma preguiçosa quando o token já expirou. ``touch`` e
+    ``delete`` são scripts Lua: ler e regravar a sessão numa operação só
+    impede que um touch ressuscite uma sessão apagada no meio do caminho.
+    """
+
+    # KEYS: sessão, prefixo do índice por usuário; ARGV: atividade, ttl
+    LUA_TOUCH = """
+        local texto = redis.call('GET', KEYS[1])
+        if not texto then return 0 end
+        local envelope = cjson.decode(texto)
+        envelope['atividade'] = tonumber(ARGV[1])
+        redis.call('SET', KEYS[1], cjson.encode(envelope), 'EX', ARGV[2])
+        local usuario = cjson.decode(envelope['dados'])['user_id']
+        redis.call('EXPIRE', KEYS[2] .. tostring(usuario), ARGV[2])
+        return 1
+    """
+
+    # KEYS: sessão, prefixo do índice por usuário; ARGV: token
+    LUA_DELETE = """
+        local texto = redis.call('GET', KEYS[1])
+        if not texto then return false end
+        redis.call('DEL', KEYS[1])
+        local usuario = cjson.decode(cjson.decode(texto)['dados'])['user_id']
+        redis.call('SREM', KEYS[2] .. tostring(usuario), ARGV[1])
+        return texto
+    """
+
+    def __init__(self, url: str, timeout_segundos: float, prefixo: str = "webos"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("Backend de sessão 'redis' requer o pacote 'redis' (pip install redis)") from e
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._ttl = int(timeout_segundos)
+        self._prefixo = prefixo
+        self._touch = self._redis.register_script(self.LUA_TOUCH)
+        self._delete = self._redis.register_script(self.LUA_DELETE)
+
+    def _chave(self, token):
+        return f"{self._prefixo}:sessao:{token}"
+
+    def _chave_usuario(self, user_id):
+        return f"{self._prefixo}:usuario:{user_id}"
+
+    @staticmethod
+    def _ler(texto):
+        if texto is None:
+            return None
+        envelope = json.loads(texto)
+        return _desserializar(envelope['dados'], envelope['atividade'])
+
+    def get(self, token):
+        return self._ler(self._redis.get(self._chave(token)))
+
+    def set(self, token, data):
+        envelope = json.dumps({
+            'dados': _serializar(data),
+            'atividade': data.get('created_at', datetime.now()).timestamp(),
+        })
+        pipe = self._redis.pipeline()
+        pipe.set(self._chave(token), envelope, ex=self._ttl)
+        pipe.sadd(self._chave_usuario(data['user_id']), token)
+        pipe.expire(self._chave_usuario(data['user_id']), self._ttl)
+        pipe.execute()
+
+    def touch(self, token):
+        self._touch(keys=[self._chave(token), self._chave_usuario("")], args=[time.time(), self._ttl])
+
+    def delete(self, token):
+        return self._ler(self._delete(keys=[self._chave(token), self._chave_usuario("")], args=[token]))
+
+    def tokens_do_usuario(self, user_id):
+        tokens = list(self._redis.smembers(self._chave_usuario(user_id)))
+        vivos = [t for t in tokens if self._redis.exists(self._chave(t))]
+        mortos = set(tokens) - set(vivos)
+        if mortos:
+            self._redis.srem(self._chave_usuario(user_id), *mortos)
+        return vivos
+
+    def sweep(self, timeout_segundos):
+        # O próprio Redis expira as chaves pelo TTL.
+        return 0
+
+    def count(self):
+        return sum(1 for _ in self._redis.scan_iter(match=self._chave("*"), count=500))
+
+    def close(self):
+        self._redis.close()
+
+
+def criar_store(backend: str, timeout_segundos: float, sqlite_caminho: str = "sessoes.db",
+                redis_url: str = "redis://localhost:6379/0") -> SessionStore:
+    if backend == "memory":
+        return MemorySessionStore()
+    if backend == "sqlite":
+        return SQLiteSessionStore(sqlite_caminho)
+    if backend == "redis":
+        return RedisSessionStore(redis_url, timeout_segundos)
+    raise ValueError(f"Backend de sessão desconhecido: {backend}")
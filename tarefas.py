@@ -0,0 +1,241 @@
+"""Fila de tarefas em segundo plano para relatórios pesados.
+
+O pedido é aceito na hora (``submeter`` devolve os metadados com o id) e
+um número fixo de workers assíncronos executa as tarefas, uma por vez
+cada; o restante espera na fila. O resultado é gravado em disco
+(``<id>.json``), com os metadados ao lado (``<id>.meta``), e fica
+disponível até expirar o TTL.
+
+Pedidos com a mesma chave enquanto a tarefa está pendente ou rodando
+recebem a mesma tarefa. Depois de concluída, a chave reaproveita o
+resultado até expirar ou até ``invalidar_grupo`` (escrita na loja).
+
+Cada processo tem a sua fila; como os metadados ficam em disco, outro
+worker do uvicorn consegue responder status e resultado de tarefas já
+concluídas.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from datetime import datetime
+
+from logs import logger
+from respostas import para_json
+
+PENDENTE = "pendente"
+EXECUTANDO = "executando"
+CONCLUIDA = "concluida"
+ERRO = "erro"
+
+# Intervalo da limpeza de resultados expirados (segundos)
+LIMPEZA_INTERVALO = 60
+
+_ID_VALIDO = re.compile(r"^[0-9a-f]{32}$")
+
+
+class FilaCheia(Exception):
+    """Tarefas pendentes demais; quem chamou deve responder 503."""
+
+
+def _data(instante):
+    return datetime.fromtimestamp(instante).isoformat() if instante else None
+
+
+class FilaTarefas:
+    def __init__(self, diretorio: str, workers: int = 2, ttl_segundos: float = 3600,
+                 max_pendentes: int = 100):
+        self.diretorio = diretorio
+        self.workers = max(1, workers)
+        self.ttl = ttl_segundos
+        self.max_pendentes = max_pendentes
+        self._tarefas = {}
+        self._executar = {}
+        self._por_chave = {}
+        self._fila = None
+        self._workers = []
+        self._contadores = {"submetidas": 0, "reaproveitadas": 0, "concluidas": 0, "erros": 0}
+
+    # ---------- ciclo de vida ----------
+
+    def iniciar(self):
+        os.makedirs(self.diretorio, exist_ok=True)
+        self._fila = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._trabalhar()) for _ in range(self.workers)]
+        self._workers.append(asyncio.create_task(self._limpar_periodicamente()))
+
+    async def encerrar(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    # ---------- API ----------
+
+    def submeter(self, chave: tuple, executar, descricao: dict = None) -> dict:
+        """Enfileira ``await executar()`` e devolve os metadados da tarefa.
+
+        ``chave[0]`` é o grupo (a loja). Se já houver tarefa reaproveitável
+        para a mesma chave, devolve a existente.
+        """
+        existente = self._tarefas.get(self._por_chave.get(chave))
+        if existente is not None and self._reaproveitavel(existente):
+            self._contadores["reaproveitadas"] += 1
+            return existente
+        if self._fila is None:
+            raise RuntimeError("Fila de tarefas não iniciada")
+        if self._fila.qsize() >= self.max_pendentes:
+            raise FilaCheia()
+
+        meta = {
+            "id": uuid.uuid4().hex,
+            "grupo": chave[0],
+            "estado": PENDENTE,
+            "descricao": descricao or {},
+            "criada_em": time.time(),
+            "iniciada_em": None,
+            "concluida_em": None,
+            "expira_em": None,
+            "tamanho": None,
+            "erro": None,
+        }
+        self._tarefas[meta["id"]] = meta
+        self._executar[meta["id"]] = executar
+        self._por_chave[chave] = meta["id"]
+        self._fila.put_nowait(meta["id"])
+        self._contadores["submetidas"] += 1
+        return meta
+
+    def status(self, tarefa_id: str):
+        """Metadados da tarefa (memória ou disco) ou ``None`` se não existe/expirou."""
+        if not _ID_VALIDO.match(tarefa_id or ""):
+            return None
+        meta = self._tarefas.get(tarefa_id) or self._ler_meta(tarefa_id)
+        if meta is None or (meta["expira_em"] and meta["expira_em"] <= time.time()):
+            return None
+        return meta
+
+    def caminho_resultado(self, tarefa_id: str) -> str:
+        return os.path.join(self.diretorio, f"{tarefa_id}.json")
+
+    def invalidar_grupo(self, grupo):
+        """Novos pedidos do grupo não reaproveitam resultados já calculados."""
+        for chave in [c for c in self._por_chave if c[0] == grupo]:
+            del self._por_chave[chave]
+
+    def publico(self, meta: dict) -> dict:
+        """Metadados no formato das respostas da API."""
+        return {
+            "tarefa_id": meta["id"],
+            "estado": meta["estado"],
+            "descricao": meta["descricao"],
+            "criada_em": _data(meta["criada_em"]),
+            "iniciada_em": _data(meta["iniciada_em"]),
+            "concluida_em": _data(meta["concluida_em"]),
+            "expira_em": _data(meta["expira_em"]),
+            "tamanho": meta["tamanho"],
+            "erro": meta["erro"],
+        }
+
+    def estatisticas(self) -> dict:
+        estados = [meta["estado"] for meta in self._tarefas.values()]
+        return {
+            **self._contadores,
+            "workers": self.workers,
+            "pendentes": estados.count(PENDENTE),
+            "executando": estados.count(EXECUTANDO),
+            "ttl_segundos": self.ttl,
+        }
+
+    # ---------- execução ----------
+
+    def _reaproveitavel(self, meta: dict) -> bool:
+        if meta["estado"] in (PENDENTE, EXECUTANDO):
+            return True
+        return meta["estado"] == CONCLUIDA and meta["expira_em"] > time.time()
+
+    async def _trabalhar(self):
+        while True:
+            tarefa_id = await self._fila.get()
+            meta = self._tarefas.get(tarefa_id)
+            executar = self._executar.pop(tarefa_id, None)
+            if meta is None or executar is None:
+                continue
+            meta["estado"] = EXECUTANDO
+            meta["iniciada_em"] = time.time()
+            try:
+                corpo = para_json(await executar())
+                await asyncio.to_thread(self._gravar, self.caminho_resultado(tarefa_id), corpo)
+                meta["tamanho"] = len(corpo)
+                meta["estado"] = CONCLUIDA
+                self._contadores["concluidas"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                meta["estado"] = ERRO
+                meta["erro"] = getattr(e, "detail", None) or str(e)
+                self._contadores["erros"] += 1
+                logger.error(f"❌ Tarefa {tarefa_id} falhou: {meta['erro']}")
+            meta["concluida_em"] = time.time()
+            meta["expira_em"] = meta["concluida_em"] + self.ttl
+            try:
+                await asyncio.to_thread(self._gravar, self._caminho_meta(tarefa_id),
+                                        json.dumps(meta, default=str).encode("utf-8"))
+            except Exception as e:
+                logger.warning(f"⚠️ Metadados da tarefa {tarefa_id} não gravados: {e}")
+            logger.info(f"📑 Tarefa {tarefa_id} {meta['estado']} em "
+                        f"{meta['concluida_em'] - meta['iniciada_em']:.2f}s")
+
+    # ---------- disco ----------
+
+    def _caminho_meta(self, tarefa_id: str) -> str:
+        return os.path.join(self.diretorio, f"{tarefa_id}.meta")
+
+    def _gravar(self, caminho: str, conteudo: bytes):
+        # Grava ao lado e renomeia: quem lê nunca vê arquivo pela metade
+        temporario = f"{caminho}.tmp"
+        with open(temporario, "wb") as arquivo:
+            arquivo.write(conteudo)
+        os.replace(temporario, caminho)
+
+    def _ler_meta(self, tarefa_id: str):
+        try:
+            with open(self._caminho_meta(tarefa_id), "rb") as arquivo:
+                return json.loads(arquivo.read())
+        except (OSError, ValueError):
+            return None
+
+    def limpar_expirados(self) -> int:
+        """Apaga da memória e do disco o que passou do TTL."""
+        agora = time.time()
+        for tarefa_id in [i for i, meta in self._tarefas.items()
+                          if meta["expira_em"] and meta["expira_em"] <= agora]:
+            del self._tarefas[tarefa_id]
+        for chave in [c for c, i in self._por_chave.items() if i not in self._tarefas]:
+            del self._por_chave[chave]
+        removidos = 0
+        try:
+            nomes = os.listdir(self.diretorio)
+        except OSError:
+            return 0
+        for nome in nomes:
+            caminho = os.path.join(self.diretorio, nome)
+            try:
+                if os.path.getmtime(caminho) + self.ttl <= agora:
+                    os.remove(caminho)
+                    removidos += 1
+            except OSError:
+                pass
+        return removidos
+
+    async def _limpar_periodicamente(self):
+        while True:
+            await asyncio.sleep(LIMPEZA_INTERVALO)
+            try:
+                removidos = self.limpar_expirados()
+                if removidos:
+                    logger.info(f"🧹 Resultados de tarefas expirados removidos: {removidos}")
+            except Exception as e:
+                logger.warning(f"⚠️ Erro na limpeza de tarefas: {e}")
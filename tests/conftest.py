@@ -0,0 +1,75 @@
+"""Banco de teste: SQLite num arquivo temporário, com as migrações aplicadas.
+
+O modo ``WEBOS_DB_ENGINE=sqlite`` fala a mesma interface do
+``mysql.connector``, então pool, contexto e repositórios rodam aqui sem
+servidor MySQL.
+"""
+import contextlib
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import banco_sqlite  # noqa: E402
+import database  # noqa: E402
+import migrate  # noqa: E402
+
+
+@pytest.fixture
+def caminho_banco(tmp_path):
+    caminho = str(tmp_path / "webos_teste.db")
+    conn = banco_sqlite.abrir(caminho)
+    try:
+        migrate.aplicar(conn)
+    finally:
+        conn.close()
+    return caminho
+
+
+@pytest.fixture
+def pool(caminho_banco):
+    """Pool do ``database`` configurado sobre o banco de teste."""
+    pool = database.ConnectionPool(lambda: banco_sqlite.abrir(caminho_banco), tamanho=2)
+    database.configurar(pool, max_workers=2)
+    yield pool
+    database.encerrar()
+    pool.fechar()
+
+
+@pytest.fixture
+def abrir_api(tmp_path, monkeypatch):
+    """``with abrir_api(caminho) as (cliente, cabecalhos)``: a API no modo
+    sqlite sobre o arquivo ``caminho``, logada como admin da loja 1."""
+    monkeypatch.setenv("WEBOS_DB_ENGINE", "sqlite")
+    monkeypatch.setenv("WEBOS_TAREFAS_DIR", str(tmp_path / "relatorios"))
+    import backend
+    import cache
+    import catalogo
+    import senhas
+    import tarefas
+    from fastapi.testclient import TestClient
+
+    # Caches, catálogo e serviços são do processo (e o shutdown do app
+    # encerra os serviços): cada teste começa com os seus
+    monkeypatch.setattr(backend, "servico_senhas", senhas.ServicoSenhas(n=backend.SENHA_SCRYPT_N))
+    monkeypatch.setattr(backend, "fila_relatorios", tarefas.FilaTarefas(
+        str(tmp_path / "relatorios"), backend.TAREFAS_WORKERS, backend.TAREFAS_TTL))
+    monkeypatch.setattr(backend, "cache_dashboard", cache.CacheTTL(backend.CACHE_DASHBOARD_TTL))
+    monkeypatch.setattr(backend, "cache_mais_vendidos", cache.CacheTTL(backend.CACHE_MAIS_VENDIDOS_TTL))
+    monkeypatch.setattr(backend, "catalogo_produtos", catalogo.Catalogo())
+
+    @contextlib.contextmanager
+    def abrir(caminho):
+        monkeypatch.setattr(backend, "DB_SQLITE", caminho)
+        db = sqlite3.connect(caminho)
+        db.execute("INSERT INTO usuarios (loja_id, nome, password, perfil) VALUES (1, 'Admin', '123', 'admin')")
+        db.commit()
+        db.close()
+        with TestClient(backend.app) as cliente:
+            token = cliente.post("/api/login", json={"nome": "admin", "password": "123"}).json()["session_token"]
+            yield cliente, {"Authorization": token}
+
+    return abrir
@@ -0,0 +1,69 @@
+import shutil
+import sqlite3
+
+import pytest
+
+import banco_sqlite
+import migrate
+
+
+@pytest.fixture
+def banco_legado(tmp_path):
+    """Banco criado antes dos agregados, com uma venda de status nulo."""
+    pasta = tmp_path / "ate_004"
+    pasta.mkdir()
+    for _, arquivo, caminho in migrate.listar_migracoes()[:4]:
+        shutil.copy(caminho, pasta / arquivo)
+    # Bancos adotados pela 001 podem ter vendas sem status
+    schema = pasta / migrate.listar_migracoes()[0][1]
+    schema.write_text(schema.read_text(encoding="utf-8").replace(
+        "status VARCHAR(20) NOT NULL DEFAULT 'concluida'", "status VARCHAR(20) NULL"), encoding="utf-8")
+    caminho = str(tmp_path / "legado.db")
+    conn = banco_sqlite.abrir(caminho)
+    try:
+        migrate.aplicar(conn, str(pasta))
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO produtos (loja_id, nome, preco_venda, estoque_atual) VALUES (1, 'Sutiã', 40, 3)")
+        cursor.execute(
+            "INSERT INTO vendas (loja_id, numero_venda, total_venda, forma_pagamento, data_venda, usuario_id, status) "
+            "VALUES (1, 'V0001', 80, 'pix', '2024-05-10 10:00:00', 1, NULL)"
+        )
+        cursor.execute(
+            "INSERT INTO itens_venda (venda_id, produto_id, produto_nome, quantidade, valor_unitario, total_item) "
+            "VALUES (1, 1, 'Sutiã', 2, 40, 80)"
+        )
+        conn.commit()
+        migrate.aplicar(conn)
+    finally:
+        conn.close()
+    return caminho
+
+
+def linhas(caminho, sql):
+    db = sqlite3.connect(caminho)
+    try:
+        return db.execute(sql).fetchall()
+    finally:
+        db.close()
+
+
+def test_venda_com_status_nulo_entra_no_agregado_e_sai_ao_cancelar(banco_legado, abrir_api):
+    assert linhas(banco_legado, "SELECT dia, quantidade_vendas, valor_total, itens_vendidos FROM vendas_diarias") \
+        == [("2024-05-10", 1, 80, 2)]
+    assert linhas(banco_legado, "SELECT dia, produto_id, quantidade, valor_total, itens FROM produtos_vendas_diarias") \
+        == [("2024-05-10", 1, 2, 80, 1)]
+
+    with abrir_api(banco_legado) as (cliente, cabecalhos):
+        periodo = cliente.get("/api/relatorios/vendas-periodo?data_inicio=2024-05-01&data_fim=2024-05-31",
+                              headers=cabecalhos).json()
+        assert [(dia["quantidade_vendas"], dia["valor_total"]) for dia in periodo["vendas_por_dia"]] == [(1, 80)]
+        ranking = cliente.get("/api/relatorios/mais-vendidos?data_inicio=2024-05-01&data_fim=2024-05-31",
+                              headers=cabecalhos).json()
+        assert [produto["produto_id"] for produto in ranking["produtos"]] == [1]
+        concluidas = cliente.get("/api/vendas?status=concluida", headers=cabecalhos).json()["vendas"]
+        assert [(venda["id"], venda["status"]) for venda in concluidas] == [(1, "concluida")]
+        assert cliente.put("/api/vendas/1/cancelar", headers=cabecalhos).status_code == 200
+
+    assert linhas(banco_legado, "SELECT quantidade_vendas, valor_total, itens_vendidos FROM vendas_diarias") \
+        == [(0, 0, 0)]
+    assert linhas(banco_legado, "SELECT quantidade, valor_total, itens FROM produtos_vendas_diarias") == [(0, 0, 0)]
@@ -0,0 +1,155 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+import banco_sqlite
+import contexto
+import database
+
+
+class SemPreparados:
+    """Conexão de um driver sem ``cursor(prepared=True)``."""
+
+    def __init__(self, caminho):
+        self._conn = banco_sqlite.abrir(caminho)
+        self.cursores = []
+
+    def cursor(self, dictionary=False):
+        cursor = self._conn.cursor(dictionary=dictionary)
+        self.cursores.append(cursor)
+        return cursor
+
+    def __getattr__(self, nome):
+        return getattr(self._conn, nome)
+
+
+@pytest.fixture
+def pool_sem_preparados(caminho_banco):
+    return database.ConnectionPool(lambda: SemPreparados(caminho_banco), tamanho=1, max_preparados=2)
+
+
+def test_preparado_cai_para_cursor_comum_e_reusa(pool_sem_preparados):
+    conn = pool_sem_preparados.obter()
+    try:
+        sql = "SELECT COUNT(*) AS total FROM produtos WHERE loja_id = %s"
+        assert database._rodar_preparado(conn, sql, (1,), "um", True) == {"total": 0}
+        assert database._rodar_preparado(conn, sql, (2,), "um", True) == {"total": 0}
+        assert len(conn.cursores) == 1
+        estatisticas = pool_sem_preparados.estatisticas()
+        assert (estatisticas["preparados"], estatisticas["preparados_reusados"]) == (1, 1)
+    finally:
+        conn.close()
+
+
+def test_preparado_modo_escrita_devolve_linhas_e_id(pool_sem_preparados):
+    conn = pool_sem_preparados.obter()
+    try:
+        linhas, novo_id = database._rodar_preparado(
+            conn, "INSERT INTO catalogo_versoes (loja_id, versao) VALUES (%s, %s)", (1, 1), "escrita", True
+        )
+        assert (linhas, novo_id) == (1, 1)
+        assert database._rodar_preparado(conn, "SELECT versao FROM catalogo_versoes", (), "todos", False) == [(1,)]
+    finally:
+        conn.close()
+
+
+def test_preparado_com_erro_sai_do_cache(pool_sem_preparados):
+    conn = pool_sem_preparados.obter()
+    try:
+        sql = "SELECT coluna_inexistente FROM produtos"
+        with pytest.raises(sqlite3.OperationalError):
+            database._rodar_preparado(conn, sql, (), "todos", True)
+        with pytest.raises(sqlite3.OperationalError):
+            database._rodar_preparado(conn, sql, (), "todos", True)
+        # Cada tentativa preparou de novo: o cursor que falhou foi esquecido
+        assert pool_sem_preparados.estatisticas()["preparados"] == 2
+    finally:
+        conn.close()
+
+
+def test_cache_de_preparados_descarta_o_menos_usado(pool_sem_preparados):
+    conn = pool_sem_preparados.obter()
+    try:
+        for loja_id in (1, 2, 3):
+            database._rodar_preparado(conn, f"SELECT {loja_id} AS n", (), "um", True)
+        database._rodar_preparado(conn, "SELECT 1 AS n", (), "um", True)
+        estatisticas = pool_sem_preparados.estatisticas()
+        assert (estatisticas["preparados"], estatisticas["preparados_reusados"]) == (4, 0)
+    finally:
+        conn.close()
+
+
+def test_conexao_fora_do_pool_fecha_o_cursor(caminho_banco):
+    conn = SemPreparados(caminho_banco)
+    assert database._rodar_preparado(conn, "SELECT %s AS n", (5,), "um", True) == {"n": 5}
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.cursores[0].fetchall()
+    conn.close()
+
+
+def test_descartar_conexao_limpa_os_preparados(pool_sem_preparados):
+    conn = pool_sem_preparados.obter()
+    fisica = conn._conn
+    database._rodar_preparado(conn, "SELECT 1 AS n", (), "um", True)
+    conn.close(descartar=True)
+    assert fisica not in pool_sem_preparados._preparados
+
+
+CONSULTA_LENTA = ("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 100000000) "
+                  "SELECT COUNT(*) AS total FROM n")
+
+
+def test_consulta_interrompida_descarta_a_conexao(pool):
+    async def cenario():
+        ctx = contexto.Contexto(pesado=True)
+
+        async def consultar():
+            async with ctx:
+                cursor = ctx.cursor()
+                await cursor.execute(CONSULTA_LENTA)
+                return await cursor.fetchall()
+
+        tarefa = asyncio.ensure_future(consultar())
+        concluidas, _ = await asyncio.wait([tarefa], timeout=0.2)
+        assert not concluidas
+        ctx.interromper()
+        tarefa.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await tarefa
+
+    asyncio.run(cenario())
+    estatisticas = pool.estatisticas()
+    assert (estatisticas["em_uso"], estatisticas["descartadas"]) == (0, 1)
+    assert database._limite_pesados._value == database._max_pesados
+
+
+def test_cancelar_durante_a_retirada_devolve_a_conexao(caminho_banco):
+    liberar = threading.Event()
+
+    def abrir_devagar():
+        liberar.wait(5)
+        return banco_sqlite.abrir(caminho_banco)
+
+    pool = database.ConnectionPool(abrir_devagar, tamanho=2)
+    database.configurar(pool, max_workers=1)
+
+    async def cenario():
+        tarefas = [asyncio.ensure_future(database.connect()) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        for tarefa in tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+        liberar.set()
+        conn = await database.connect()
+        await conn.close()
+
+    try:
+        asyncio.run(cenario())
+        estatisticas = pool.estatisticas()
+        # A primeira retirada terminou e devolveu a conexão; a segunda nem rodou
+        assert (estatisticas["em_uso"], estatisticas["criadas"], estatisticas["checkouts"]) == (0, 1, 2)
+    finally:
+        database.encerrar()
+        pool.fechar()
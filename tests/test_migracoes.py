@@ -0,0 +1,50 @@
+import sqlite3
+
+import banco_sqlite
+import migrate
+
+
+def test_ddl_do_mysql_convertido_para_o_sqlite():
+    comandos = banco_sqlite.traduzir_ddl(
+        "CREATE TABLE IF NOT EXISTS t (\n"
+        "    id INT AUTO_INCREMENT PRIMARY KEY,\n"
+        "    nome VARCHAR(100) NOT NULL,\n"
+        "    ativo TINYINT(1) NOT NULL DEFAULT 1,\n"
+        "    total BIGINT UNSIGNED NOT NULL DEFAULT 0,\n"
+        "    criado DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,\n"
+        "    KEY idx_t_nome (nome)\n"
+        ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+    )
+    assert comandos[1] == "CREATE INDEX IF NOT EXISTS idx_t_nome ON t (nome)"
+    assert "INTEGER PRIMARY KEY AUTOINCREMENT" in comandos[0]
+    assert "VARCHAR(100) COLLATE NOCASE" in comandos[0]
+    for resto in ("ENGINE", "KEY idx", "TINYINT", "UNSIGNED", "CURRENT_TIMESTAMP"):
+        assert resto not in comandos[0]
+    assert banco_sqlite.traduzir_ddl("CREATE INDEX idx ON t (nome)") == ["CREATE INDEX IF NOT EXISTS idx ON t (nome)"]
+    assert banco_sqlite.traduzir_ddl("DELETE FROM t") == ["DELETE FROM t"]
+
+
+def test_migracoes_do_mysql_no_sqlite(caminho_banco):
+    db = sqlite3.connect(caminho_banco)
+    try:
+        tipos = {linha[1]: linha[2] for linha in db.execute("PRAGMA table_info(vendas)")}
+        assert tipos["total_venda"] == "DECIMAL(10,2)"
+        assert not [
+            (tabela, coluna)
+            for (tabela,) in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+            for _, coluna, tipo, *_ in db.execute(f"PRAGMA table_info({tabela})")
+            if tipo == "REAL" and tabela != "sessoes_revogadas"
+        ]
+        indices = {nome for (nome,) in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {"idx_usuarios_nome", "idx_fechamento_usuario_data", "idx_vendas_loja_status_data"} <= indices
+        db.execute("INSERT INTO usuarios (loja_id, nome, password) VALUES (1, 'Ana', 'x')")
+        assert db.execute("SELECT COUNT(*) FROM usuarios WHERE nome = 'ANA'").fetchone() == (1,)
+    finally:
+        db.close()
+
+    conn = banco_sqlite.abrir(caminho_banco)
+    try:
+        assert migrate.aplicar(conn) == []
+        assert all(aplicada for _, aplicada in migrate.situacao(conn))
+    finally:
+        conn.close()
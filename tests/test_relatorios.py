@@ -0,0 +1,43 @@
+import json
+from datetime import date
+
+
+def vender(cliente, cabecalhos, valor):
+    item = {"produto": "Sutiã", "produto_id": 1, "quantidade": 1, "preco_Unitario": valor, "preco_Total": valor}
+    resposta = cliente.post("/api/vendas", headers=cabecalhos, json={
+        "cliente": "Maria", "itens": [item], "total_venda": valor, "forma_pagamento": "pix",
+        "data_venda": f"{date.today().isoformat()}T10:00:00", "usuario_id": 1, "loja_id": 1,
+    })
+    assert resposta.status_code == 200
+
+
+def test_divisoes_nao_truncam_no_sqlite(caminho_banco, abrir_api):
+    with abrir_api(caminho_banco) as (cliente, cabecalhos):
+        assert cliente.post("/api/produtos", headers=cabecalhos, json={
+            "nome": "Sutiã", "codigo_barras": "789", "preco_venda": 33, "estoque_atual": 13,
+        }).status_code == 200
+        for valor in (33, 33, 34):
+            vender(cliente, cabecalhos, valor)
+
+        estatisticas = cliente.get("/api/dashboard/estatisticas", headers=cabecalhos).json()
+        assert round(estatisticas["ticketMedio"], 2) == 33.33
+
+        hoje = date.today().isoformat()
+        gerado = cliente.post("/api/relatorios/gerar", headers=cabecalhos, json={
+            "tipos": ["giro-estoque"], "data_inicio": hoje, "data_fim": hoje,
+        }).json()
+        (giro,) = gerado["relatorios"]["giro_estoque"]
+        assert (giro["quantidade_vendida"], giro["giro"], giro["dias_cobertura"]) == (3, 0.3, 3.3)
+
+
+def test_ndjson_serializa_como_as_rotas_json(caminho_banco, abrir_api):
+    with abrir_api(caminho_banco) as (cliente, cabecalhos):
+        cliente.post("/api/produtos", headers=cabecalhos, json={
+            "nome": "Calcinha", "codigo_barras": "790", "preco_venda": 19.9, "estoque_atual": 4,
+        })
+        json_ = cliente.get("/api/relatorios/estoque-detalhado", headers=cabecalhos).json()["produtos"]
+        ndjson = cliente.get("/api/relatorios/estoque-detalhado?formato=ndjson", headers=cabecalhos)
+
+    assert ndjson.headers["content-type"].startswith("application/x-ndjson")
+    linhas = [json.loads(linha) for linha in ndjson.text.splitlines()]
+    assert linhas == json_
@@ -0,0 +1,180 @@
+import asyncio
+from types import SimpleNamespace
+
+import contexto
+import repositorios
+from repositorios import ClienteRepo, ProdutoRepo, UsuarioRepo, VendaRepo
+
+LOJA = 1
+OUTRA_LOJA = 2
+
+
+def rodar(cenario):
+    """Roda ``cenario(ctx)`` num contexto próprio, com commit no fim."""
+    async def principal():
+        async with contexto.Contexto(loja_id=LOJA) as ctx:
+            resultado = await cenario(ctx)
+            await ctx.commit()
+            return resultado
+    return asyncio.run(principal())
+
+
+def produto(**campos):
+    dados = dict.fromkeys(repositorios.CAMPOS_PRODUTO)
+    dados.update(nome="Sutiã", codigo_barras="789", preco_venda=30, estoque_atual=5, ativo=True)
+    dados.update(campos)
+    return SimpleNamespace(**dados)
+
+
+def cliente(**campos):
+    dados = dict.fromkeys(repositorios.CAMPOS_CLIENTE)
+    dados.update(nome="Maria", telefone="11999990000", cpf="123", ativo=True)
+    dados.update(campos)
+    return SimpleNamespace(**dados)
+
+
+def venda(**campos):
+    dados = dict(cliente="Maria", total_venda=60, forma_pagamento="pix", observacoes="",
+                 data_venda="2026-10-18 10:00:00", usuario_id=1)
+    dados.update(campos)
+    return SimpleNamespace(**dados)
+
+
+def test_lote_completo_vai_ate_a_potencia_de_2():
+    assert repositorios._lote_completo([7]) == [7]
+    assert repositorios._lote_completo([1, 2, 3]) == [1, 2, 3, 3]
+    assert repositorios._lote_completo(list(range(5))) == [0, 1, 2, 3, 4, 4, 4, 4]
+    assert len(repositorios._lote_completo(list(range(600)))) == 1024
+
+
+def test_produto_inserir_buscar_atualizar_desativar(pool):
+    async def cenario(ctx):
+        repo = ProdutoRepo(ctx)
+        produto_id = await repo.inserir(LOJA, produto(cor="preta"))
+        linha = await repo.buscar(LOJA, produto_id)
+        assert linha["nome"] == "Sutiã" and linha["cor"] == "preta"
+        assert linha["estoque_minimo"] == 0 and linha["preco_custo"] == 0
+        assert await repo.existe(LOJA, produto_id)
+        assert not await repo.existe(OUTRA_LOJA, produto_id)
+        assert await repo.codigo_em_uso(LOJA, "789")
+        assert not await repo.codigo_em_uso(LOJA, "789", exceto_id=produto_id)
+
+        assert await repo.atualizar(LOJA, produto_id, {"preco_venda": 35}) == 1
+        linha = await repo.buscar(LOJA, produto_id)
+        assert linha["preco_venda"] == 35 and linha["data_atualizacao"] is not None
+
+        assert await repo.desativar(LOJA, produto_id) == 1
+        assert await repo.buscar(LOJA, produto_id, so_ativos=True) is None
+        assert await repo.buscar(LOJA, 999) is None
+    rodar(cenario)
+
+
+def test_produto_por_ids_mantem_a_ordem_e_ignora_ausentes(pool):
+    async def cenario(ctx):
+        repo = ProdutoRepo(ctx)
+        ids = [await repo.inserir(LOJA, produto(nome=f"P{i}", codigo_barras=str(i))) for i in range(3)]
+        linhas = await repo.por_ids(LOJA, [ids[2], 999, ids[0], ids[2]])
+        assert [linha["id"] for linha in linhas] == [ids[2], ids[0], ids[2]]
+        assert await repo.por_ids(OUTRA_LOJA, ids) == []
+    rodar(cenario)
+
+
+def test_produto_por_ids_em_varios_lotes(pool, monkeypatch):
+    monkeypatch.setattr(repositorios, "LOTE_IDS", 4)
+
+    async def cenario(ctx):
+        repo = ProdutoRepo(ctx)
+        ids = [await repo.inserir(LOJA, produto(nome=f"P{i}", codigo_barras=str(i))) for i in range(10)]
+        linhas = await repo.por_ids(LOJA, list(reversed(ids)))
+        assert [linha["id"] for linha in linhas] == list(reversed(ids))
+    rodar(cenario)
+
+
+def test_venda_inserir_buscar_itens_e_cancelar(pool):
+    async def cenario(ctx):
+        produto_id = await ProdutoRepo(ctx).inserir(LOJA, produto())
+        await UsuarioRepo(ctx).inserir(LOJA, SimpleNamespace(
+            nome="Ana", email="ana@x", perfil="admin", ativo=True), "hash")
+        repo = VendaRepo(ctx)
+        venda_id = await repo.inserir(LOJA, "V0001", venda(), vendedor_id=1, status="concluida")
+        await ctx.preparado(
+            "INSERT INTO itens_venda (venda_id, produto_id, produto_nome, quantidade, valor_unitario, total_item) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            (venda_id, produto_id, "Sutiã", 2, 30, 60), modo="escrita"
+        )
+
+        linha = await repo.buscar(LOJA, venda_id)
+        assert linha["numero_venda"] == "V0001" and linha["usuario_nome"] == "Ana"
+        assert linha["status"] == "concluida"
+        assert await repo.buscar(OUTRA_LOJA, venda_id) is None
+
+        itens = await repo.itens(venda_id)
+        assert itens[0]["codigo_barras"] == "789" and itens[0]["preco_total"] == 60
+        assert await repo.itens_para_estorno(venda_id) == [
+            {"produto_id": produto_id, "quantidade": 2, "total_item": 60}
+        ]
+        assert [v["id"] for v in await repo.recentes(LOJA)] == [venda_id]
+
+        travada = await repo.travar(LOJA, venda_id)
+        assert travada["forma_pagamento"] == "pix"
+        assert await repo.atualizar(LOJA, venda_id, venda(forma_pagamento="dinheiro", total_venda=30)) == 1
+        assert await repo.remover_itens(venda_id) == 1
+        assert await repo.cancelar(LOJA, venda_id) == 1
+        linha = await repo.buscar(LOJA, venda_id)
+        assert (linha["status"], linha["forma_pagamento"]) == ("cancelada", "dinheiro")
+    rodar(cenario)
+
+
+def test_cliente_crud_e_unicidade_de_cpf(pool):
+    async def cenario(ctx):
+        repo = ClienteRepo(ctx)
+        cliente_id = await repo.inserir(LOJA, cliente())
+        assert (await repo.buscar(LOJA, cliente_id))["nome"] == "Maria"
+        assert await repo.cpf_em_uso(LOJA, "123")
+        assert not await repo.cpf_em_uso(LOJA, "123", exceto_id=cliente_id)
+        assert not await repo.tem_vendas(LOJA, cliente_id)
+
+        assert await repo.atualizar(LOJA, cliente_id, {"cidade": "SP", "email": "m@x"}) == 1
+        linha = await repo.buscar(LOJA, cliente_id)
+        assert (linha["cidade"], linha["email"], linha["telefone"]) == ("SP", "m@x", "11999990000")
+
+        assert await repo.desativar(LOJA, cliente_id) == 1
+        assert not (await repo.buscar(LOJA, cliente_id))["ativo"]
+        assert await repo.excluir(LOJA, cliente_id) == 1
+        assert await repo.buscar(LOJA, cliente_id) is None
+    rodar(cenario)
+
+
+def test_usuario_crud_credenciais_e_regravar_senha(pool):
+    async def cenario(ctx):
+        repo = UsuarioRepo(ctx)
+        usuario_id = await repo.inserir(LOJA, SimpleNamespace(
+            nome="Bia", email="bia@x", perfil="vendedor", ativo=True), "hash-antigo")
+        assert await repo.existe(LOJA, usuario_id)
+        assert await repo.nome_em_uso(LOJA, "Bia")
+        assert await repo.email_em_uso(LOJA, "bia@x")
+        assert not await repo.nome_em_uso(OUTRA_LOJA, "Bia")
+        assert [u["nome"] for u in await repo.listar(LOJA)] == ["Bia"]
+        assert "password" not in await repo.buscar(LOJA, usuario_id)
+        assert (await repo.credenciais("Bia"))[0]["password"] == "hash-antigo"
+
+        assert await repo.atualizar(LOJA, usuario_id, {"perfil": "admin"}) == 1
+        assert (await repo.buscar(LOJA, usuario_id))["perfil"] == "admin"
+
+        assert await repo.regravar_senha(usuario_id, "hash-antigo", "hash-novo") == 1
+        # Outro login já trocou o hash: a segunda troca não sobrescreve
+        assert await repo.regravar_senha(usuario_id, "hash-antigo", "outro") == 0
+        assert (await repo.credenciais("Bia"))[0]["password"] == "hash-novo"
+    rodar(cenario)
+
+
+def test_repositorios_reusam_os_cursores_preparados(pool):
+    async def cenario(ctx):
+        repo = ProdutoRepo(ctx)
+        produto_id = await repo.inserir(LOJA, produto())
+        for _ in range(3):
+            await repo.buscar(LOJA, produto_id)
+    rodar(cenario)
+    estatisticas = pool.estatisticas()
+    assert estatisticas["preparados_reusados"] >= 2
+    assert estatisticas["em_uso"] == 0
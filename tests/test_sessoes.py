@@ -0,0 +1,26 @@
+import pytest
+
+import tokens
+
+
+@pytest.mark.parametrize("modo", ["store", "token"])
+def test_mudar_perfil_derruba_as_sessoes(caminho_banco, abrir_api, monkeypatch, modo):
+    import backend
+
+    if modo == "token":
+        monkeypatch.setattr(backend, "assinador_tokens", tokens.AssinadorTokens("segredo-de-teste", 3600))
+        monkeypatch.setattr(backend, "revogacoes", tokens.ListaRevogacao())
+
+    with abrir_api(caminho_banco) as (cliente, cabecalhos):
+        criado = cliente.post("/api/usuarios", headers=cabecalhos, json={
+            "nome": "Bia", "password": "senha1", "perfil": "admin", "email": "bia@x",
+        }).json()["usuario"]
+        token = cliente.post("/api/login", json={"nome": "bia", "password": "senha1"}).json()["session_token"]
+        assert cliente.get("/api/metrics", headers={"Authorization": token}).status_code == 200
+
+        # Editar sem mudar o perfil mantém a sessão
+        cliente.put(f"/api/usuarios/{criado['id']}", headers=cabecalhos, json={"nome": "Bia", "perfil": "admin"})
+        assert cliente.get("/api/metrics", headers={"Authorization": token}).status_code == 200
+
+        cliente.put(f"/api/usuarios/{criado['id']}", headers=cabecalhos, json={"perfil": "vendedor"})
+        assert cliente.get("/api/metrics", headers={"Authorization": token}).status_code == 401
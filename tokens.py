@@ -0,0 +1,139 @@
+"""Tokens de sessão assinados (modo ``WEBOS_SESSION_MODE=token``).
+
+O token é um JWT HS256 com id, nome, perfil e loja do usuário, emissão
+(``iat``) e validade (``exp``). Qualquer worker que conheça o segredo
+valida a sessão sem consultar banco nem store. A renovação é deslizante:
+quem chama reemite o token quando ele já tem alguma idade, e o cliente
+passa a usar o novo.
+
+Token assinado não pode ser apagado, então logout e "derrubar as sessões
+do usuário" vão para uma lista de revogação pequena (``sessoes_revogadas``)
+que cada worker mantém em memória e relê do banco periodicamente. Uma
+entrada só precisa durar até o último token afetado expirar.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+
+_CABECALHO = base64.urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').rstrip(b"=")
+
+SQL_REVOGAR = """
+    INSERT INTO sessoes_revogadas (chave, revogado_em, expira_em)
+    VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        revogado_em = VALUES(revogado_em),
+        expira_em = VALUES(expira_em)
+"""
+
+SQL_REVOGADOS = "SELECT chave, revogado_em FROM sessoes_revogadas WHERE expira_em > %s"
+
+SQL_LIMPAR_REVOGADOS = "DELETE FROM sessoes_revogadas WHERE expira_em <= %s"
+
+
+def _b64(dados: bytes) -> bytes:
+    return base64.urlsafe_b64encode(dados).rstrip(b"=")
+
+
+def _de_b64(texto: str) -> bytes:
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+class AssinadorTokens:
+    def __init__(self, segredo: str, validade_segundos: float):
+        self._chave = segredo.encode("utf-8")
+        self.validade = validade_segundos
+
+    def _assinar(self, conteudo: bytes) -> bytes:
+        return _b64(hmac.new(self._chave, conteudo, hashlib.sha256).digest())
+
+    def emitir(self, sessao: dict) -> str:
+        """Token para ``sessao`` (user_id, nome, perfil, loja_id), válido por ``validade``."""
+        agora = time.time()
+        carga = {
+            "sub": str(sessao["user_id"]),
+            "nome": sessao["nome"],
+            "perfil": sessao["perfil"],
+            "loja_id": sessao["loja_id"],
+            "iat": round(agora, 3),
+            "exp": int(agora + self.validade),
+            "jti": secrets.token_urlsafe(12),
+        }
+        conteudo = _CABECALHO + b"." + _b64(json.dumps(carga, separators=(",", ":")).encode("utf-8"))
+        return (conteudo + b"." + self._assinar(conteudo)).decode("ascii")
+
+    def verificar(self, token: str):
+        """Carga do token se a assinatura confere e ainda não expirou; senão ``None``."""
+        try:
+            cabecalho, carga, assinatura = token.split(".")
+            conteudo = f"{cabecalho}.{carga}".encode("ascii")
+            if not hmac.compare_digest(self._assinar(conteudo), assinatura.encode("ascii")):
+                return None
+            dados = json.loads(_de_b64(carga))
+        except (ValueError, UnicodeError):
+            return None
+        if dados.get("exp", 0) <= time.time():
+            return None
+        return dados
+
+    def renovar(self, carga: dict, intervalo_segundos: float):
+        """Token novo se ``carga`` foi emitida há mais de ``intervalo_segundos``."""
+        if time.time() - carga["iat"] < intervalo_segundos:
+            return None
+        return self.emitir(sessao_da_carga(carga))
+
+
+def sessao_da_carga(carga: dict) -> dict:
+    """Dados da sessão no mesmo formato do store (``user_id``, ``nome``, ...)."""
+    return {
+        "user_id": int(carga["sub"]),
+        "nome": carga["nome"],
+        "perfil": carga["perfil"],
+        "loja_id": carga["loja_id"],
+    }
+
+
+def chave_usuario(user_id) -> str:
+    return f"usuario:{user_id}"
+
+
+class ListaRevogacao:
+    """Tokens (por ``jti``) e usuários (tokens emitidos até um instante) revogados."""
+
+    def __init__(self):
+        self._revogados = {}
+        self._lock = threading.Lock()
+
+    def revogar(self, chave: str, instante: float = None):
+        with self._lock:
+            self._revogados[chave] = instante or time.time()
+
+    def substituir(self, linhas):
+        """Troca o conteúdo pelas linhas ``(chave, revogado_em)`` lidas do banco."""
+        revogados = {chave: float(instante) for chave, instante in linhas}
+        with self._lock:
+            self._revogados = revogados
+
+    def revogado(self, carga: dict) -> bool:
+        if carga["jti"] in self._revogados:
+            return True
+        revogado_em = self._revogados.get(chave_usuario(carga["sub"]))
+        return revogado_em is not None and carga["iat"] <= revogado_em
+
+    def __len__(self):
+        return len(self._revogados)
+
+
+async def gravar_revogacao(cursor, chave: str, revogado_em: float, expira_em: float):
+    await cursor.execute(SQL_REVOGAR, (chave, revogado_em, expira_em))
+
+
+async def ler_revogacoes(cursor) -> list:
+    """Apaga as entradas vencidas e devolve ``(chave, revogado_em)`` das vigentes."""
+    agora = time.time()
+    await cursor.execute(SQL_LIMPAR_REVOGADOS, (agora,))
+    await cursor.execute(SQL_REVOGADOS, (agora,))
+    return [(linha[0], linha[1]) for linha in await cursor.fetchall()]